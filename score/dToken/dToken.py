@@ -2,6 +2,10 @@ from .IIRC2 import TokenStandard
 from .addresses import *
 from .utils.math import *
 
+# a user debt is stored as (scaled debt << DEBT_SHIFT) | principal
+DEBT_SHIFT = 128
+PRINCIPAL_MASK = (1 << DEBT_SHIFT) - 1
+
 
 class DToken(TokenStandard, Addresses):
     """
@@ -13,6 +17,7 @@ class DToken(TokenStandard, Addresses):
     _TOTAL_SUPPLY = 'total_supply'
     _BALANCES = 'balances'
     _USER_INDEXES = 'user_indexes'
+    _DEBTS = 'debts'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         """
@@ -24,8 +29,10 @@ class DToken(TokenStandard, Addresses):
         self._symbol = VarDB(self._SYMBOL, db, value_type=str)
         self._decimals = VarDB(self._DECIMALS, db, value_type=int)
         self._totalSupply = VarDB(self._TOTAL_SUPPLY, db, value_type=int)
+        # principal and user index of debts recorded before scaled debt, removed once the user is migrated
         self._balances = DictDB(self._BALANCES, db, value_type=int)
         self._userIndexes = DictDB(self._USER_INDEXES, db, value_type=int)
+        self._debts = DictDB(self._DEBTS, db, value_type=int)
 
     def on_install(self, _addressProvider: Address, _name: str, _symbol: str, _decimals: int = 18) -> None:
         """
@@ -99,32 +106,87 @@ class DToken(TokenStandard, Addresses):
 
     @external(readonly=True)
     def getUserBorrowCumulativeIndex(self, _user: Address) -> int:
-        return self._userIndexes[_user]
-
-    def _calculateCumulatedBalanceInternal(self, _user: Address, _balance: int) -> int:
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        """
+        Returns the borrow index at the last update of the user debt
+        """
         userIndex = self._userIndexes[_user]
-        if userIndex == 0:
-            return _balance
-        else:
-            decimals = self._decimals.get()
-            balance = exaDiv(
-                exaMul(convertToExa(_balance, decimals), core.getNormalizedDebt(self._addresses[RESERVE])),
-                userIndex)
-            return convertExaToOther(balance, decimals)
+        if userIndex != 0:
+            return userIndex
+        scaledBalance, principalBalance = self._getDebt(_user)
+        if scaledBalance == 0:
+            return 0
+        decimals = self._decimals.get()
+        return exaDiv(convertToExa(principalBalance, decimals), convertToExa(scaledBalance, decimals))
+
+    def _getDebt(self, _user: Address) -> tuple:
+        """
+        :return: the scaled debt and the principal of the user
+        """
+        userIndex = self._userIndexes[_user]
+        if userIndex != 0:
+            # debt recorded before scaled debt, the principal accrues from the index of its last update
+            principalBalance = self._balances[_user]
+            return self._toScaled(principalBalance, userIndex), principalBalance
+        debt = self._debts[_user]
+        return debt >> DEBT_SHIFT, debt & PRINCIPAL_MASK
+
+    def _toScaled(self, _amount: int, _index: int) -> int:
+        decimals = self._decimals.get()
+        return convertExaToOther(exaDiv(convertToExa(_amount, decimals), _index), decimals)
+
+    def _fromScaled(self, _scaledAmount: int, _index: int) -> int:
+        decimals = self._decimals.get()
+        return convertExaToOther(exaMul(convertToExa(_scaledAmount, decimals), _index), decimals)
+
+    def _getNormalizedDebt(self) -> int:
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        return core.getNormalizedDebt(self._addresses[RESERVE])
+
+    def _debtOf(self, _scaledBalance: int, _principalBalance: int, _index: int) -> int:
+        # the scaled debt is rounded, the debt never drops below the principal recorded at the last update
+        return max(self._fromScaled(_scaledBalance, _index), _principalBalance)
 
     # This will always include accrued interest as a computed value
     @external(readonly=True)
     def balanceOf(self, _owner: Address) -> int:
-        currentPrincipalBalance = self.principalBalanceOf(_owner)
+        scaledBalance, principalBalance = self._getDebt(_owner)
+        if scaledBalance == 0:
+            return principalBalance
+        return self._debtOf(scaledBalance, principalBalance, self._getNormalizedDebt())
 
-        balance = self._calculateCumulatedBalanceInternal(_owner, currentPrincipalBalance)
-        return balance
+    @external(readonly=True)
+    def balancesOf(self, _users: List[Address]) -> dict:
+        """
+        Returns the debt of every user, reading the normalized debt once
+        """
+        index = self._getNormalizedDebt()
+        return {str(user): self._debtOf(*self._getDebt(user), index) for user in _users}
+
+    @external(readonly=True)
+    def userStates(self, _users: List[Address]) -> dict:
+        """
+        Returns the principal balance, debt and user index of every user, reading the normalized debt once
+        """
+        index = self._getNormalizedDebt()
+        response = {}
+        for user in _users:
+            scaledBalance, principalBalance = self._getDebt(user)
+            response[str(user)] = {
+                'principalBalance': principalBalance,
+                'balance': self._debtOf(scaledBalance, principalBalance, index),
+                'userIndex': self.getUserBorrowCumulativeIndex(user)
+            }
+        return response
+
+    # The debt of the user divided by the borrow index, balanceOf is this debt times the normalized debt
+    @external(readonly=True)
+    def scaledBalanceOf(self, _user: Address) -> int:
+        return self._getDebt(_user)[0]
 
     # This shows the state updated balance and includes the accrued interest upto the most recent computation initiated by the user transaction
     @external(readonly=True)
     def principalBalanceOf(self, _user: Address) -> int:
-        return self._balances[_user]
+        return self._getDebt(_user)[1]
 
     @external(readonly=True)
     def principalTotalSupply(self) -> int:
@@ -138,6 +200,14 @@ class DToken(TokenStandard, Addresses):
             'principalTotalSupply': self.principalTotalSupply()
         }
 
+    @external(readonly=True)
+    def getPrincipalSupplies(self, _users: List[Address]) -> dict:
+        return {
+            "decimals": self.decimals(),
+            'principalUserBalances': {str(user): self.principalBalanceOf(user) for user in _users},
+            'principalTotalSupply': self.principalTotalSupply()
+        }
+
     @external(readonly=True)
     def totalSupply(self) -> int:
         """
@@ -156,25 +226,22 @@ class DToken(TokenStandard, Addresses):
                 borrowIndex)
             return convertExaToOther(balance, decimals)
 
-    def _resetDataOnZeroBalanceInternal(self, _user: Address) -> None:
-        self._userIndexes[_user] = 0
-
-    def _mintInterestAndUpdateIndex(self, _user: Address, _balanceIncrease: int):
-        if _balanceIncrease > 0:
-            self._mint(_user, _balanceIncrease)
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
-        userIndex = core.getReserveBorrowCumulativeIndex(self._addresses[RESERVE])
-        self._userIndexes[_user] = userIndex
-
     @only_lending_pool_core
     @external
-    def mintOnBorrow(self, _user: Address, _amount: int, _balanceIncrease: int):
+    def mintOnBorrow(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int):
+        """
+        :param _balanceIncrease: the interest accrued on the principal since the last update of the user debt
+        :param _index: the borrow index of the reserve the amount is scaled by
+        """
+        if _amount < 0:
+            revert(f'{TAG}: 'f'Invalid value: {_amount} to mint')
         beforeTotalSupply = self.principalTotalSupply()
-        beforeUserSupply = self.principalBalanceOf(_user)
-        self._mintInterestAndUpdateIndex(_user, _balanceIncrease)
-        self._mint(_user, _amount)
-        self._handleAction(_user, beforeUserSupply, beforeTotalSupply)
-        self.MintOnBorrow(_user, _amount, _balanceIncrease, self._userIndexes[_user])
+        scaledBalance, principalBalance = self._getDebt(_user)
+        self._updateDebt(_user, scaledBalance + self._toScaled(_amount, _index), principalBalance,
+                         principalBalance + _balanceIncrease + _amount)
+        self._handleAction(_user, principalBalance, beforeTotalSupply)
+        self.Transfer(ZERO_SCORE_ADDRESS, _user, _amount, b'mint')
+        self.MintOnBorrow(_user, _amount, _balanceIncrease, _index)
 
     def _handleAction(self, _user, _user_balance, _total_supply):
         _userDetails = {
@@ -188,31 +255,37 @@ class DToken(TokenStandard, Addresses):
 
     @only_lending_pool_core
     @external
-    def burnOnRepay(self, _user: Address, _amount: int, _balanceIncrease: int):
-        beforeTotalSupply = self.principalTotalSupply()
-        beforeUserSupply = self.principalBalanceOf(_user)
-        self._mintInterestAndUpdateIndex(_user, _balanceIncrease)
-        self._burn(_user, _amount, b'loanRepaid')
-
-        self._handleAction(_user, beforeUserSupply, beforeTotalSupply)
-
-        if self.principalBalanceOf(_user) == 0:
-            self._resetDataOnZeroBalanceInternal(_user)
-        self.BurnOnRepay(_user, _amount, _balanceIncrease, self._userIndexes[_user])
+    def burnOnRepay(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int):
+        index = self._burnDebt(_user, _amount, _balanceIncrease, _index, b'loanRepaid')
+        self.BurnOnRepay(_user, _amount, _balanceIncrease, index)
 
     @only_lending_pool_core
     @external
-    def burnOnLiquidation(self, _user: Address, _amount: int, _balanceIncrease: int) -> None:
-        beforeTotalSupply = self.principalTotalSupply()
-        beforeUserSupply = self.principalBalanceOf(_user)
-        self._mintInterestAndUpdateIndex(_user, _balanceIncrease)
-        self._burn(_user, _amount, b'userLiquidated')
+    def burnOnLiquidation(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int) -> None:
+        index = self._burnDebt(_user, _amount, _balanceIncrease, _index, b'userLiquidated')
+        self.BurnOnLiquidation(_user, _amount, _balanceIncrease, index)
 
-        self._handleAction(_user, beforeUserSupply, beforeTotalSupply)
-
-        if self.principalBalanceOf(_user) == 0:
-            self._resetDataOnZeroBalanceInternal(_user)
-        self.BurnOnLiquidation(_user, _amount, _balanceIncrease, self._userIndexes[_user])
+    def _burnDebt(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int, _data: bytes) -> int:
+        """
+        :return: the index of the remaining debt, 0 once the debt is repaid
+        """
+        if _amount < 0:
+            revert(f'{TAG}: 'f'Invalid value: {_amount} to burn')
+        beforeTotalSupply = self.principalTotalSupply()
+        scaledBalance, principalBalance = self._getDebt(_user)
+        userBalance = principalBalance + _balanceIncrease
+        if _amount > userBalance:
+            revert(f'{TAG}: Cannot burn more than user balance. Amount to burn: {_amount} User Balance: {userBalance}')
+
+        remainingBalance = userBalance - _amount
+        remainingScaledBalance = 0
+        if remainingBalance > 0:
+            remainingScaledBalance = max(scaledBalance - self._toScaled(_amount, _index), 0)
+        self._updateDebt(_user, remainingScaledBalance, principalBalance, remainingBalance)
+        self._handleAction(_user, principalBalance, beforeTotalSupply)
+        if _amount > 0:
+            self.Transfer(_user, ZERO_SCORE_ADDRESS, _amount, _data)
+        return _index if remainingBalance > 0 else 0
 
     @external
     def transfer(self, _to: Address, _value: int, _data: bytes = None):
@@ -225,59 +298,29 @@ class DToken(TokenStandard, Addresses):
         """
         revert(f'{TAG}: Transfer not allowed in debt token ')
 
-    def _mint(self, account: Address, amount: int, data: bytes = None) -> None:
-        """
-        Creates amount number of tokens, and assigns to account
-        Increases the balance of that account and total supply.
-        This is an internal function.
-        :param account: The account at which token is to be created.
-        :param amount: Number of tokens to be created at the `account`.
-
-        """
-        if data is None:
-            data = b'mint'
-
-        if amount < 0:
-            revert(f'{TAG}: 'f'Invalid value: {amount} to mint')
-
-        self._totalSupply.set(self._totalSupply.get() + amount)
-        self._balances[account] += amount
-
-        # Emits an event log Mint
-        self.Transfer(ZERO_SCORE_ADDRESS, account, amount, data)
-
-    def _burn(self, account: Address, amount: int, data: bytes = None) -> None:
+    def _updateDebt(self, _user: Address, _scaledBalance: int, _previousPrincipalBalance: int,
+                    _principalBalance: int) -> None:
         """
-        Destroys `amount` number of tokens from `account`
-        Decreases the balance of that `account` and total supply.
+        Writes the scaled debt and principal of the user in one slot and moves the principal total supply
+        by the change of the principal.
         This is an internal function.
-        :param account: The account at which token is to be destroyed.
-        :param amount: The `amount` of tokens of `account` to be destroyed.
-
         """
-        if data is None:
-            data = b'burn'
-
-        if amount == 0:
-            return
-
-        if amount < 0:
-            revert(f'{TAG}: 'f'Invalid value: {amount} to burn')
-        totalSupply = self._totalSupply.get()
-
-        if amount > totalSupply:
-            revert(f'{TAG}:'
-                   f'{amount} is greater than total supply :{totalSupply}')
-
-        userBalance = self._balances[account]
-        if amount > userBalance:
-            revert(f'{TAG}: Cannot burn more than user balance. Amount to burn: {amount} User Balance: {userBalance}')
-
-        self._totalSupply.set(totalSupply - amount)
-        self._balances[account] -= amount
-
-        # Emits an event log Burn
-        self.Transfer(account, ZERO_SCORE_ADDRESS, amount, data)
+        totalSupply = self._totalSupply.get() + _principalBalance - _previousPrincipalBalance
+        if totalSupply < 0:
+            revert(f'{TAG}: '
+                   f'{_previousPrincipalBalance - _principalBalance} is greater than total supply :{self._totalSupply.get()}')
+        if self._userIndexes[_user] != 0:
+            self._userIndexes.remove(_user)
+            self._balances.remove(_user)
+        self._totalSupply.set(totalSupply)
+        self._debts[_user] = (_scaledBalance << DEBT_SHIFT) | _principalBalance
+        self._updateUserParticipation(_user, _previousPrincipalBalance)
+
+    def _updateUserParticipation(self, _user: Address, _previousBalance: int) -> None:
+        hasBalance = self.principalBalanceOf(_user) > 0
+        if hasBalance != (_previousBalance > 0):
+            core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+            core.updateUserReserveParticipation(self._addresses[RESERVE], _user, hasBalance)
 
     @external(readonly=True)
     def getTotalStaked(self) -> TotalStaked:
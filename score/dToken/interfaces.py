@@ -33,6 +33,10 @@ class LendingPoolCoreInterface(InterfaceScore):
     def getReserveBorrowCumulativeIndex(self, _reserve: int) -> int:
         pass
 
+    @interface
+    def updateUserReserveParticipation(self, _reserve: Address, _user: Address, _hasBalance: bool) -> None:
+        pass
+
 
 class DistributionManager(InterfaceScore):
     @interface
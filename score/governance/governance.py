@@ -100,6 +100,12 @@ class Governance(Addresses):
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
         core.updateUsageAsCollateralEnabled(_reserve, _usageAsCollateralEnabled)
 
+    @only_owner
+    @external
+    def reconcileReserveLiquidity(self, _reserve: Address):
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        core.reconcileReserveLiquidity(_reserve)
+
     @only_owner
     @external
     def enableRewardClaim(self):
@@ -123,6 +123,10 @@ class CoreInterface(InterfaceScore):
     def updateBorrowThreshold(self, _reserve: Address, _borrowThreshold: int):
         pass
 
+    @interface
+    def reconcileReserveLiquidity(self, _reserve: Address) -> None:
+        pass
+
 
 class DaoFundInterface(InterfaceScore):
     @interface
@@ -97,6 +97,10 @@ class CoreInterface(InterfaceScore):
     def getUserBorrowBalances(self, _reserve: Address, _user: Address) -> dict:
         pass
 
+    @interface
+    def getUserDebtPosition(self, _reserve: Address, _user: Address) -> dict:
+        pass
+
     @interface
     def updateStateOnRepay(self, _reserve: Address, _user: Address, _paybackAmountMinusFees: int,
                            _originationFeeRepaid: int, _balanceIncrease: int, _repaidWholeLoan: bool):
@@ -106,6 +110,10 @@ class CoreInterface(InterfaceScore):
     def updateStateOnRedeem(self, _reserve: Address, _user: Address, _amountRedeemed: int) -> None:
         pass
 
+    @interface
+    def getUserPositionFlags(self, _user: Address) -> dict:
+        pass
+
 
 # An interface to USDb contract
 class DataProviderInterface(InterfaceScore):
@@ -127,6 +135,10 @@ class DataProviderInterface(InterfaceScore):
     def getReserveData(self, _reserve: Address) -> dict:
         pass
 
+    @interface
+    def validateBorrow(self, _reserve: Address, _user: Address, _amount: int) -> dict:
+        pass
+
 
 # An interface to liquidation manager
 class LiquidationManagerInterface(InterfaceScore):
@@ -1,8 +1,12 @@
 from .addresses import *
 from .utils.math import *
+from .utils.enumerable_set import EnumerableSetDB
 
 BATCH_SIZE = 50
 TERM_LENGTH = 43120
+# upper bounds of the health factor buckets, the last bucket holds every borrower above the final bound
+HEALTH_FACTOR_BUCKETS = [EXA, 11 * EXA // 10, 125 * EXA // 100]
+MULTICALL_ACTION_LIMIT = 10
 
 
 class LendingPool(Addresses):
@@ -13,6 +17,10 @@ class LendingPool(Addresses):
     FEE_SHARING_USERS = 'feeSharingUsers'
     FEE_SHARING_TXN_LIMIT = 'feeSharingTxnLimit'
     BRIDGE_FEE_THRESHOLD = "bridgeFeeThreshold"
+    HEALTH_FACTOR_BUCKET = 'healthFactorBucket'
+    ACTIVE_BORROWERS = 'activeBorrowers'
+    ACTIVE_DEPOSITORS = 'activeDepositors'
+    USER_HEALTH_FACTOR_BUCKET = 'userHealthFactorBucket'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         super().__init__(db)
@@ -23,6 +31,17 @@ class LendingPool(Addresses):
         self._feeSharingUsers = DictDB(self.FEE_SHARING_USERS, db, value_type=int, depth=2)
         self._feeSharingTxnLimit = VarDB(self.FEE_SHARING_TXN_LIMIT, db, value_type=int)
         self._bridgeFeeThreshold = VarDB(self.BRIDGE_FEE_THRESHOLD, db, value_type=int)
+        self._activeBorrowers = EnumerableSetDB(self.ACTIVE_BORROWERS, db, value_type=Address)
+        self._activeDepositors = EnumerableSetDB(self.ACTIVE_DEPOSITORS, db, value_type=Address)
+        self._healthFactorBuckets = [
+            EnumerableSetDB(f'{self.HEALTH_FACTOR_BUCKET}{bucket}', db, value_type=Address)
+            for bucket in range(len(HEALTH_FACTOR_BUCKETS) + 1)
+        ]
+        # bucket of the user plus one, zero if the user is not in any bucket
+        self._userHealthFactorBucket = DictDB(self.USER_HEALTH_FACTOR_BUCKET, db, value_type=int)
+        # transaction scoped state, a score instance only lives for a single transaction
+        self._feeSharingChecked = False
+        self._pendingUserUpdates = None
 
     def on_install(self, _addressProvider: Address) -> None:
         super().on_install(_addressProvider)
@@ -62,13 +81,170 @@ class LendingPool(Addresses):
     def getBridgeFeeThreshold(self) -> int:
         return self._bridgeFeeThreshold.get()
 
+    # Until migrateActiveWallets drains the legacy wallet arrays, the wallet reads list the active wallets followed by
+    # the legacy wallets left to migrate, so a legacy wallet active again since the update may be listed twice
     @external(readonly=True)
     def getBorrowWallets(self, _index: int) -> list:
-        return self._get_array_items(self._borrowWallets, _index)
+        return self._get_wallet_range(self._activeBorrowers, self._borrowWallets, _index * BATCH_SIZE, BATCH_SIZE)
+
+    @external(readonly=True)
+    def getBorrowWalletsPage(self, _offset: int, _limit: int) -> list:
+        return self._get_wallet_range(self._activeBorrowers, self._borrowWallets, _offset, _limit)
+
+    @external(readonly=True)
+    def getBorrowWalletCount(self) -> int:
+        return len(self._activeBorrowers) + len(self._borrowWallets)
 
     @external(readonly=True)
     def getDepositWallets(self, _index: int) -> list:
-        return self._get_array_items(self._depositWallets, _index)
+        return self._get_wallet_range(self._activeDepositors, self._depositWallets, _index * BATCH_SIZE, BATCH_SIZE)
+
+    @external(readonly=True)
+    def getActiveBorrowers(self, _cursor: int, _limit: int) -> dict:
+        """
+        pages through the users holding dTokens
+        :param _cursor: the cursor returned with the previous page, 0 for the first page
+        :param _limit: the page size
+        :return: the wallets of the page and the cursor of the next page, -1 after the last page
+        """
+        return self._get_wallet_page(self._activeBorrowers, self._borrowWallets, _cursor, _limit)
+
+    @external(readonly=True)
+    def getActiveDepositors(self, _cursor: int, _limit: int) -> dict:
+        """
+        pages through the users holding oTokens
+        :param _cursor: the cursor returned with the previous page, 0 for the first page
+        :param _limit: the page size
+        :return: the wallets of the page and the cursor of the next page, -1 after the last page
+        """
+        return self._get_wallet_page(self._activeDepositors, self._depositWallets, _cursor, _limit)
+
+    @external(readonly=True)
+    def getWalletMigrationStatus(self) -> dict:
+        return {
+            'borrowWalletsLeft': len(self._borrowWallets),
+            'depositWalletsLeft': len(self._depositWallets)
+        }
+
+    @only_owner
+    @external
+    def migrateActiveWallets(self, _limit: int) -> None:
+        """
+        moves up to _limit wallets from the legacy append only wallet arrays into the active wallet sets,
+        dropping the wallets without borrows or deposits, and prunes them from the arrays
+        :param _limit: the number of wallets to migrate
+        """
+        core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
+        for _ in range(_limit):
+            if len(self._borrowWallets) > 0:
+                wallet = self._borrowWallets.pop()
+                self._borrowIndex.remove(wallet)
+            elif len(self._depositWallets) > 0:
+                wallet = self._depositWallets.pop()
+                self._depositIndex.remove(wallet)
+            else:
+                break
+            self._updateActiveWallet(wallet, core.getUserPositionFlags(wallet))
+
+    @external
+    def refreshActiveWallets(self, _users: List[Address]) -> None:
+        """
+        syncs the active wallet sets with the positions recorded by lendingPoolCore, called by the oTokens when a
+        transfer opens or closes a deposit position
+        :param _users: up to BATCH_SIZE wallets to refresh
+        """
+        self._require(len(_users) <= BATCH_SIZE, f"Active wallet refresh takes up to {BATCH_SIZE} wallets")
+        core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
+        for user in _users:
+            self._updateActiveWallet(user, core.getUserPositionFlags(user))
+
+    def _updateActiveWallet(self, _user: Address, _positionFlags: dict) -> None:
+        if _positionFlags['hasBorrows']:
+            self._activeBorrowers.add(_user)
+        else:
+            self._activeBorrowers.remove(_user)
+        if _positionFlags['hasDeposits']:
+            self._activeDepositors.add(_user)
+        else:
+            self._activeDepositors.remove(_user)
+
+    def _updateUserIndexes(self, _user: Address, _activeWallet: bool, _healthFactor: bool) -> None:
+        if self._pendingUserUpdates is not None:
+            # inside a multicall every user is refreshed once after the last action
+            activeWallet, healthFactor = self._pendingUserUpdates.get(_user, (False, False))
+            self._pendingUserUpdates[_user] = (activeWallet or _activeWallet, healthFactor or _healthFactor)
+            return
+
+        if _activeWallet:
+            self._refreshActiveWallet(_user)
+        if _healthFactor:
+            self._refreshHealthFactorBucket(_user)
+
+    def _refreshActiveWallet(self, _user: Address) -> None:
+        core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
+        self._updateActiveWallet(_user, core.getUserPositionFlags(_user))
+
+    @external(readonly=True)
+    def getHealthFactorBucketBounds(self) -> list:
+        return HEALTH_FACTOR_BUCKETS
+
+    @external(readonly=True)
+    def getHealthFactorBucketSize(self, _bucket: int) -> int:
+        self._require(0 <= _bucket < len(self._healthFactorBuckets), f"Invalid health factor bucket {_bucket}")
+        return len(self._healthFactorBuckets[_bucket])
+
+    @external(readonly=True)
+    def getHealthFactorBucket(self, _bucket: int, _offset: int, _limit: int) -> list:
+        """
+        pages through the borrowers of a health factor bucket
+        :param _bucket: the bucket index, bucket i holds the borrowers whose last computed health factor is
+                        below getHealthFactorBucketBounds()[i] and not below the previous bound
+        :param _offset: the position of the first borrower of the page
+        :param _limit: the number of borrowers to return
+        :return: the borrower addresses
+        """
+        self._require(0 <= _bucket < len(self._healthFactorBuckets), f"Invalid health factor bucket {_bucket}")
+        if _limit <= 0:
+            return []
+        return [user for user in self._healthFactorBuckets[_bucket].range(_offset, _offset + _limit)]
+
+    @external(readonly=True)
+    def getUserHealthFactorBucket(self, _user: Address) -> int:
+        return self._userHealthFactorBucket[_user] - 1
+
+    @external
+    def updateHealthFactorBuckets(self, _users: List[Address]) -> None:
+        """
+        recomputes the health factor of the users and moves them to the matching bucket,
+        used by keepers once prices move and to index the existing borrowers
+        :param _users: the addresses of the users, at most BATCH_SIZE
+        """
+        self._require(len(_users) <= BATCH_SIZE, f"At most {BATCH_SIZE} users can be updated at once")
+        for user in _users:
+            self._refreshHealthFactorBucket(user)
+
+    def _refreshHealthFactorBucket(self, _user: Address) -> None:
+        dataProvider = self.create_interface_score(self.getAddress(LENDING_POOL_DATA_PROVIDER),
+                                                   DataProviderInterface)
+        healthFactor = dataProvider.getUserAccountData(_user)['healthFactor']
+        currentBucket = self._userHealthFactorBucket[_user] - 1
+        # users without debt have a health factor of -1 and are not indexed
+        bucket = -1 if healthFactor == -1 else self._healthFactorBucket(healthFactor)
+        if bucket == currentBucket:
+            return
+
+        if currentBucket != -1:
+            self._healthFactorBuckets[currentBucket].remove(_user)
+        if bucket != -1:
+            self._healthFactorBuckets[bucket].add(_user)
+        self._userHealthFactorBucket[_user] = bucket + 1
+
+    @staticmethod
+    def _healthFactorBucket(_healthFactor: int) -> int:
+        for bucket, upperBound in enumerate(HEALTH_FACTOR_BUCKETS):
+            if _healthFactor < upperBound:
+                return bucket
+        return len(HEALTH_FACTOR_BUCKETS)
 
     @only_owner
     @external
@@ -99,6 +275,9 @@ class LendingPool(Addresses):
         return False
 
     def _checkAndEnableFeeSharing(self):
+        if self._feeSharingChecked:
+            return
+        self._feeSharingChecked = True
         if self._isFeeSharingEnable(self.msg.sender):
             self.set_fee_sharing_proportion(100)
 
@@ -114,20 +293,14 @@ class LendingPool(Addresses):
             revert(
                 f'{TAG}: Amount in param {_amount} doesnt match with the icx sent {self.msg.value} to the Lending Pool')
 
-        staking = self.create_interface_score(self.getAddress(STAKING), StakingInterface)
-
-        rate = staking.getTodayRate()
+        self._deposit(self.getAddress(sICX), _amount, self.msg.sender, self.msg.value)
 
-        # getting equivalent sicx amount for the icx
-        _amount = EXA * self.msg.value // rate
-        _reserve = self.getAddress(sICX)
-        self._deposit(_reserve, _amount, self.msg.sender)
-
-    def _deposit(self, _reserve: Address, _amount: int, _sender: Address):
+    def _deposit(self, _reserve: Address, _amount: int, _sender: Address, _icxValue: int = 0):
         """
         deposits the underlying asset to the reserve
         :param _reserve:the address of the reserve
-        :param _amount:the amount to be deposited
+        :param _amount:the amount to be deposited, replaced by the sicx received for the staked icx of a sicx deposit
+        :param _icxValue:the icx to be staked for the sicx deposit, 0 if the reserve tokens are already received
         :return:
         """
         # checking for active and unfreezed reserve,deposit is allowed only for active and unfreezed reserve
@@ -138,53 +311,64 @@ class LendingPool(Addresses):
         self._require(reserveData['isActive'], "Reserve is not active,deposit unsuccessful")
         self._require(not reserveData['isFreezed'], "Reserve is frozen,deposit unsuccessful")
 
-        if not self._depositIndex[_sender]:
-            # add new entry
-            self._depositWallets.put(_sender)
-            self._depositIndex[_sender] = len(self._depositWallets)
+        self._activeDepositors.add(_sender)
 
         reserve = self.create_interface_score(_reserve, ReserveInterface)
         staking = self.create_interface_score(self.getAddress(STAKING), StakingInterface)
         oTokenAddress = reserveData['oTokenAddress']
 
         oToken = self.create_interface_score(oTokenAddress, OTokenInterface)
+        isIcxDeposit = _reserve == self.getAddress(sICX) and _icxValue != 0
+        if isIcxDeposit:
+            # icx is staked first, so the reserve records the sicx lendingPoolCore actually received
+            _amount = staking.icx(_icxValue).stakeICX(lendingPoolCoreAddress)
         core.updateStateOnDeposit(_reserve, _sender, _amount)
 
         oToken.mintOnDeposit(_sender, _amount)
-        if _reserve == self.getAddress(sICX) and self.msg.value != 0:
-            # icx sent to staking contract and equivalent sicx received to lendingPoolCore
-            _amount = staking.icx(self.msg.value).stakeICX(lendingPoolCoreAddress)
-        else:
+        if not isIcxDeposit:
             reserve.transfer(lendingPoolCoreAddress, _amount)
         # self._updateSnapshot(_reserve, _sender)
+        self._updateUserIndexes(_sender, False, self._userHealthFactorBucket[_sender] != 0)
 
         self.Deposit(_reserve, _sender, _amount)
 
     @external
     def redeem(self, _oToken: Address, _amount: int, _waitForUnstaking: bool = False) -> None:
+        self._redeem(_oToken, _amount, _waitForUnstaking, self.msg.sender)
+
+    def _redeem(self, _oToken: Address, _amount: int, _waitForUnstaking: bool, _user: Address) -> None:
         self._checkAndEnableFeeSharing()
         oToken = self.create_interface_score(_oToken, OTokenInterface)
-        redeemParams = oToken.redeem(self.msg.sender, _amount)
-        self.redeemUnderlying(redeemParams['reserve'], self.msg.sender, _oToken, redeemParams['amountToRedeem'],
+        redeemParams = oToken.redeem(_user, _amount)
+        self.redeemUnderlying(redeemParams['reserve'], _user, _oToken, redeemParams['amountToRedeem'],
                               _waitForUnstaking)
 
     @external
     def claimRewards(self):
+        self._claimRewards(self.msg.sender)
+
+    def _claimRewards(self, _user: Address):
         self._checkAndEnableFeeSharing()
         rewards = self.create_interface_score(self.getAddress(REWARDS), RewardInterface)
-        rewards.claimRewards(self.msg.sender)
+        rewards.claimRewards(_user)
 
     @external
     def stake(self, _value: int):
+        self._stake(_value, self.msg.sender)
+
+    def _stake(self, _value: int, _user: Address):
         self._checkAndEnableFeeSharing()
         ommToken = self.create_interface_score(self.getAddress(OMM_TOKEN), OmmTokenInterface)
-        ommToken.stake(_value, self.msg.sender)
+        ommToken.stake(_value, _user)
 
     @external
     def unstake(self, _value: int):
+        self._unstake(_value, self.msg.sender)
+
+    def _unstake(self, _value: int, _user: Address):
         self._checkAndEnableFeeSharing()
         ommToken = self.create_interface_score(self.getAddress(OMM_TOKEN), OmmTokenInterface)
-        ommToken.unstake(_value, self.msg.sender)
+        ommToken.unstake(_value, _user)
 
     def redeemUnderlying(self, _reserve: Address, _user: Address, _oToken: Address, _amount: int,
 
@@ -223,6 +407,7 @@ class LendingPool(Addresses):
         core.transferToUser(_reserve, _to, _amount, _data)
 
         # self._updateSnapshot(_reserve, _user)
+        self._updateUserIndexes(_user, True, self._userHealthFactorBucket[_user] != 0)
 
         self.RedeemUnderlying(_reserve, _user, _amount)
 
@@ -239,53 +424,23 @@ class LendingPool(Addresses):
         :param _amount:the amount to be borrowed
         :return:
         """
-        # checking for active and unfreezed reserve,borrow is allowed only for active and unfreezed reserve
-        lendingPoolCoreAddress = self.getAddress(LENDING_POOL_CORE)
-        core = self.create_interface_score(lendingPoolCoreAddress, CoreInterface)
-        reserveData = core.getReserveData(_reserve)
-        self._require(_amount <= reserveData['availableBorrows'],
-                      f"Amount requested {_amount} is more than the {reserveData['availableBorrows']}")
+        self._borrow(_reserve, _amount, self.msg.sender)
+
+    def _borrow(self, _reserve: Address, _amount: int, _user: Address):
+        # reserve state, collateral and origination fee are validated together by the data provider
+        dataProvider = self.create_interface_score(self.getAddress(LENDING_POOL_DATA_PROVIDER), DataProviderInterface)
+        validation = dataProvider.validateBorrow(_reserve, _user, _amount)
+        self._require(validation['error'] == "", validation['error'])
 
         self._checkAndEnableFeeSharing()
-        self._require(reserveData['isActive'], "Reserve is not active,borrow unsuccessful")
-        self._require(not reserveData['isFreezed'], "Reserve is frozen,borrow unsuccessful")
-
-        self._require(core.isReserveBorrowingEnabled(_reserve), "Borrow error:borrowing not enabled in the reserve")
-        if not self._borrowIndex[self.msg.sender]:
-            # add new entry
-            self._borrowWallets.put(self.msg.sender)
-            self._borrowIndex[self.msg.sender] = len(self._borrowWallets)
-        dataProviderAddress = self.getAddress(LENDING_POOL_DATA_PROVIDER)
-        dataProvider = self.create_interface_score(dataProviderAddress, DataProviderInterface)
-        availableLiquidity = reserveData.get("availableLiquidity")
-
-        self._require(availableLiquidity >= _amount, "Borrow error:Not enough available liquidity in the reserve")
-
-        userData = dataProvider.getUserAccountData(self.msg.sender)
-        userCollateralBalanceUSD = userData['totalCollateralBalanceUSD']
-        userBorrowBalanceUSD = userData['totalBorrowBalanceUSD']
-        userTotalFeesUSD = userData['totalFeesUSD']
-        currentLTV = userData['currentLtv']
-        healthFactorBelowThreshold = userData['healthFactorBelowThreshold']
-
-        self._require(userCollateralBalanceUSD > 0, "Borrow error:The user does not have any collateral")
-        self._require(not healthFactorBelowThreshold, "Borrow error:Health factor is below threshold")
-        feeProviderAddress = self.getAddress(FEE_PROVIDER)
-        feeProvider = self.create_interface_score(feeProviderAddress, FeeProviderInterface)
-        borrowFee = feeProvider.calculateOriginationFee(_amount)
-
-        self._require(borrowFee > 0, "Borrow error:borrow amount is very small")
-        amountOfCollateralNeededUSD = dataProvider.calculateCollateralNeededUSD(_reserve, _amount, borrowFee,
-                                                                                userBorrowBalanceUSD,
-                                                                                userTotalFeesUSD, currentLTV)
-
-        self._require(amountOfCollateralNeededUSD <= userCollateralBalanceUSD,
-                      "Borrow error:Insufficient collateral to cover new borrow")
-
-        borrowData: dict = core.updateStateOnBorrow(_reserve, self.msg.sender, _amount, borrowFee)
-        core.transferToUser(_reserve, self.msg.sender, _amount)
-        # self._updateSnapshot(_reserve, self.msg.sender)
-        self.Borrow(_reserve, self.msg.sender, _amount, borrowData['currentBorrowRate'], borrowFee,
+        self._activeBorrowers.add(_user)
+        borrowFee = validation['borrowFee']
+        core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
+        borrowData: dict = core.updateStateOnBorrow(_reserve, _user, _amount, borrowFee)
+        core.transferToUser(_reserve, _user, _amount)
+        # self._updateSnapshot(_reserve, _user)
+        self._updateUserIndexes(_user, False, True)
+        self.Borrow(_reserve, _user, _amount, borrowData['currentBorrowRate'], borrowFee,
                     borrowData['balanceIncrease'])
 
     def _repay(self, _reserve: Address, _amount: int, _sender: Address):
@@ -299,48 +454,48 @@ class LendingPool(Addresses):
         # checking for an inactive reserve,repay is allowed for only active reserve
         lendingPoolCoreAddress = self.getAddress(LENDING_POOL_CORE)
         core = self.create_interface_score(lendingPoolCoreAddress, CoreInterface)
-        reserveData = core.getReserveData(_reserve)
-        self._require(reserveData['isActive'], "Reserve is not active,repay unsuccessful")
+        borrowData: dict = core.getUserDebtPosition(_reserve, _sender)
+        self._require(borrowData['isActive'], "Reserve is not active,repay unsuccessful")
 
         reserve = self.create_interface_score(_reserve, ReserveInterface)
-        borrowData: dict = core.getUserBorrowBalances(_reserve, _sender)
-        userBasicReserveData: dict = core.getUserBasicReserveData(_reserve, _sender)
         self._require(borrowData['compoundedBorrowBalance'] > 0, 'The user does not have any borrow pending')
 
-        paybackAmount = borrowData['compoundedBorrowBalance'] + userBasicReserveData['originationFee']
+        paybackAmount = borrowData['compoundedBorrowBalance'] + borrowData['originationFee']
         returnAmount = 0
         if _amount < paybackAmount:
             paybackAmount = _amount
         else:
             returnAmount = _amount - paybackAmount
 
-        if paybackAmount <= userBasicReserveData['originationFee']:
+        if paybackAmount <= borrowData['originationFee']:
             core.updateStateOnRepay(_reserve, _sender, 0, paybackAmount, borrowData['borrowBalanceIncrease'],
                                     False)
             # transfer to feeProvider
             feeProviderAddress = self.getAddress(FEE_PROVIDER)
             reserve.transfer(feeProviderAddress, paybackAmount)
+            self._updateUserIndexes(_sender, True, True)
 
             self.Repay(_reserve, _sender, 0, paybackAmount, borrowData['borrowBalanceIncrease'])
 
             return
 
-        paybackAmountMinusFees = paybackAmount - userBasicReserveData['originationFee']
+        paybackAmountMinusFees = paybackAmount - borrowData['originationFee']
         core.updateStateOnRepay(_reserve, _sender, paybackAmountMinusFees,
-                                userBasicReserveData['originationFee'], borrowData['borrowBalanceIncrease'],
+                                borrowData['originationFee'], borrowData['borrowBalanceIncrease'],
                                 borrowData['compoundedBorrowBalance'] == paybackAmountMinusFees)
 
-        if userBasicReserveData['originationFee'] > 0:
+        if borrowData['originationFee'] > 0:
             # fee transfer to feeProvider
             feeProviderAddress = self.getAddress(FEE_PROVIDER)
-            reserve.transfer(feeProviderAddress, userBasicReserveData['originationFee'])
+            reserve.transfer(feeProviderAddress, borrowData['originationFee'])
 
         reserve.transfer(lendingPoolCoreAddress, paybackAmountMinusFees)
         # self._updateSnapshot(_reserve, _sender)
         # transfer excess amount back to the user
         if returnAmount > 0:
             reserve.transfer(_sender, returnAmount)
-        self.Repay(_reserve, _sender, paybackAmountMinusFees, userBasicReserveData['originationFee'],
+        self._updateUserIndexes(_sender, True, True)
+        self.Repay(_reserve, _sender, paybackAmountMinusFees, borrowData['originationFee'],
                    borrowData['borrowBalanceIncrease'])
 
     def liquidationCall(self, _collateral: Address, _reserve: Address, _user: Address, _purchaseAmount: int,
@@ -370,6 +525,7 @@ class LendingPool(Addresses):
         principalCurrency.transfer(lendingPoolCoreAddress, liquidation['actualAmountToLiquidate'])
         if _purchaseAmount > liquidation['actualAmountToLiquidate']:
             principalCurrency.transfer(_sender, _purchaseAmount - liquidation['actualAmountToLiquidate'])
+        self._updateUserIndexes(_user, True, True)
 
     @external
     def tokenFallback(self, _from: Address, _value: int, _data: bytes) -> None:
@@ -393,17 +549,105 @@ class LendingPool(Addresses):
                                  Address.from_string(reserve),
                                  Address.from_string(user),
                                  _value, _from)
+        elif method == "multicall" and params is not None:
+            # _from is only trusted when the sender is a reserve token reporting a real transfer
+            core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
+            self._require(self.msg.sender in core.getReserves(), f"Multicall token {self.msg.sender} is not a reserve")
+            self._multicall(params.get("actions"), _from, self.msg.sender, _value)
         else:
             revert(f'{TAG}: No valid method called, data: {_data}')
 
+    @payable
+    @external
+    def multicall(self, _actions: bytes) -> None:
+        """
+        runs an ordered list of actions for the sender in a single transaction. Tokens sent with a multicall through
+        tokenFallback fund its deposit and repay actions, icx sent with this call funds its deposit actions.
+        :param _actions: json list of {"method": ..., "params": {...}}, with the methods deposit, borrow, repay,
+                         redeem, claimRewards, stake and unstake taking the params of the matching entry point
+        """
+        try:
+            actions = json_loads(_actions.decode("utf-8"))
+        except Exception:
+            revert(f'{TAG}: Invalid multicall actions: {_actions}.')
+        self._multicall(actions, self.msg.sender, None, 0)
+
+    def _multicall(self, _actions: list, _user: Address, _token: Address, _tokenValue: int) -> None:
+        self._require(isinstance(_actions, list) and 0 < len(_actions) <= MULTICALL_ACTION_LIMIT,
+                      f"Multicall takes 1 to {MULTICALL_ACTION_LIMIT} actions")
+        if _token is not None:
+            # unfunded actions only run through the direct multicall, where the sender is the user
+            self._require(any(isinstance(action, dict) and action.get("method") in ("deposit", "repay")
+                              for action in _actions),
+                          "Token multicall needs a deposit or repay action")
+        self._checkAndEnableFeeSharing()
+        self._pendingUserUpdates = {}
+        icxValue = self.msg.value
+
+        for action in _actions:
+            method = action.get("method")
+            params = action.get("params") or {}
+            if method == "deposit":
+                amount = self._toInt(params.get("_amount"))
+                if _token is None:
+                    self._require(0 < amount <= icxValue, f"Multicall deposit of {amount} exceeds the icx sent")
+                    icxValue -= amount
+                    self._deposit(self.getAddress(sICX), amount, _user, amount)
+                else:
+                    self._require(0 < amount <= _tokenValue, f"Multicall deposit of {amount} exceeds the tokens sent")
+                    _tokenValue -= amount
+                    self._deposit(_token, amount, _user)
+            elif method == "repay":
+                amount = self._toInt(params.get("_amount"))
+                self._require(_token is not None and 0 < amount <= _tokenValue,
+                              f"Multicall repay of {amount} exceeds the tokens sent")
+                _tokenValue -= amount
+                self._repay(_token, amount, _user)
+            elif method == "borrow":
+                self._borrow(Address.from_string(params.get("_reserve")), self._toInt(params.get("_amount")), _user)
+            elif method == "redeem":
+                self._redeem(Address.from_string(params.get("_oToken")), self._toInt(params.get("_amount")),
+                             bool(params.get("_waitForUnstaking", False)), _user)
+            elif method == "claimRewards":
+                self._claimRewards(_user)
+            elif method == "stake":
+                self._stake(self._toInt(params.get("_value")), _user)
+            elif method == "unstake":
+                self._unstake(self._toInt(params.get("_value")), _user)
+            else:
+                revert(f'{TAG}: Invalid multicall method {method}')
+
+        self._require(icxValue == 0 and _tokenValue == 0, "Multicall did not use all the funds sent")
+
+        pendingUserUpdates = self._pendingUserUpdates
+        self._pendingUserUpdates = None
+        for user, (activeWallet, healthFactor) in pendingUserUpdates.items():
+            self._updateUserIndexes(user, activeWallet, healthFactor)
+
     @staticmethod
-    def _get_array_items(arraydb, index: int = 0) -> list:
-        length = len(arraydb)
-        start = index * BATCH_SIZE
+    def _toInt(_value) -> int:
+        if isinstance(_value, str):
+            return int(_value, 0)
+        if isinstance(_value, int) and not isinstance(_value, bool):
+            return _value
+        revert(f'{TAG}: Invalid amount {_value}')
 
-        if start >= length:
+    @staticmethod
+    def _get_wallet_range(setdb, legacy, start: int, count: int) -> list:
+        if start < 0 or count <= 0:
             return []
+        wallets = [item for item in setdb.range(start, start + count)]
+        legacyStart = max(start - len(setdb), 0)
+        legacyEnd = min(legacyStart + count - len(wallets), len(legacy))
+        wallets.extend(legacy[index] for index in range(legacyStart, legacyEnd))
+        return wallets
 
-        end = start + BATCH_SIZE
-        end = length if end > length else end
-        return [arraydb[i] for i in range(start, end)]
+    @staticmethod
+    def _get_wallet_page(setdb, legacy, cursor: int, limit: int) -> dict:
+        # removals swap the last wallet into the freed slot, so a wallet may move behind the cursor between pages
+        wallets = LendingPool._get_wallet_range(setdb, legacy, cursor, limit)
+        nextCursor = cursor + len(wallets)
+        return {
+            'wallets': wallets,
+            'nextCursor': nextCursor if len(wallets) > 0 and nextCursor < len(setdb) + len(legacy) else -1
+        }
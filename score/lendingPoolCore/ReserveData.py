@@ -1,9 +1,57 @@
 from iconservice import *
 
 
+# Order of the fields inside the packed reserve record. New fields must only ever be appended.
+RESERVE_FIELDS = ('reserveAddress', 'oTokenAddress', 'dTokenAddress', 'lastUpdateTimestamp', 'liquidityRate',
+                  'borrowRate', 'borrowThreshold', 'liquidityCumulativeIndex', 'borrowCumulativeIndex',
+                  'baseLTVasCollateral', 'liquidationThreshold', 'liquidationBonus', 'decimals', 'borrowingEnabled',
+                  'usageAsCollateralEnabled', 'isFreezed', 'isActive', 'availableLiquidity', 'totalBorrows')
+# liquidity accounting kept by core itself, never overwritten by reserve configuration updates
+LEDGER_FIELDS = ('availableLiquidity', 'totalBorrows')
+ADDRESS_FIELDS = ('reserveAddress', 'oTokenAddress', 'dTokenAddress')
+BOOL_FIELDS = ('borrowingEnabled', 'usageAsCollateralEnabled', 'isFreezed', 'isActive')
+
+
+def _defaultValue(field: str):
+    if field in ADDRESS_FIELDS:
+        return None
+    if field in BOOL_FIELDS:
+        return False
+    return 0
+
+
+def packReserveRecord(reserveData: dict) -> str:
+    record = []
+    for field in RESERVE_FIELDS:
+        value = reserveData.get(field, _defaultValue(field))
+        if field in ADDRESS_FIELDS and value is not None:
+            value = str(value)
+        record.append(value)
+    return json_dumps(record)
+
+
+def unpackReserveRecord(record: str) -> dict:
+    if not record:
+        return {field: _defaultValue(field) for field in RESERVE_FIELDS}
+    values = json_loads(record)
+    reserveData = {}
+    for index, field in enumerate(RESERVE_FIELDS):
+        value = values[index] if index < len(values) else _defaultValue(field)
+        if field in ADDRESS_FIELDS and value is not None:
+            value = Address.from_string(value)
+        reserveData[field] = value
+    return reserveData
+
+
 class ReserveData(object):
 
     def __init__(self, db: IconScoreDatabase) -> None:
+        self.record = VarDB('record', db, str)
+        self._caching = False
+        self._cache = None
+        self._dirty = False
+
+        # legacy one-slot-per-field layout, only read while migrating to the packed record
         self.reserveAddress = VarDB('id', db, Address)
         self.oTokenAddress = VarDB('oToken', db, Address)
         self.dTokenAddress = VarDB('dToken', db, Address)
@@ -22,80 +70,106 @@ class ReserveData(object):
         self.isFreezed = VarDB('isFreezed', db, bool)
         self.isActive = VarDB('Active', db, bool)
 
+    def get(self) -> dict:
+        if not self._caching:
+            return unpackReserveRecord(self.record.get())
+        if self._cache is None:
+            self._cache = unpackReserveRecord(self.record.get())
+        return dict(self._cache)
+
+    def set(self, reserveData: dict) -> None:
+        if self._caching:
+            self._cache = dict(reserveData)
+            self._dirty = True
+        else:
+            self.record.set(packReserveRecord(reserveData))
+
+    def update(self, **kwargs) -> None:
+        reserveData = self.get()
+        reserveData.update(kwargs)
+        self.set(reserveData)
+
+    def startCaching(self) -> None:
+        self._caching = True
+        self._cache = None
+        self._dirty = False
+
+    def flush(self) -> None:
+        if self._dirty:
+            self.record.set(packReserveRecord(self._cache))
+            self._dirty = False
+
+    def stopCaching(self) -> None:
+        self._caching = False
+        self._cache = None
+        self._dirty = False
+
+    def migrate(self) -> bool:
+        """
+        Moves a reserve stored in the legacy per-field layout into the packed record and clears the old slots.
+        Returns False if the reserve has already been migrated.
+        """
+        if self.record.get():
+            return False
+        reserveData = {field: getattr(self, field).get() for field in RESERVE_FIELDS if field not in LEDGER_FIELDS}
+        self.set(reserveData)
+        for field in RESERVE_FIELDS:
+            if field not in LEDGER_FIELDS:
+                getattr(self, field).remove()
+        return True
+
 
 class ReserveDataDB:
 
     def __init__(self, db: IconScoreDatabase):
         self._db = db
         self._items = {}
+        self._caching = False
 
     def __getitem__(self, prefix: bytes) -> ReserveData:
         if prefix not in self._items:
             sub_db = self._db.get_sub_db(prefix)
             self._items[prefix] = ReserveData(sub_db)
+            if self._caching:
+                self._items[prefix].startCaching()
 
         return self._items[prefix]
 
     def __setitem__(self, key, value):
         revert('illegal access')
 
+    def isCaching(self) -> bool:
+        return self._caching
+
+    def startCaching(self) -> None:
+        """
+        Keeps every reserve record in memory until `flush` is called. Only meant to live for a single external call.
+        """
+        self._caching = True
+        for item in self._items.values():
+            item.startCaching()
+
+    def flush(self) -> None:
+        for item in self._items.values():
+            item.flush()
+
+    def stopCaching(self) -> None:
+        self._caching = False
+        for item in self._items.values():
+            item.stopCaching()
+
 
 def addDataToReserve(prefix: bytes, _reserve: 'ReserveDataDB', reserveData: 'ReserveDataObject'):
-    _reserve[prefix].dTokenAddress.set(reserveData.dTokenAddress)
-    _reserve[prefix].reserveAddress.set(reserveData.reserveAddress)
-    _reserve[prefix].oTokenAddress.set(reserveData.oTokenAddress)
-    _reserve[prefix].lastUpdateTimestamp.set(reserveData.lastUpdateTimestamp)
-    _reserve[prefix].liquidityRate.set(reserveData.liquidityRate)
-    _reserve[prefix].borrowRate.set(reserveData.borrowRate)
-    _reserve[prefix].liquidityCumulativeIndex.set(reserveData.liquidityCumulativeIndex)
-    _reserve[prefix].borrowCumulativeIndex.set(reserveData.borrowCumulativeIndex)
-    _reserve[prefix].baseLTVasCollateral.set(reserveData.baseLTVasCollateral)
-    _reserve[prefix].liquidationThreshold.set(reserveData.liquidationThreshold)
-    _reserve[prefix].liquidationBonus.set(reserveData.liquidationBonus)
-    _reserve[prefix].decimals.set(reserveData.decimals)
-    _reserve[prefix].borrowingEnabled.set(reserveData.borrowingEnabled)
-    _reserve[prefix].usageAsCollateralEnabled.set(reserveData.usageAsCollateralEnabled)
-    _reserve[prefix].isFreezed.set(reserveData.isFreezed)
-    _reserve[prefix].isActive.set(reserveData.isActive)
+    data = _reserve[prefix].get()
+    for field in RESERVE_FIELDS:
+        # borrow threshold is only ever changed through its own governance setter
+        if field != 'borrowThreshold' and field not in LEDGER_FIELDS:
+            data[field] = getattr(reserveData, field)
+    _reserve[prefix].set(data)
 
 
 def getDataFromReserve(prefix: bytes, _reserve: 'ReserveDataDB') -> dict:
-    reserveAddress = _reserve[prefix].reserveAddress.get()
-    oTokenAddress = _reserve[prefix].oTokenAddress.get()
-    dTokenAddress = _reserve[prefix].dTokenAddress.get()
-    lastUpdateTimestamp = _reserve[prefix].lastUpdateTimestamp.get()
-    liquidityRate = _reserve[prefix].liquidityRate.get()
-    borrowRate = _reserve[prefix].borrowRate.get()
-    borrowThreshold = _reserve[prefix].borrowThreshold.get()
-    liquidityCumulativeIndex = _reserve[prefix].liquidityCumulativeIndex.get()
-    borrowCumulativeIndex = _reserve[prefix].borrowCumulativeIndex.get()
-    baseLTVasCollateral = _reserve[prefix].baseLTVasCollateral.get()
-    liquidationThreshold = _reserve[prefix].liquidationThreshold.get()
-    liquidationBonus = _reserve[prefix].liquidationBonus.get()
-    decimals = _reserve[prefix].decimals.get()
-    borrowingEnabled = _reserve[prefix].borrowingEnabled.get()
-    usageAsCollateralEnabled = _reserve[prefix].usageAsCollateralEnabled.get()
-    isFreezed = _reserve[prefix].isFreezed.get()
-    isActive = _reserve[prefix].isActive.get()
-    return {
-        'reserveAddress': reserveAddress,
-        'oTokenAddress': oTokenAddress,
-        'dTokenAddress': dTokenAddress,
-        'lastUpdateTimestamp': lastUpdateTimestamp,
-        'liquidityRate': liquidityRate,
-        'borrowRate': borrowRate,
-        'borrowThreshold': borrowThreshold,
-        'liquidityCumulativeIndex': liquidityCumulativeIndex,
-        'borrowCumulativeIndex': borrowCumulativeIndex,
-        'baseLTVasCollateral': baseLTVasCollateral,
-        'liquidationThreshold': liquidationThreshold,
-        'liquidationBonus': liquidationBonus,
-        'decimals': decimals,
-        'borrowingEnabled': borrowingEnabled,
-        'usageAsCollateralEnabled': usageAsCollateralEnabled,
-        'isFreezed': isFreezed,
-        'isActive': isActive
-    }
+    return _reserve[prefix].get()
 
 
 def createReserveDataObject(reserveData: dict) -> 'ReserveDataObject':
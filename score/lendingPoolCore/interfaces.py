@@ -38,6 +38,11 @@ class Constant(TypedDict):
     slopeRate2: int
 
 
+class ReservePrice(TypedDict):
+    reserve: Address
+    price: int
+
+
 class PrepDelegations(TypedDict):
     _address: Address
     _votes_in_per: int
@@ -54,7 +59,11 @@ class OTokenInterface(InterfaceScore):
         pass
 
     @interface
-    def getUserLiquidityCumulativeIndex(self, _user: Address) -> int:
+    def scaledBalanceOf(self, _user: Address) -> int:
+        pass
+
+    @interface
+    def balancesOf(self, _users: List[Address]) -> dict:
         pass
 
 
@@ -69,23 +78,31 @@ class DTokenInterface(InterfaceScore):
         pass
 
     @interface
-    def mintOnBorrow(self, _user: Address, _amount: int, _balanceIncrease: int):
+    def mintOnBorrow(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int):
         pass
 
     @interface
     def getUserBorrowCumulativeIndex(self, _user: Address) -> int:
         pass
 
+    @interface
+    def scaledBalanceOf(self, _user: Address) -> int:
+        pass
+
+    @interface
+    def balancesOf(self, _users: List[Address]) -> dict:
+        pass
+
     @interface
     def principalTotalSupply(self) -> int:
         pass
 
     @interface
-    def burnOnRepay(self, _user: Address, _amount: int, _balanceIncrease: int):
+    def burnOnRepay(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int):
         pass
 
     @interface
-    def burnOnLiquidation(self, _user: Address, _amount: int, _balanceIncrease: int) -> None:
+    def burnOnLiquidation(self, _user: Address, _amount: int, _balanceIncrease: int, _index: int) -> None:
         pass
 
 
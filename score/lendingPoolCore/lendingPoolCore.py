@@ -6,16 +6,30 @@ from .addresses import *
 RESERVE_DB_PREFIX = b'reserve'
 USER_DB_PREFIX = b'userReserve'
 
+# Layout of the per user reserve bitmap: bit 0 flags the bitmap as initialized, reserve i of the reserve list
+# owns bit 2i + 1 (holds oTokens) and bit 2i + 2 (holds dTokens).
+USER_RESERVES_INITIALIZED = 1
+
+
+def collateralBit(_index: int) -> int:
+    return 1 << (2 * _index + 1)
+
+
+def debtBit(_index: int) -> int:
+    return 1 << (2 * _index + 2)
+
 
 class LendingPoolCore(Addresses):
     _ID = 'id'
     _RESERVE_LIST = 'reserveList'
     _CONSTANTS = 'constants'
+    _USER_RESERVES = 'userReserves'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         super().__init__(db)
         self._reserveList = ArrayDB(self._RESERVE_LIST, db, value_type=Address)
         self._constants = DictDB(self._CONSTANTS, db, value_type=int, depth=2)
+        self._userReserves = DictDB(self._USER_RESERVES, db, value_type=int)
         self.reserve = ReserveDataDB(db)
         self.userReserve = UserReserveDataDB(db)
 
@@ -24,6 +38,9 @@ class LendingPoolCore(Addresses):
 
     def on_update(self) -> None:
         super().on_update()
+        for reserve in self._reserveList:
+            self.reserve[self.reservePrefix(reserve)].migrate()
+            self._reconcileReserveLiquidity(reserve)
 
     @eventlog(indexed=3)
     def ReserveUpdated(self, _reserve: Address, _liquidityRate: int, _borrowRate: int, _liquidityCumulativeIndex: int,
@@ -34,6 +51,10 @@ class LendingPoolCore(Addresses):
     def InterestTransfer(self, _amount: int, _reserve: Address, _initiatiator: Address):
         pass
 
+    @eventlog(indexed=1)
+    def ReserveLiquidityReconciled(self, _reserve: Address, _availableLiquidity: int, _totalBorrows: int):
+        pass
+
     @external(readonly=True)
     def name(self) -> str:
         return f'Omm {TAG}'
@@ -48,19 +69,19 @@ class LendingPoolCore(Addresses):
 
     def updateDToken(self, _reserve: Address, _dToken: Address):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].dTokenAddress.set(_dToken)
+        self.reserve[prefix].update(dTokenAddress=_dToken)
 
     def updateLastUpdateTimestamp(self, _reserve: Address, _lastUpdateTimestamp: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].lastUpdateTimestamp.set(_lastUpdateTimestamp)
+        self.reserve[prefix].update(lastUpdateTimestamp=_lastUpdateTimestamp)
 
     def updateLiquidityRate(self, _reserve: Address, _liquidityRate: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].liquidityRate.set(_liquidityRate)
+        self.reserve[prefix].update(liquidityRate=_liquidityRate)
 
     def updateBorrowRate(self, _reserve: Address, _borrowRate: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].borrowRate.set(_borrowRate)
+        self.reserve[prefix].update(borrowRate=_borrowRate)
 
     @only_governance
     @external
@@ -68,65 +89,65 @@ class LendingPoolCore(Addresses):
         prefix = self.reservePrefix(_reserve)
         if _borrowThreshold < 0 or _borrowThreshold > EXA:
             revert(f"{TAG} : Invalid borrow threshold value")
-        self.reserve[prefix].borrowThreshold.set(_borrowThreshold)
+        self.reserve[prefix].update(borrowThreshold=_borrowThreshold)
 
     def updateBorrowCumulativeIndex(self, _reserve: Address, _borrowCumulativeIndex: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].borrowCumulativeIndex.set(_borrowCumulativeIndex)
+        self.reserve[prefix].update(borrowCumulativeIndex=_borrowCumulativeIndex)
 
     def updateLiquidityCumulativeIndex(self, _reserve: Address, _liquidityCumulativeIndex: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].liquidityCumulativeIndex.set(_liquidityCumulativeIndex)
+        self.reserve[prefix].update(liquidityCumulativeIndex=_liquidityCumulativeIndex)
 
     @only_governance
     @external()
     def updateBaseLTVasCollateral(self, _reserve: Address, _baseLTVasCollateral: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].baseLTVasCollateral.set(_baseLTVasCollateral)
+        self.reserve[prefix].update(baseLTVasCollateral=_baseLTVasCollateral)
 
     @only_governance
     @external()
     def updateLiquidationThreshold(self, _reserve: Address, _liquidationThreshold: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].liquidationThreshold.set(_liquidationThreshold)
+        self.reserve[prefix].update(liquidationThreshold=_liquidationThreshold)
 
     @only_governance
     @external()
     def updateLiquidationBonus(self, _reserve: Address, _liquidationBonus: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].liquidationBonus.set(_liquidationBonus)
+        self.reserve[prefix].update(liquidationBonus=_liquidationBonus)
 
     def updateDecimals(self, _reserve: Address, _decimals: int):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].decimals.set(_decimals)
+        self.reserve[prefix].update(decimals=_decimals)
 
     @only_governance
     @external()
     def updateBorrowingEnabled(self, _reserve: Address, _borrowingEnabled: bool):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].borrowingEnabled.set(_borrowingEnabled)
+        self.reserve[prefix].update(borrowingEnabled=_borrowingEnabled)
 
     @only_governance
     @external()
     def updateUsageAsCollateralEnabled(self, _reserve: Address, _usageAsCollateralEnabled: bool):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].usageAsCollateralEnabled.set(_usageAsCollateralEnabled)
+        self.reserve[prefix].update(usageAsCollateralEnabled=_usageAsCollateralEnabled)
 
     @only_governance
     @external()
     def updateIsFreezed(self, _reserve: Address, _isFreezed: bool):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].isFreezed.set(_isFreezed)
+        self.reserve[prefix].update(isFreezed=_isFreezed)
 
     @only_governance
     @external()
     def updateIsActive(self, _reserve: Address, _isActive: bool):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].isActive.set(_isActive)
+        self.reserve[prefix].update(isActive=_isActive)
 
     def updateOtokenAddress(self, _reserve: Address, _oTokenAddress: Address):
         prefix = self.reservePrefix(_reserve)
-        self.reserve[prefix].oTokenAddress.set(_oTokenAddress)
+        self.reserve[prefix].update(oTokenAddress=_oTokenAddress)
 
     # Update methods for user attributes for a specific reserve
     def updateUserLastUpdateTimestamp(self, _reserve: Address, _user: Address,
@@ -148,19 +169,111 @@ class LendingPoolCore(Addresses):
     def _addNewReserve(self, _res: Address):
         self._reserveList.put(_res)
 
+    def _queryUserReserves(self, _user: Address) -> int:
+        userReserves = USER_RESERVES_INITIALIZED
+        for index, reserve in enumerate(self._reserveList):
+            reserveData = getDataFromReserve(self.reservePrefix(reserve), self.reserve)
+            oToken = self.create_interface_score(reserveData['oTokenAddress'], OTokenInterface)
+            dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
+            if oToken.scaledBalanceOf(_user) > 0:
+                userReserves |= collateralBit(index)
+            if dToken.principalBalanceOf(_user) > 0:
+                userReserves |= debtBit(index)
+        return userReserves
+
+    @external
+    def updateUserReserveParticipation(self, _reserve: Address, _user: Address, _hasBalance: bool) -> None:
+        """
+        called by the oToken and dToken of a reserve whenever the principal balance of a user changes
+        from zero to non zero or back
+        :param _reserve: the address of the reserve
+        :param _user: the address of the user
+        :param _hasBalance: whether the user holds a principal balance after the change
+        """
+        for index, reserve in enumerate(self._reserveList):
+            if reserve == _reserve:
+                break
+        else:
+            revert(f"{TAG}: invalid reserve {_reserve}")
+
+        reserveData = getDataFromReserve(self.reservePrefix(_reserve), self.reserve)
+        if self.msg.sender == reserveData['oTokenAddress']:
+            bit = collateralBit(index)
+        elif self.msg.sender == reserveData['dTokenAddress']:
+            bit = debtBit(index)
+        else:
+            revert(f"{TAG}: SenderNotAuthorized: (sender){self.msg.sender} is not a token of reserve {_reserve}")
+
+        userReserves = self._userReserves[_user]
+        if not userReserves & USER_RESERVES_INITIALIZED:
+            # the token has already updated its balance, so querying every token also covers this change
+            self._userReserves[_user] = self._queryUserReserves(_user)
+            return
+
+        if _hasBalance:
+            updatedUserReserves = userReserves | bit
+        else:
+            updatedUserReserves = userReserves & ~bit
+        if updatedUserReserves != userReserves:
+            self._userReserves[_user] = updatedUserReserves
+
+    @only_owner
+    @external
+    def initializeUserReserves(self, _users: List[Address]) -> None:
+        """
+        builds the reserve bitmap of users that held positions before the bitmap was introduced
+        :param _users: a page of user addresses
+        """
+        for user in _users:
+            if not self._userReserves[user] & USER_RESERVES_INITIALIZED:
+                self._userReserves[user] = self._queryUserReserves(user)
+
+    @external(readonly=True)
+    def getUserActiveReserves(self, _user: Address) -> list:
+        """
+        returns the reserves in which the user holds oTokens or dTokens. Every reserve is returned for users whose
+        bitmap has not been initialized yet.
+        """
+        userReserves = self._userReserves[_user]
+        if not userReserves & USER_RESERVES_INITIALIZED:
+            return self.getReserves()
+        return [
+            reserve for index, reserve in enumerate(self._reserveList)
+            if userReserves & (collateralBit(index) | debtBit(index))
+        ]
+
+    @external(readonly=True)
+    def getUserPositionFlags(self, _user: Address) -> dict:
+        """
+        returns whether the user holds oTokens and dTokens of any reserve
+        """
+        userReserves = self._userReserves[_user]
+        if not userReserves & USER_RESERVES_INITIALIZED:
+            userReserves = self._queryUserReserves(_user)
+        collateralMask = 0
+        debtMask = 0
+        for index in range(len(self._reserveList)):
+            collateralMask |= collateralBit(index)
+            debtMask |= debtBit(index)
+        return {
+            'hasDeposits': userReserves & collateralMask != 0,
+            'hasBorrows': userReserves & debtMask != 0
+        }
+
     @external(readonly=True)
     def getReserveLiquidityCumulativeIndex(self, _reserve: Address) -> int:
         prefix = self.reservePrefix(_reserve)
-        return self.reserve[prefix].liquidityCumulativeIndex.get()
+        return getDataFromReserve(prefix, self.reserve)['liquidityCumulativeIndex']
 
     @external(readonly=True)
     def getReserveBorrowCumulativeIndex(self, _reserve: Address) -> int:
         prefix = self.reservePrefix(_reserve)
-        return self.reserve[prefix].borrowCumulativeIndex.get()
+        return getDataFromReserve(prefix, self.reserve)['borrowCumulativeIndex']
 
     @external(readonly=True)
     def isReserveBorrowingEnabled(self, _reserve: Address) -> bool:
-        return self.getReserveData(_reserve)['borrowingEnabled']
+        prefix = self.reservePrefix(_reserve)
+        return getDataFromReserve(prefix, self.reserve)['borrowingEnabled']
 
     @only_governance
     @external
@@ -175,18 +288,39 @@ class LendingPoolCore(Addresses):
     def getReserveData(self, _reserve: Address) -> dict:
         if self._check_reserve(_reserve):
             prefix = self.reservePrefix(_reserve)
-            response = getDataFromReserve(prefix, self.reserve)
-            response['totalLiquidity'] = self.getReserveTotalLiquidity(_reserve)
-            response['availableLiquidity'] = self.getReserveAvailableLiquidity(_reserve)
-            response['totalBorrows'] = self.getReserveTotalBorrows(_reserve)
-
-            availableBorrows = exaMul(response['borrowThreshold'], response['totalLiquidity']) - response[
-                'totalBorrows']
-            response['availableBorrows'] = max(availableBorrows, 0)
+            response = self._reserveDataResponse(getDataFromReserve(prefix, self.reserve))
         else:
             response = {}
         return response
 
+    @staticmethod
+    def _reserveDataResponse(reserveData: dict) -> dict:
+        response = dict(reserveData)
+        response['totalLiquidity'] = response['availableLiquidity'] + response['totalBorrows']
+
+        availableBorrows = exaMul(response['borrowThreshold'], response['totalLiquidity']) - response[
+            'totalBorrows']
+        response['availableBorrows'] = max(availableBorrows, 0)
+        return response
+
+    @external(readonly=True)
+    def getAllReservesSnapshot(self) -> dict:
+        """
+        returns the reserve data, configuration, interest rate constants and the current normalized income and debt
+        of every reserve, keyed by the reserve address
+        """
+        response = {}
+        for reserve in self._reserveList:
+            reserveData = getDataFromReserve(self.reservePrefix(reserve), self.reserve)
+            response[str(reserve)] = {
+                'data': self._reserveDataResponse(reserveData),
+                'configuration': self._reserveConfigurationResponse(reserveData),
+                'constants': self.getReserveConstants(reserve),
+                'normalizedIncome': self._normalizedIncome(reserveData),
+                'normalizedDebt': self._normalizedDebt(reserveData)
+            }
+        return response
+
     @external(readonly=True)
     def getUserReserveData(self, _reserve: Address, _user: Address) -> dict:
         if self._check_reserve(_reserve):
@@ -207,50 +341,87 @@ class LendingPoolCore(Addresses):
     def calculateCompoundedInterest(self, _rate: int, _lastUpdateTimestamp: int) -> int:
         timeDifference = (self.now() - _lastUpdateTimestamp) // 10 ** 6
         ratePerSecond = _rate // SECONDS_PER_YEAR
-        return exaPow((ratePerSecond + EXA), timeDifference)
+        return exaPowBinomial((ratePerSecond + EXA), timeDifference)
 
     @external(readonly=True)
     def getNormalizedIncome(self, _reserve: Address) -> int:
-        reserveData = self.getReserveData(_reserve)
+        prefix = self.reservePrefix(_reserve)
+        return self._normalizedIncome(getDataFromReserve(prefix, self.reserve))
+
+    def _normalizedIncome(self, reserveData: dict) -> int:
         interest = self.calculateLinearInterest(reserveData['liquidityRate'], reserveData['lastUpdateTimestamp'])
         cumulated = exaMul(interest, reserveData['liquidityCumulativeIndex'])
         return cumulated
 
     @external(readonly=True)
     def getNormalizedDebt(self, _reserve: Address) -> int:
-        reserveData = self.getReserveData(_reserve)
+        prefix = self.reservePrefix(_reserve)
+        return self._normalizedDebt(getDataFromReserve(prefix, self.reserve))
+
+    def _normalizedDebt(self, reserveData: dict) -> int:
         interest = self.calculateCompoundedInterest(reserveData['borrowRate'], reserveData['lastUpdateTimestamp'])
         cumulated = exaMul(interest, reserveData['borrowCumulativeIndex'])
         return cumulated
 
+    def _borrowIndex(self, _reserve: Address) -> int:
+        # the borrow index right after updateCumulativeIndexes, which the normalized debt equals for the rest of the
+        # state update
+        return getDataFromReserve(self.reservePrefix(_reserve), self.reserve)['borrowCumulativeIndex']
+
     def updateCumulativeIndexes(self, _reserve: Address) -> None:
-        reserveData = self.getReserveData(_reserve)
-        totalBorrows = reserveData['totalBorrows']
+        prefix = self.reservePrefix(_reserve)
+        reserveData = getDataFromReserve(prefix, self.reserve)
 
-        if totalBorrows > 0:
+        if reserveData['totalBorrows'] > 0:
             cumulatedLiquidityInterest = self.calculateLinearInterest(reserveData['liquidityRate'],
                                                                       reserveData['lastUpdateTimestamp'])
-            self.updateLiquidityCumulativeIndex(_reserve, exaMul(cumulatedLiquidityInterest,
-                                                                 reserveData['liquidityCumulativeIndex']))
             cumulatedBorrowInterest = self.calculateCompoundedInterest(reserveData['borrowRate'],
                                                                        reserveData['lastUpdateTimestamp'])
-            self.updateBorrowCumulativeIndex(_reserve,
-                                             exaMul(cumulatedBorrowInterest, reserveData['borrowCumulativeIndex']))
+            self.reserve[prefix].update(
+                liquidityCumulativeIndex=exaMul(cumulatedLiquidityInterest, reserveData['liquidityCumulativeIndex']),
+                borrowCumulativeIndex=exaMul(cumulatedBorrowInterest, reserveData['borrowCumulativeIndex'])
+            )
 
     @external(readonly=True)
     def getReserveAvailableLiquidity(self, _reserve: Address) -> int:
-        reserveScore = self.create_interface_score(_reserve, ReserveInterface)
-        balance = reserveScore.balanceOf(self.address)
-        return balance
+        prefix = self.reservePrefix(_reserve)
+        return getDataFromReserve(prefix, self.reserve)['availableLiquidity']
 
     def getReserveTotalLiquidity(self, _reserve: Address) -> int:
         return self.getReserveAvailableLiquidity(_reserve) + self.getReserveTotalBorrows(_reserve)
 
     def getReserveTotalBorrows(self, _reserve: Address) -> int:
         prefix = self.reservePrefix(_reserve)
+        return getDataFromReserve(prefix, self.reserve)['totalBorrows']
+
+    def updateReserveLiquidity(self, _reserve: Address, _availableLiquidityChange: int = 0,
+                               _totalBorrowsChange: int = 0) -> None:
+        prefix = self.reservePrefix(_reserve)
         reserveData = getDataFromReserve(prefix, self.reserve)
-        dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
-        return dToken.principalTotalSupply()
+        self.reserve[prefix].update(availableLiquidity=reserveData['availableLiquidity'] + _availableLiquidityChange,
+                                    totalBorrows=reserveData['totalBorrows'] + _totalBorrowsChange)
+
+    def _reconcileReserveLiquidity(self, _reserve: Address) -> None:
+        prefix = self.reservePrefix(_reserve)
+        reserveScore = self.create_interface_score(_reserve, ReserveInterface)
+        dToken = self.create_interface_score(getDataFromReserve(prefix, self.reserve)['dTokenAddress'],
+                                             DTokenInterface)
+        availableLiquidity = reserveScore.balanceOf(self.address)
+        totalBorrows = dToken.principalTotalSupply()
+        self.reserve[prefix].update(availableLiquidity=availableLiquidity, totalBorrows=totalBorrows)
+        self.ReserveLiquidityReconciled(_reserve, availableLiquidity, totalBorrows)
+
+    @only_governance
+    @external
+    def reconcileReserveLiquidity(self, _reserve: Address) -> None:
+        """
+        resyncs the available liquidity and total borrows tracked by core with the reserve token balance of core
+        and the principal total supply of the debt token
+        :param _reserve: the address of the reserve
+        """
+        if not self._check_reserve(_reserve):
+            revert(f"{TAG}: invalid reserve {_reserve}")
+        self._reconcileReserveLiquidity(_reserve)
 
     def getReserveUtilizationRate(self, _reserve: Address) -> int:
         reserveData = self.getReserveData(_reserve)
@@ -265,7 +436,11 @@ class LendingPoolCore(Addresses):
 
     @external(readonly=True)
     def getReserveConfiguration(self, _reserve: Address) -> dict:
-        reserveData = self.getReserveData(_reserve)
+        prefix = self.reservePrefix(_reserve)
+        return self._reserveConfigurationResponse(getDataFromReserve(prefix, self.reserve))
+
+    @staticmethod
+    def _reserveConfigurationResponse(reserveData: dict) -> dict:
         response = {
             'decimals': reserveData['decimals'],
             'baseLTVasCollateral': reserveData['baseLTVasCollateral'],
@@ -280,17 +455,18 @@ class LendingPoolCore(Addresses):
 
     def updateReserveInterestRatesAndTimestampInternal(self, _reserve: Address, _liquidityAdded: int,
                                                        _liquidityTaken: int) -> None:
-        reserveData = self.getReserveData(_reserve)
-        rate = self.calculateInterestRates(_reserve, self.getReserveAvailableLiquidity(
-            _reserve) + _liquidityAdded - _liquidityTaken, reserveData['totalBorrows'])
-        self.updateLiquidityRate(_reserve, rate['liquidityRate'])
-        self.updateBorrowRate(_reserve, rate['borrowRate'])
-        self.updateLastUpdateTimestamp(_reserve, self.now())
+        prefix = self.reservePrefix(_reserve)
+        reserveData = getDataFromReserve(prefix, self.reserve)
+        availableLiquidity = reserveData['availableLiquidity'] + _liquidityAdded - _liquidityTaken
+        rate = self.calculateInterestRates(_reserve, availableLiquidity, reserveData['totalBorrows'])
+        self.reserve[prefix].update(liquidityRate=rate['liquidityRate'], borrowRate=rate['borrowRate'],
+                                    lastUpdateTimestamp=self.now(), availableLiquidity=availableLiquidity)
 
         self.ReserveUpdated(_reserve, rate['liquidityRate'], rate['borrowRate'],
                             reserveData['liquidityCumulativeIndex'], reserveData['borrowCumulativeIndex'])
 
     @only_governance
+    @cache_reserve_state
     @external
     def setReserveConstants(self, _constants: List[Constant]) -> None:
         reserveList = self.getReserves()
@@ -330,6 +506,7 @@ class LendingPoolCore(Addresses):
         reserveScore.transfer(_destination, _amount)
 
     @only_lending_pool
+    @cache_reserve_state
     @external
     def updateStateOnDeposit(self, _reserve: Address, _user: Address, _amount: int) -> None:
 
@@ -337,12 +514,14 @@ class LendingPoolCore(Addresses):
         self.updateReserveInterestRatesAndTimestampInternal(_reserve, _amount, 0)
 
     @only_lending_pool
+    @cache_reserve_state
     @external
     def updateStateOnRedeem(self, _reserve: Address, _user: Address, _amountRedeemed: int) -> None:
         self.updateCumulativeIndexes(_reserve)
         self.updateReserveInterestRatesAndTimestampInternal(_reserve, 0, _amountRedeemed)
 
     @only_lending_pool
+    @cache_reserve_state
     @external
     def updateStateOnBorrow(self, _reserve: Address, _user: Address, _amountBorrowed: int, _borrowFee: int) -> dict:
         balanceIncrease = self.getUserBorrowBalances(_reserve, _user)['borrowBalanceIncrease']
@@ -352,7 +531,8 @@ class LendingPoolCore(Addresses):
             reserve.transfer(self.getAddress(FEE_PROVIDER), balanceIncrease // 10)
             self.InterestTransfer(balanceIncrease // 10, _reserve, _user)
         self.updateCumulativeIndexes(_reserve)
-        dToken.mintOnBorrow(_user, _amountBorrowed, balanceIncrease)
+        dToken.mintOnBorrow(_user, _amountBorrowed, balanceIncrease, self._borrowIndex(_reserve))
+        self.updateReserveLiquidity(_reserve, -(balanceIncrease // 10), _amountBorrowed + balanceIncrease)
         self.updateUserStateOnBorrowInternal(_reserve, _user, _amountBorrowed, balanceIncrease, _borrowFee)
 
         self.updateReserveInterestRatesAndTimestampInternal(_reserve, 0, _amountBorrowed)
@@ -365,23 +545,25 @@ class LendingPoolCore(Addresses):
         }
 
     @only_lending_pool
+    @cache_reserve_state
     @external
     def updateStateOnRepay(self, _reserve: Address, _user: Address, _paybackAmountMinusFees: int,
                            _originationFeeRepaid: int, _balanceIncrease: int, _repaidWholeLoan: bool):
         reserve = self.create_interface_score(_reserve, ReserveInterface)
-        dToken = self.create_interface_score(self.getReserveData(_reserve)['dTokenAddress'], DTokenInterface)
+        dToken = self.create_interface_score(self.getReserveDTokenAddress(_reserve), DTokenInterface)
         if _balanceIncrease > 0:
             reserve.transfer(self.getAddress(FEE_PROVIDER), _balanceIncrease // 10)
             self.InterestTransfer(_balanceIncrease // 10, _reserve, _user)
         self.updateCumulativeIndexes(_reserve)
-        dToken.burnOnRepay(_user, _paybackAmountMinusFees, _balanceIncrease)
+        dToken.burnOnRepay(_user, _paybackAmountMinusFees, _balanceIncrease, self._borrowIndex(_reserve))
+        self.updateReserveLiquidity(_reserve, -(_balanceIncrease // 10), _balanceIncrease - _paybackAmountMinusFees)
         self.updateUserStateOnRepayInternal(_reserve, _user, _paybackAmountMinusFees, _originationFeeRepaid,
                                             _balanceIncrease, _repaidWholeLoan)
         self.updateReserveInterestRatesAndTimestampInternal(_reserve, _paybackAmountMinusFees, 0)
 
     def getCurrentBorrowRate(self, _reserve: Address) -> int:
-        reserveData = self.getReserveData(_reserve)
-        return reserveData['borrowRate']
+        prefix = self.reservePrefix(_reserve)
+        return getDataFromReserve(prefix, self.reserve)['borrowRate']
 
     def updateUserStateOnBorrowInternal(self, _reserve: Address, _user: Address, _amountBorrowed: int,
                                         _balanceIncrease: int, _borrowFee: int):
@@ -400,14 +582,15 @@ class LendingPoolCore(Addresses):
     @external(readonly=True)
     def getReserveOTokenAddress(self, _reserve: Address) -> Address:
         prefix = self.reservePrefix(_reserve)
-        return self.reserve[prefix].oTokenAddress.get()
+        return getDataFromReserve(prefix, self.reserve)['oTokenAddress']
 
     @external(readonly=True)
     def getReserveDTokenAddress(self, _reserve: Address) -> Address:
         prefix = self.reservePrefix(_reserve)
-        return self.reserve[prefix].dTokenAddress.get()
+        return getDataFromReserve(prefix, self.reserve)['dTokenAddress']
 
     @only_liquidation_manager
+    @cache_reserve_state
     @external
     def updateStateOnLiquidation(self, _principalReserve: Address, _collateralReserve: Address, _user: Address,
                                  _amountToLiquidate: int, _collateralToLiquidate: int, _feeLiquidated: int,
@@ -432,8 +615,8 @@ class LendingPoolCore(Addresses):
         self.updateCumulativeIndexes(_principalReserve)
         dTokenAddress = self.getReserveDTokenAddress(_principalReserve)
         dToken = self.create_interface_score(dTokenAddress, DTokenInterface)
-        dToken.burnOnLiquidation(_user, _amountToLiquidate, _balanceIncrease)
-        # self.updateTotalBorrows(_principalReserve, reserveData['totalBorrows'] + _balanceIncrease - _amountToLiquidate)
+        dToken.burnOnLiquidation(_user, _amountToLiquidate, _balanceIncrease, self._borrowIndex(_principalReserve))
+        self.updateReserveLiquidity(_principalReserve, -(_balanceIncrease // 10), _balanceIncrease - _amountToLiquidate)
 
     def updateCollateralReserveStateOnLiquidationInternal(self, _collateralReserve: Address) -> None:
         self.updateCumulativeIndexes(_collateralReserve)
@@ -450,15 +633,13 @@ class LendingPoolCore(Addresses):
 
     @external(readonly=True)
     def getUserUnderlyingAssetBalance(self, _reserve: Address, _user: Address) -> int:
-        reserveData = self.getReserveData(_reserve)
-        oToken = self.create_interface_score(reserveData['oTokenAddress'], OTokenInterface)
+        oToken = self.create_interface_score(self.getReserveOTokenAddress(_reserve), OTokenInterface)
         balance = oToken.balanceOf(_user)
         return balance
 
     @external(readonly=True)
     def getUserUnderlyingBorrowBalance(self, _reserve: Address, _user: Address) -> int:
-        reserveData = self.getReserveData(_reserve)
-        dToken = self.create_interface_score(reserveData['dTokenAddress'], OTokenInterface)
+        dToken = self.create_interface_score(self.getReserveDTokenAddress(_reserve), OTokenInterface)
         balance = dToken.balanceOf(_user)
         return balance
 
@@ -480,7 +661,7 @@ class LendingPoolCore(Addresses):
 
     @external(readonly=True)
     def getUserBorrowBalances(self, _reserve: Address, _user: Address) -> dict:
-        reserveData = self.getReserveData(_reserve)
+        reserveData = getDataFromReserve(self.reservePrefix(_reserve), self.reserve)
         dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
         principalBorrowBalance = dToken.principalBalanceOf(_user)
         if principalBorrowBalance == 0:
@@ -489,7 +670,9 @@ class LendingPoolCore(Addresses):
                 "compoundedBorrowBalance": 0,
                 "borrowBalanceIncrease": 0
             }
-        compoundedBorrowBalance = dToken.balanceOf(_user)
+        compoundedBorrowBalance = self._compoundedBorrowBalance(dToken.scaledBalanceOf(_user), principalBorrowBalance,
+                                                                self._normalizedDebt(reserveData),
+                                                                reserveData['decimals'])
         borrowBalanceIncrease = compoundedBorrowBalance - principalBorrowBalance
         return {
             "principalBorrowBalance": principalBorrowBalance,
@@ -497,6 +680,162 @@ class LendingPoolCore(Addresses):
             "borrowBalanceIncrease": borrowBalanceIncrease
         }
 
+    @external(readonly=True)
+    def getUserDebtPosition(self, _reserve: Address, _user: Address) -> dict:
+        """
+        returns the borrow balances and origination fee of a user in a reserve, along with the reserve status,
+        from a single read of the reserve and one interest computation
+        """
+        if not self._check_reserve(_reserve):
+            revert(f"{TAG}: reserve {_reserve} not found")
+        reserveData = getDataFromReserve(self.reservePrefix(_reserve), self.reserve)
+        dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
+        principalBorrowBalance = dToken.principalBalanceOf(_user)
+        compoundedBorrowBalance = 0
+        if principalBorrowBalance > 0:
+            compoundedBorrowBalance = self._compoundedBorrowBalance(dToken.scaledBalanceOf(_user),
+                                                                    principalBorrowBalance,
+                                                                    self._normalizedDebt(reserveData),
+                                                                    reserveData['decimals'])
+        originationFee = getDataFromUserReserve(self.userReservePrefix(_reserve, _user),
+                                                self.userReserve)['originationFee']
+        return {
+            'isActive': reserveData['isActive'],
+            'principalBorrowBalance': principalBorrowBalance,
+            'compoundedBorrowBalance': compoundedBorrowBalance,
+            'borrowBalanceIncrease': compoundedBorrowBalance - principalBorrowBalance,
+            'originationFee': originationFee
+        }
+
+    @staticmethod
+    def _compoundedBorrowBalance(_scaledBalance: int, _principalBalance: int, _normalizedDebt: int,
+                                 _decimals: int) -> int:
+        balance = convertExaToOther(exaMul(convertToExa(_scaledBalance, _decimals), _normalizedDebt), _decimals)
+        # the scaled debt is rounded, the debt never drops below the principal recorded at the last update
+        return max(balance, _principalBalance)
+
+    @external(readonly=True)
+    def getUserAccountSummary(self, _user: Address, _prices: List[ReservePrice]) -> dict:
+        """
+        computes the USD totals of a user position from the principal balances and user indexes of the tokens,
+        applying the normalized income and debt of each reserve inside core
+        :param _user: the address of the user
+        :param _prices: the USD price (in exa) of one unit of every reserve the user participates in
+        :return: the account totals along with the balances and price of every reserve the user holds
+        """
+        prices = {item['reserve']: item['price'] for item in _prices}
+        return self._userAccountSummary(_user, prices, {})
+
+    @external(readonly=True)
+    def getUserAccountSummaries(self, _users: List[Address], _prices: List[ReservePrice]) -> dict:
+        """
+        computes the account summary of every user, reading each reserve and the token balances of all the users
+        only once per reserve
+        :param _users: the addresses of the users
+        :param _prices: the USD price (in exa) of one unit of every reserve the users participate in
+        :return: the account summaries keyed by user address
+        """
+        prices = {item['reserve']: item['price'] for item in _prices}
+        reserveStates = {}
+        for reserve in self._reserveList:
+            reserveState = self._reserveState(reserve)
+            reserveData = reserveState['data']
+            oToken = self.create_interface_score(reserveData['oTokenAddress'], OTokenInterface)
+            dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
+            reserveState['underlyingBalances'] = oToken.balancesOf(_users)
+            reserveState['borrowBalances'] = dToken.balancesOf(_users)
+            reserveStates[reserve] = reserveState
+        return {
+            str(user): self._userAccountSummary(user, prices, reserveStates)
+            for user in _users
+        }
+
+    def _reserveState(self, _reserve: Address) -> dict:
+        data = getDataFromReserve(self.reservePrefix(_reserve), self.reserve)
+        return {
+            'data': data,
+            'normalizedIncome': self._normalizedIncome(data),
+            'normalizedDebt': self._normalizedDebt(data)
+        }
+
+    def _userAccountSummary(self, _user: Address, _prices: dict, _reserveStates: dict) -> dict:
+        totalLiquidityBalanceUSD = 0
+        totalCollateralBalanceUSD = 0
+        totalBorrowBalanceUSD = 0
+        totalFeesUSD = 0
+        currentLtv = 0
+        currentLiquidationThreshold = 0
+        reserves = {}
+
+        for reserve in self.getUserActiveReserves(_user):
+            if reserve not in _reserveStates:
+                _reserveStates[reserve] = self._reserveState(reserve)
+            reserveState = _reserveStates[reserve]
+            reserveData = reserveState['data']
+            decimals = reserveData['decimals']
+
+            if 'underlyingBalances' in reserveState:
+                underlyingBalance = reserveState['underlyingBalances'][str(_user)]
+                compoundedBorrowBalance = reserveState['borrowBalances'][str(_user)]
+            else:
+                oToken = self.create_interface_score(reserveData['oTokenAddress'], OTokenInterface)
+                dToken = self.create_interface_score(reserveData['dTokenAddress'], DTokenInterface)
+                underlyingBalance = oToken.scaledBalanceOf(_user)
+                if underlyingBalance > 0:
+                    underlyingBalance = convertExaToOther(
+                        exaMul(convertToExa(underlyingBalance, decimals), reserveState['normalizedIncome']),
+                        decimals)
+                compoundedBorrowBalance = dToken.scaledBalanceOf(_user)
+                if compoundedBorrowBalance > 0:
+                    compoundedBorrowBalance = self._compoundedBorrowBalance(compoundedBorrowBalance,
+                                                                            dToken.principalBalanceOf(_user),
+                                                                            reserveState['normalizedDebt'], decimals)
+            if underlyingBalance == 0 and compoundedBorrowBalance == 0:
+                continue
+
+            if reserve not in _prices:
+                revert(f"{TAG}: price of reserve {reserve} is missing")
+            price = _prices[reserve]
+            originationFee = getDataFromUserReserve(self.userReservePrefix(reserve, _user),
+                                                    self.userReserve)['originationFee']
+            reserves[str(reserve)] = {
+                'underlyingBalance': underlyingBalance,
+                'compoundedBorrowBalance': compoundedBorrowBalance,
+                'originationFee': originationFee,
+                'decimals': decimals,
+                'price': price
+            }
+
+            if underlyingBalance > 0:
+                liquidityBalanceUSD = exaMul(price, convertToExa(underlyingBalance, decimals))
+                totalLiquidityBalanceUSD += liquidityBalanceUSD
+
+                if reserveData['usageAsCollateralEnabled']:
+                    totalCollateralBalanceUSD += liquidityBalanceUSD
+                    currentLtv += exaMul(liquidityBalanceUSD, reserveData['baseLTVasCollateral'])
+                    currentLiquidationThreshold += exaMul(liquidityBalanceUSD, reserveData['liquidationThreshold'])
+
+            if compoundedBorrowBalance > 0:
+                totalBorrowBalanceUSD += exaMul(price, convertToExa(compoundedBorrowBalance, decimals))
+                totalFeesUSD += exaMul(price, convertToExa(originationFee, decimals))
+
+        if totalCollateralBalanceUSD > 0:
+            currentLtv = exaDiv(currentLtv, totalCollateralBalanceUSD)
+            currentLiquidationThreshold = exaDiv(currentLiquidationThreshold, totalCollateralBalanceUSD)
+        else:
+            currentLtv = 0
+            currentLiquidationThreshold = 0
+
+        return {
+            'totalLiquidityBalanceUSD': totalLiquidityBalanceUSD,
+            'totalCollateralBalanceUSD': totalCollateralBalanceUSD,
+            'totalBorrowBalanceUSD': totalBorrowBalanceUSD,
+            'totalFeesUSD': totalFeesUSD,
+            'currentLtv': currentLtv,
+            'currentLiquidationThreshold': currentLiquidationThreshold,
+            'reserves': reserves
+        }
+
     def calculateInterestRates(self, _reserve: Address, _availableLiquidity: int, _totalBorrows: int) -> dict:
         constants = self.getReserveConstants(_reserve)
         rate = {}
@@ -98,3 +98,23 @@ def only_governance(func):
         return func(self, *args, **kwargs)
 
     return __wrapper
+
+
+def cache_reserve_state(func):
+    if not isfunction(func):
+        revert(f"{TAG}: ""NotAFunctionError")
+
+    @wraps(func)
+    def __wrapper(self: object, *args, **kwargs):
+        if self.reserve.isCaching():
+            return func(self, *args, **kwargs)
+
+        self.reserve.startCaching()
+        try:
+            result = func(self, *args, **kwargs)
+            self.reserve.flush()
+        finally:
+            self.reserve.stopCaching()
+        return result
+
+    return __wrapper
@@ -3,6 +3,9 @@ EXA = 10 ** 18
 halfEXA = EXA // 2
 SECONDS_PER_YEAR = 31536000
 # 365 days = (365 days) × (24 hours/day) × (3600 seconds/hour) = 31536000 seconds
+# exaPowBinomial falls back to exaPow beyond these, where the series gets slower than squaring
+BINOMIAL_MAX_GROWTH = 3 * EXA // 2
+BINOMIAL_MAX_TERMS = 24
 
 
 def exaMul(a: int, b: int) -> int:
@@ -30,3 +33,42 @@ def exaPow(x: int, n: int) -> int:
         n = n // 2
 
     return z
+
+
+def convertToExa(_amount: int, _decimals: int) -> int:
+    if _decimals >= 0:
+        return _amount * EXA // (10 ** _decimals)
+
+
+def convertExaToOther(_amount: int, _decimals: int) -> int:
+    if _decimals >= 0:
+        return _amount * (10 ** _decimals) // EXA
+
+
+def exaPowBinomial(x: int, n: int) -> int:
+    """
+    Computes x ** n for x >= 1 (both in exa) with the binomial series
+    (1 + r) ** n = sum(C(n, k) * r ** k), stopping as soon as a term drops below 1 wei.
+    The series needs more terms as r * n grows, about 20 at r * n = 1 and 35 at r * n = 5, and it is only
+    faster than the ~2 * log2(n) exaMul of exaPow up to about BINOMIAL_MAX_TERMS terms, so exaPow is used
+    once r * n exceeds BINOMIAL_MAX_GROWTH (e.g. a 150% rate left uncompounded for a year) or the series
+    has not converged within BINOMIAL_MAX_TERMS terms.
+    Every term is floored, so the series result is below the exact value by at most one wei per term evaluated.
+    """
+    rate = x - EXA
+    if rate < 0 or rate * n > BINOMIAL_MAX_GROWTH:
+        return exaPow(x, n)
+
+    result = EXA
+    term = EXA
+    k = 1
+    while k <= n:
+        if k > BINOMIAL_MAX_TERMS:
+            return exaPow(x, n)
+        term = term * (n - k + 1) * rate // (k * EXA)
+        if term == 0:
+            break
+        result += term
+        k += 1
+
+    return result
@@ -18,6 +18,11 @@ class DistPercentage(TypedDict):
     distPercentage: int
 
 
+class ReservePrice(TypedDict):
+    reserve: Address
+    price: int
+
+
 class AddressDetails(TypedDict):
     name: str
     address: Address
@@ -26,7 +31,7 @@ class AddressDetails(TypedDict):
 # An interface to fee provider
 class FeeProviderInterface(InterfaceScore):
     @interface
-    def calculateOriginationFee(self, _user: Address, _amount: int) -> int:
+    def calculateOriginationFee(self, _amount: int) -> int:
         pass
 
     @interface
@@ -60,6 +65,22 @@ class CoreInterface(InterfaceScore):
     def getCompoundedBorrowBalance(self, _reserve: Address, _user: Address) -> int:
         pass
 
+    @interface
+    def getAllReservesSnapshot(self) -> dict:
+        pass
+
+    @interface
+    def getUserActiveReserves(self, _user: Address) -> list:
+        pass
+
+    @interface
+    def getUserAccountSummary(self, _user: Address, _prices: List[ReservePrice]) -> dict:
+        pass
+
+    @interface
+    def getUserAccountSummaries(self, _users: List[Address], _prices: List[ReservePrice]) -> dict:
+        pass
+
 
 # An interface to PriceOracle
 class OracleInterface(InterfaceScore):
@@ -67,6 +88,10 @@ class OracleInterface(InterfaceScore):
     def get_reference_data(self, _base: str, _quote: str) -> int:
         pass
 
+    @interface
+    def get_reference_data_bulk(self, _bases: List[str], _quote: str) -> dict:
+        pass
+
 
 # An interface to oToken
 class oTokenInterface(InterfaceScore):
@@ -112,6 +137,10 @@ class LendingPoolInterface(InterfaceScore):
     def getBorrowWallets(self, _index: int) -> list:
         pass
 
+    @interface
+    def getBorrowWalletsPage(self, _offset: int, _limit: int) -> list:
+        pass
+
     @interface
     def getLoanOriginationFeePercentage(self) -> int:
         pass
@@ -3,15 +3,20 @@ from .addresses import *
 from .utils.checks import *
 
 HEALTH_FACTOR_LIQUIDATION_THRESHOLD = 10 ** 18
+LIQUIDATION_SCAN_LIMIT = 100
 
 
 class LendingPoolDataProvider(Addresses):
     _SYMBOL = 'symbol'
     _REWARD_PERCENTAGE = 'rewardPercentage'
+    _RESERVE_MARKET_DATA = 'reserveMarketData'
+    _MARKET_DATA_STALENESS = 'marketDataStaleness'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         super().__init__(db)
         self._symbol = DictDB(self._SYMBOL, db, value_type=str)
+        self._reserveMarketData = DictDB(self._RESERVE_MARKET_DATA, db, value_type=str)
+        self._marketDataStaleness = VarDB(self._MARKET_DATA_STALENESS, db, value_type=int)
 
     def on_install(self, _addressProvider: Address) -> None:
         super().on_install(_addressProvider)
@@ -45,22 +50,17 @@ class LendingPoolDataProvider(Addresses):
     @external(readonly=True)
     def getReserveAccountData(self) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
-        oracle = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
-        staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-        todayRate = staking.getTodayRate()
         totalLiquidityBalanceUSD = 0
         totalCollateralBalanceUSD = 0
         totalBorrowBalanceUSD = 0
         availableLiquidityBalanceUSD = 0
-        reserves = core.getReserves()
+        snapshot = core.getAllReservesSnapshot()
+        prices = self._getPrices([Address.from_string(_reserve) for _reserve in snapshot])
 
-        for _reserve in reserves:
-            symbol = self._symbol[_reserve]
-            reserveData = core.getReserveData(_reserve)
+        for _reserve, reserveSnapshot in snapshot.items():
+            reserveData = reserveSnapshot['data']
             reserveDecimals = reserveData['decimals']
-            reservePrice = oracle.get_reference_data(symbol, 'USD')
-            if symbol == 'ICX':
-                reservePrice = exaMul(reservePrice, todayRate)
+            reservePrice = prices[Address.from_string(_reserve)]
             reserveTotalLiquidity = reserveData['totalLiquidity']
             reserveAvailableLiquidity = reserveData['availableLiquidity']
             reserveTotalBorrows = reserveData['totalBorrows']
@@ -83,65 +83,31 @@ class LendingPoolDataProvider(Addresses):
             'totalCollateralBalanceUSD': totalCollateralBalanceUSD,
         }
 
-    @external(readonly=True)
-    def getUserAccountData(self, _user: Address) -> dict:
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
-        oracle = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
-        staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-        todaySicxRate = staking.getTodayRate()
-        totalLiquidityBalanceUSD = 0
-        totalCollateralBalanceUSD = 0
-        currentLtv = 0
-        currentLiquidationThreshold = 0
-        totalBorrowBalanceUSD = 0
-        totalFeesUSD = 0
+    def _priceOracleKey(self, _reserve: Address) -> str:
+        # the ICX reserve holds sICX, which the oracle prices with the staking rate applied
+        symbol = self._symbol[_reserve]
+        return 'sICX' if symbol == 'ICX' else symbol
 
-        reserves = core.getReserves()
-        for _reserve in reserves:
-            userBasicReserveData = core.getUserBasicReserveData(_reserve, _user)
-            if userBasicReserveData['underlyingBalance'] == 0 and userBasicReserveData['compoundedBorrowBalance'] == 0:
-                continue
+    def _getPrices(self, _reserves: list) -> dict:
+        if len(_reserves) == 0:
+            return {}
+        oracle = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
+        keys = {reserve: self._priceOracleKey(reserve) for reserve in _reserves}
+        prices = oracle.get_reference_data_bulk(list(keys.values()), 'USD')
+        return {reserve: prices[key] for reserve, key in keys.items()}
 
-            reserveConfiguration = core.getReserveConfiguration(_reserve)
-            reserveDecimals = reserveConfiguration['decimals']
+    def _getUserAccountSummary(self, _user: Address) -> dict:
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        prices = self._getPrices(core.getUserActiveReserves(_user))
+        return core.getUserAccountSummary(_user, [{'reserve': reserve, 'price': price}
+                                                  for reserve, price in prices.items()])
 
-            # converting the user balances into 18 decimals
-            if reserveDecimals != 18:
-                userBasicReserveData['underlyingBalance'] = convertToExa(userBasicReserveData['underlyingBalance'],
-                                                                         reserveDecimals)
-                userBasicReserveData['compoundedBorrowBalance'] = convertToExa(
-                    userBasicReserveData['compoundedBorrowBalance'], reserveDecimals)
-                userBasicReserveData['originationFee'] = convertToExa(userBasicReserveData['originationFee'],
-                                                                      reserveDecimals)
-
-            symbol = self._symbol[_reserve]
-            reserveConfiguration['reserveUnitPrice'] = oracle.get_reference_data(symbol, 'USD')
-            if symbol == 'ICX':
-                reserveConfiguration['reserveUnitPrice'] = exaMul(reserveConfiguration['reserveUnitPrice'],
-                                                                  todaySicxRate)
-
-            if userBasicReserveData['underlyingBalance'] > 0:
-                liquidityBalanceUSD = exaMul(reserveConfiguration['reserveUnitPrice'],
-                                             userBasicReserveData['underlyingBalance'])
-                totalLiquidityBalanceUSD += liquidityBalanceUSD
-
-                if reserveConfiguration['usageAsCollateralEnabled']:
-                    totalCollateralBalanceUSD += liquidityBalanceUSD
-                    currentLtv += exaMul(liquidityBalanceUSD, reserveConfiguration['baseLTVasCollateral'])
-                    currentLiquidationThreshold += exaMul(liquidityBalanceUSD,
-                                                          reserveConfiguration['liquidationThreshold'])
-
-            if userBasicReserveData['compoundedBorrowBalance'] > 0:
-                totalBorrowBalanceUSD += exaMul(reserveConfiguration['reserveUnitPrice'],
-                                                userBasicReserveData['compoundedBorrowBalance'])
-                totalFeesUSD += exaMul(reserveConfiguration['reserveUnitPrice'], userBasicReserveData['originationFee'])
-
-        if totalCollateralBalanceUSD > 0:
-            currentLtv = exaDiv(currentLtv, totalCollateralBalanceUSD)
-            currentLiquidationThreshold = exaDiv(currentLiquidationThreshold, totalCollateralBalanceUSD)
-        else:
-            currentLtv = 0
-            currentLiquidationThreshold = 0
+    def _getUserAccountData(self, _summary: dict) -> dict:
+        totalCollateralBalanceUSD = _summary['totalCollateralBalanceUSD']
+        totalBorrowBalanceUSD = _summary['totalBorrowBalanceUSD']
+        totalFeesUSD = _summary['totalFeesUSD']
+        currentLtv = _summary['currentLtv']
+        currentLiquidationThreshold = _summary['currentLiquidationThreshold']
 
         healthFactor = self.calculateHealthFactorFromBalancesInternal(totalCollateralBalanceUSD, totalBorrowBalanceUSD,
                                                                       totalFeesUSD, currentLiquidationThreshold)
@@ -156,7 +122,7 @@ class LendingPoolDataProvider(Addresses):
             availableBorrowsUSD = 0
 
         return {
-            'totalLiquidityBalanceUSD': totalLiquidityBalanceUSD,
+            'totalLiquidityBalanceUSD': _summary['totalLiquidityBalanceUSD'],
             'totalCollateralBalanceUSD': totalCollateralBalanceUSD,
             'totalBorrowBalanceUSD': totalBorrowBalanceUSD,
             'totalFeesUSD': totalFeesUSD,
@@ -168,6 +134,10 @@ class LendingPoolDataProvider(Addresses):
             'healthFactorBelowThreshold': healthFactorBelowThreshold
         }
 
+    @external(readonly=True)
+    def getUserAccountData(self, _user: Address) -> dict:
+        return self._getUserAccountData(self._getUserAccountSummary(_user))
+
     @external(readonly=True)
     def getUserReserveData(self, _reserve: Address, _user: Address) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
@@ -247,13 +217,7 @@ class LendingPoolDataProvider(Addresses):
         if borrowBalanceUSD == 0:
             return True
 
-        oracle = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
-        symbol = self._symbol[_reserve]
-        price = oracle.get_reference_data(symbol, 'USD')
-        if symbol == "ICX":
-            staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-            todaySicxRate = staking.getTodayRate()
-            price = exaMul(price, todaySicxRate)
+        price = self._getPrices([_reserve])[_reserve]
         amountToDecreaseUSD = exaMul(price, _amount)
         collateralBalanceAfterDecreaseUSD = collateralBalanceUSD - amountToDecreaseUSD
 
@@ -274,22 +238,81 @@ class LendingPoolDataProvider(Addresses):
                                      _userCurrentBorrowBalanceUSD: int,
                                      _userCurrentFeesUSD: int, _userCurrentLtv: int) -> int:
 
-        symbol = self._symbol[_reserve]
-        price_provider = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
-        price = price_provider.get_reference_data(symbol, "USD")
+        price = self._getPrices([_reserve])[_reserve]
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
         reserveConfiguration = core.getReserveConfiguration(_reserve)
         if reserveConfiguration['decimals'] != 18:
             _amount = _amount * EXA // (10 ** reserveConfiguration["decimals"])
-        if symbol == "ICX":
-            staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-            todaySicxRate = staking.getTodayRate()
-            price = exaMul(price, todaySicxRate)
         requestedBorrowUSD = exaMul(price, _amount)
         collateralNeededInUSD = exaDiv(_userCurrentBorrowBalanceUSD + requestedBorrowUSD,
                                        _userCurrentLtv) + _userCurrentFeesUSD
         return collateralNeededInUSD
 
+    @external(readonly=True)
+    def validateBorrow(self, _reserve: Address, _user: Address, _amount: int) -> dict:
+        """
+        runs every check of a borrow from one reserve load and one price query.
+        error is the reason the borrow would fail, empty if the borrow is allowed
+        """
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        reserveData = core.getReserveData(_reserve)
+        if not reserveData:
+            revert(f'{TAG}: Reserve {_reserve} not found')
+        reserves = core.getUserActiveReserves(_user)
+        prices = self._getPrices(reserves if _reserve in reserves else reserves + [_reserve])
+        summary = core.getUserAccountSummary(_user, [{'reserve': reserve, 'price': prices[reserve]}
+                                                     for reserve in reserves])
+        userData = self._getUserAccountData(summary)
+
+        feeProvider = self.create_interface_score(self._addresses[FEE_PROVIDER], FeeProviderInterface)
+        borrowFee = feeProvider.calculateOriginationFee(_amount)
+
+        amount = _amount
+        if reserveData['decimals'] != 18:
+            amount = convertToExa(_amount, reserveData['decimals'])
+        requestedBorrowUSD = exaMul(prices[_reserve], amount)
+        collateralNeededUSD = 0
+        if userData['currentLtv'] > 0:
+            collateralNeededUSD = exaDiv(userData['totalBorrowBalanceUSD'] + requestedBorrowUSD,
+                                         userData['currentLtv']) + userData['totalFeesUSD']
+
+        if _amount > reserveData['availableBorrows']:
+            error = f"Amount requested {_amount} is more than the {reserveData['availableBorrows']}"
+        elif not reserveData['isActive']:
+            error = "Reserve is not active,borrow unsuccessful"
+        elif reserveData['isFreezed']:
+            error = "Reserve is frozen,borrow unsuccessful"
+        elif not reserveData['borrowingEnabled']:
+            error = "Borrow error:borrowing not enabled in the reserve"
+        elif reserveData['availableLiquidity'] < _amount:
+            error = "Borrow error:Not enough available liquidity in the reserve"
+        elif userData['totalCollateralBalanceUSD'] <= 0:
+            error = "Borrow error:The user does not have any collateral"
+        elif userData['healthFactorBelowThreshold']:
+            error = "Borrow error:Health factor is below threshold"
+        elif borrowFee <= 0:
+            error = "Borrow error:borrow amount is very small"
+        elif userData['currentLtv'] <= 0 or collateralNeededUSD > userData['totalCollateralBalanceUSD']:
+            # collateral with no loan to value can not back any borrow
+            error = "Borrow error:Insufficient collateral to cover new borrow"
+        else:
+            error = ""
+
+        return {
+            'error': error,
+            'borrowFee': borrowFee,
+            'price': prices[_reserve],
+            'requestedBorrowUSD': requestedBorrowUSD,
+            'collateralNeededUSD': collateralNeededUSD,
+            'availableBorrows': reserveData['availableBorrows'],
+            'availableLiquidity': reserveData['availableLiquidity'],
+            'totalCollateralBalanceUSD': userData['totalCollateralBalanceUSD'],
+            'totalBorrowBalanceUSD': userData['totalBorrowBalanceUSD'],
+            'totalFeesUSD': userData['totalFeesUSD'],
+            'availableBorrowsUSD': userData['availableBorrowsUSD'],
+            'healthFactor': userData['healthFactor']
+        }
+
     @external(readonly=True)
     def getUserAllReserveData(self, _user: Address) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
@@ -301,11 +324,11 @@ class LendingPoolDataProvider(Addresses):
 
     @external(readonly=True)
     def getUserLiquidationData(self, _user: Address) -> dict:
+        return self._getUserLiquidationData(self._getUserAccountSummary(_user))
+
+    def _getUserLiquidationData(self, _summary: dict) -> dict:
         liquidationManager = self.create_interface_score(self._addresses[LIQUIDATION_MANAGER], LiquidationInterface)
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
-        price_provider = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
-        reserves = core.getReserves()
-        userAccountData = self.getUserAccountData(_user)
+        userAccountData = self._getUserAccountData(_summary)
         badDebt = 0
         if userAccountData['healthFactorBelowThreshold']:
             badDebt = liquidationManager.calculateBadDebt(userAccountData['totalBorrowBalanceUSD'],
@@ -315,23 +338,16 @@ class LendingPoolDataProvider(Addresses):
 
         borrows = {}
         collaterals = {}
-        for _reserve in reserves:
-            userReserveData = core.getUserBasicReserveData(_reserve, _user)
-            reserveConfiguration = core.getReserveConfiguration(_reserve)
-            reserveDecimals = reserveConfiguration['decimals']
+        for _reserve, userReserveData in _summary['reserves'].items():
+            reserveDecimals = userReserveData['decimals']
+            price = userReserveData['price']
 
             userBorrowBalance = convertToExa(userReserveData['compoundedBorrowBalance'],
                                              reserveDecimals)
             userReserveUnderlyingBalance = convertToExa(userReserveData['underlyingBalance'],
                                                         reserveDecimals)
 
-            symbol = self._symbol[_reserve]
-            price = price_provider.get_reference_data(symbol, "USD")
-            if symbol == "ICX":
-                staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-                todaySicxRate = staking.getTodayRate()
-                price = exaMul(price, todaySicxRate)
-
+            symbol = self._symbol[Address.from_string(_reserve)]
             if userBorrowBalance > 0:
                 if badDebt > exaMul(price, userBorrowBalance):
                     maxAmountToLiquidateUSD = exaMul(price, userBorrowBalance)
@@ -361,13 +377,51 @@ class LendingPoolDataProvider(Addresses):
     @external(readonly=True)
     def liquidationList(self, _index: int) -> dict:
         pool = self.create_interface_score(self._addresses[LENDING_POOL], LendingPoolInterface)
-        wallets = pool.getBorrowWallets(_index)
+        summaries = self._getUserAccountSummaries(pool.getBorrowWallets(_index))
+        response = {}
+        for wallet, summary in summaries.items():
+            if self._getUserAccountData(summary)['healthFactor'] < HEALTH_FACTOR_LIQUIDATION_THRESHOLD:
+                response[wallet] = self._getUserLiquidationData(summary)
+        return response
+
+    @external(readonly=True)
+    def getLiquidationScan(self, _offset: int, _limit: int,
+                           _healthFactorThreshold: int = HEALTH_FACTOR_LIQUIDATION_THRESHOLD) -> dict:
+        """
+        scans a page of borrow wallets, pricing the reserves and reading their indexes once for the whole page
+        :param _offset: the position of the first borrow wallet of the page
+        :param _limit: the number of borrow wallets to scan, from 1 to LIQUIDATION_SCAN_LIMIT
+        :param _healthFactorThreshold: wallets with debt and a health factor below this value are returned
+        :return: the liquidation data and health factor of the matching wallets,
+                 along with the offset of the next page (-1 once every wallet is scanned)
+        """
+        if _offset < 0 or not 0 < _limit <= LIQUIDATION_SCAN_LIMIT:
+            revert(f'{TAG}: Invalid liquidation scan page, offset {_offset} and limit {_limit} '
+                   f'(the limit is from 1 to {LIQUIDATION_SCAN_LIMIT})')
+        pool = self.create_interface_score(self._addresses[LENDING_POOL], LendingPoolInterface)
+        wallets = pool.getBorrowWalletsPage(_offset, _limit)
+        summaries = self._getUserAccountSummaries(wallets)
+        response = {}
+        for wallet, summary in summaries.items():
+            healthFactor = self._getUserAccountData(summary)['healthFactor']
+            if healthFactor != -1 and healthFactor < _healthFactorThreshold:
+                liquidationData = self._getUserLiquidationData(summary)
+                liquidationData['healthFactor'] = healthFactor
+                response[wallet] = liquidationData
+
         return {
-            str(wallet): self.getUserLiquidationData(wallet)
-            for wallet in wallets
-            if self.getUserAccountData(wallet)['healthFactor'] < 10 ** 18
+            'wallets': response,
+            'nextOffset': _offset + len(wallets) if len(wallets) == _limit else -1
         }
 
+    def _getUserAccountSummaries(self, _users: list) -> dict:
+        if len(_users) == 0:
+            return {}
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        prices = self._getPrices(core.getReserves())
+        return core.getUserAccountSummaries(_users, [{'reserve': reserve, 'price': price}
+                                                     for reserve, price in prices.items()])
+
     @staticmethod
     def calculateHealthFactorFromBalancesInternal(_collateralBalanceUSD: int, _borrowBalanceUSD: int,
                                                   _totalFeesUSD: int, _liquidationThreshold: int) -> int:
@@ -387,37 +441,120 @@ class LendingPoolDataProvider(Addresses):
     @external(readonly=True)
     def getReserveData(self, _reserve: Address) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        reserveData = core.getReserveData(_reserve)
+        marketData = self._getMarketData({_reserve: reserveData})
+        return self._applyMarketData(reserveData, marketData[_reserve])
+
+    @external(readonly=True)
+    def getAllReserveData(self) -> dict:
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        snapshot = core.getAllReservesSnapshot()
+        reserves = {
+            Address.from_string(reserveAddress): reserveSnapshot['data']
+            for reserveAddress, reserveSnapshot in snapshot.items()
+        }
+        marketData = self._getMarketData(reserves)
+        return {
+            self._symbol[reserve]: self._applyMarketData(reserveData, marketData[reserve])
+            for reserve, reserveData in reserves.items()
+        }
+
+    @only_owner
+    @external
+    def setMarketDataStaleness(self, _seconds: int) -> None:
+        if _seconds < 0:
+            revert(f"{TAG}: market data staleness can not be negative, {_seconds}")
+        self._marketDataStaleness.set(_seconds)
+
+    @external(readonly=True)
+    def getMarketDataStaleness(self) -> int:
+        return self._marketDataStaleness.get()
+
+    @external
+    def refreshReserveMarketData(self) -> None:
+        """
+        stores the prices and reward percentages of every reserve, so that reserve data can be served
+        without querying the oracle, staking and rewards while it is fresher than the market data staleness
+        """
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
+        snapshot = core.getAllReservesSnapshot()
+        reserves = {
+            Address.from_string(reserveAddress): reserveSnapshot['data']
+            for reserveAddress, reserveSnapshot in snapshot.items()
+        }
+        timestamp = self.now() // 10 ** 6
+        for reserve, marketData in self._queryMarketData(reserves).items():
+            marketData['timestamp'] = timestamp
+            self._reserveMarketData[reserve] = json_dumps(marketData)
+
+    @external(readonly=True)
+    def getReserveMarketData(self, _reserve: Address) -> dict:
+        marketData = self._reserveMarketData[_reserve]
+        return json_loads(marketData) if marketData else {}
+
+    def _getMarketData(self, _reserves: dict) -> dict:
+        """
+        returns the stored market data of the reserves while it is fresh, otherwise queries it
+        """
+        staleness = self._marketDataStaleness.get()
+        if staleness > 0:
+            oldestTimestamp = self.now() // 10 ** 6 - staleness
+            marketData = {}
+            for reserve in _reserves:
+                storedMarketData = self._reserveMarketData[reserve]
+                if not storedMarketData:
+                    break
+                storedMarketData = json_loads(storedMarketData)
+                if storedMarketData['timestamp'] < oldestTimestamp:
+                    break
+                marketData[reserve] = storedMarketData
+            else:
+                return marketData
+
+        return self._queryMarketData(_reserves)
+
+    def _queryMarketData(self, _reserves: dict) -> dict:
         oracle = self.create_interface_score(self._addresses[PRICE_ORACLE], OracleInterface)
         rewards = self.create_interface_score(self._addresses[REWARDS], RewardInterface)
-        reserveData = core.getReserveData(_reserve)
-        symbol = self._symbol[_reserve]
-        price = oracle.get_reference_data(symbol, "USD")
+        symbols = {reserve: self._symbol[reserve] for reserve in _reserves}
+        prices = oracle.get_reference_data_bulk(list(symbols.values()), "USD")
+        todaySicxRate = None
+
+        response = {}
+        for reserve, reserveData in _reserves.items():
+            symbol = symbols[reserve]
+            marketData = {
+                'exchangePrice': prices[symbol],
+                'lendingPercentage': rewards.assetDistPercentage(reserveData['oTokenAddress']),
+                'borrowingPercentage': rewards.assetDistPercentage(reserveData['dTokenAddress'])
+            }
+            if symbol == "ICX":
+                if todaySicxRate is None:
+                    staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
+                    todaySicxRate = staking.getTodayRate()
+                marketData['sICXRate'] = todaySicxRate
+            response[reserve] = marketData
+        return response
+
+    @staticmethod
+    def _applyMarketData(reserveData: dict, marketData: dict) -> dict:
+        price = marketData['exchangePrice']
         reserveData["exchangePrice"] = price
-        if symbol == "ICX":
-            staking = self.create_interface_score(self._addresses[STAKING], StakingInterface)
-            reserveData['sICXRate'] = staking.getTodayRate()
-            price = exaMul(staking.getTodayRate(), price)
+        if 'sICXRate' in marketData:
+            reserveData['sICXRate'] = marketData['sICXRate']
+            price = exaMul(reserveData['sICXRate'], price)
         reserveDecimals = reserveData['decimals']
 
         reserveData["totalLiquidityUSD"] = exaMul(convertToExa(reserveData['totalLiquidity'], reserveDecimals), price)
         reserveData["availableLiquidityUSD"] = exaMul(convertToExa(reserveData['availableLiquidity'], reserveDecimals),
                                                       price)
         reserveData["totalBorrowsUSD"] = exaMul(convertToExa(reserveData['totalBorrows'], reserveDecimals), price)
-        reserveData["lendingPercentage"] = rewards.assetDistPercentage(reserveData["oTokenAddress"])
-        reserveData["borrowingPercentage"] = rewards.assetDistPercentage(reserveData["dTokenAddress"])
+        reserveData["lendingPercentage"] = marketData['lendingPercentage']
+        reserveData["borrowingPercentage"] = marketData['borrowingPercentage']
         reserveData["rewardPercentage"] = reserveData["lendingPercentage"] + reserveData["borrowingPercentage"]
 
         return reserveData
 
-    @external(readonly=True)
-    def getAllReserveData(self) -> dict:
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
-        reserves = core.getReserves()
-        return {
-            self._symbol[reserve]: self.getReserveData(reserve)
-            for reserve in reserves
-        }
-
     @external(readonly=True)
     def getReserveConfigurationData(self, _reserve: Address) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
@@ -426,10 +563,10 @@ class LendingPoolDataProvider(Addresses):
     @external(readonly=True)
     def getAllReserveConfigurationData(self) -> dict:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], CoreInterface)
-        reserves = core.getReserves()
+        snapshot = core.getAllReservesSnapshot()
         return {
-            self._symbol[reserve]: core.getReserveConfiguration(reserve)
-            for reserve in reserves
+            self._symbol[Address.from_string(reserve)]: reserveSnapshot['configuration']
+            for reserve, reserveSnapshot in snapshot.items()
         }
 
     @external(readonly=True)
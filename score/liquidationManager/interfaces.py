@@ -10,10 +10,6 @@ class DataProviderInterface(InterfaceScore):
     def getUserAccountData(self, _user: Address) -> dict:
         pass
 
-    @interface
-    def getReserveData(self, _reserve: Address) -> dict:
-        pass
-
     @interface
     def getSymbol(self, _reserveAddress: Address) -> str:
         pass
@@ -76,6 +72,10 @@ class OracleInterface(InterfaceScore):
     def get_reference_data(self, _base: str, _quote: str) -> int:
         pass
 
+    @interface
+    def get_reference_data_bulk(self, _bases: List[str], _quote: str) -> dict:
+        pass
+
 
 class StakingInterface(InterfaceScore):
     @interface
@@ -38,10 +38,24 @@ class LiquidationManager(Addresses):
 
         return badDebtUSD
 
-    def calculateAvailableCollateralToLiquidate(self, _collateral: Address, _reserve: Address, _purchaseAmount: int,
-                                                _userCollateralBalance: int, _fee: bool) -> dict:
+    def _getPrices(self, _collateral: Address, _reserve: Address) -> dict:
         priceOracle = self.create_interface_score(self.getAddress(PRICE_ORACLE), OracleInterface)
         dataProvider = self.create_interface_score(self.getAddress(LENDING_POOL_DATA_PROVIDER), DataProviderInterface)
+        # the ICX reserve holds sICX, which the oracle prices with the staking rate applied
+        collateralBase = dataProvider.getSymbol(_collateral)
+        collateralBase = 'sICX' if collateralBase == 'ICX' else collateralBase
+        principalBase = dataProvider.getSymbol(_reserve)
+        principalBase = 'sICX' if principalBase == 'ICX' else principalBase
+
+        prices = priceOracle.get_reference_data_bulk([collateralBase, principalBase], 'USD')
+        return {
+            'collateralPrice': prices[collateralBase],
+            'principalPrice': prices[principalBase]
+        }
+
+    def calculateAvailableCollateralToLiquidate(self, _collateral: Address, _reserve: Address, _purchaseAmount: int,
+                                                _userCollateralBalance: int, _fee: bool, _prices: dict) -> dict:
+        dataProvider = self.create_interface_score(self.getAddress(LENDING_POOL_DATA_PROVIDER), DataProviderInterface)
         core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
 
         if _fee:
@@ -49,20 +63,9 @@ class LiquidationManager(Addresses):
         else:
             collateralConfigs = dataProvider.getReserveConfigurationData(_collateral)
             liquidationBonus = collateralConfigs['liquidationBonus']
-        collateralBase = dataProvider.getSymbol(_collateral)
-        principalBase = dataProvider.getSymbol(_reserve)
 
-        collateralPrice = priceOracle.get_reference_data(collateralBase, 'USD')
-        principalPrice = priceOracle.get_reference_data(principalBase, 'USD')
-        _stakingAddress = self.getAddress(STAKING)
-        if collateralBase == 'ICX':
-            staking = self.create_interface_score(_stakingAddress, StakingInterface)
-            sicxRate = staking.getTodayRate()
-            collateralPrice = exaMul(collateralPrice, sicxRate)
-        if principalBase == 'ICX':
-            staking = self.create_interface_score(_stakingAddress, StakingInterface)
-            sicxRate = staking.getTodayRate()
-            principalPrice = exaMul(principalPrice, sicxRate)
+        collateralPrice = _prices['collateralPrice']
+        principalPrice = _prices['principalPrice']
         reserveConfiguration = core.getReserveConfiguration(_reserve)
         reserveDecimals = reserveConfiguration['decimals']
         reserveConfiguration = core.getReserveConfiguration(_collateral)
@@ -97,12 +100,11 @@ class LiquidationManager(Addresses):
     @external
     def liquidationCall(self, _collateral: Address, _reserve: Address, _user: Address, _purchaseAmount: int) -> dict:
         core = self.create_interface_score(self.getAddress(LENDING_POOL_CORE), CoreInterface)
-        priceOracle = self.create_interface_score(self.getAddress(PRICE_ORACLE), OracleInterface)
         dataProvider = self.create_interface_score(self.getAddress(LENDING_POOL_DATA_PROVIDER), DataProviderInterface)
-        principalBase = dataProvider.getSymbol(_reserve)
-        principalPrice = priceOracle.get_reference_data(principalBase, 'USD')
+        prices = self._getPrices(_collateral, _reserve)
+        principalPrice = prices['principalPrice']
         userAccountData = dataProvider.getUserAccountData(_user)
-        collateralData = dataProvider.getReserveData(_collateral)
+        collateralData = core.getReserveConfiguration(_collateral)
 
         liquidatedCollateralForFee = 0
         feeLiquidated = 0
@@ -147,7 +149,7 @@ class LiquidationManager(Addresses):
 
         liquidationDetails = self.calculateAvailableCollateralToLiquidate(_collateral, _reserve,
                                                                           actualAmountToLiquidate,
-                                                                          userCollateralBalance, False)
+                                                                          userCollateralBalance, False, prices)
         maxCollateralToLiquidate = liquidationDetails['collateralAmount']
         principalAmountNeeded = liquidationDetails['principalAmountNeeded']
         userOriginationFee = core.getUserOriginationFee(_reserve, _user)
@@ -155,7 +157,7 @@ class LiquidationManager(Addresses):
             feeLiquidationDetails = self.calculateAvailableCollateralToLiquidate(_collateral, _reserve,
                                                                                  userOriginationFee,
                                                                                  userCollateralBalance - maxCollateralToLiquidate,
-                                                                                 True)
+                                                                                 True, prices)
             liquidatedCollateralForFee = feeLiquidationDetails['collateralAmount']
             feeLiquidated = feeLiquidationDetails['principalAmountNeeded']
         if principalAmountNeeded < actualAmountToLiquidate:
@@ -165,9 +167,9 @@ class LiquidationManager(Addresses):
                                       userBorrowBalances['borrowBalanceIncrease'])
         collateralOtokenAddress = core.getReserveOTokenAddress(_collateral)
         collateralOtoken = self.create_interface_score(collateralOtokenAddress, OtokenInterface)
-        collateralOtoken.burnOnLiquidation(_user, maxCollateralToLiquidate)
+        # the collateral for the fee is burnt along with the liquidated collateral
+        collateralOtoken.burnOnLiquidation(_user, maxCollateralToLiquidate + liquidatedCollateralForFee)
         if feeLiquidated > 0:
-            collateralOtoken.burnOnLiquidation(_user, liquidatedCollateralForFee)
             # the liquidated fee is sent to fee provider
             core.liquidateFee(_collateral, liquidatedCollateralForFee, self.getAddress(FEE_PROVIDER))
             self.OriginationFeeLiquidated(_collateral, _reserve, _user, feeLiquidated, liquidatedCollateralForFee)
@@ -3,6 +3,7 @@ from .utils.checks import *
 
 REWARDS = 'rewards'
 RESERVE = 'reserve'
+LENDING_POOL = 'lendingPool'
 LENDING_POOL_CORE = 'lendingPoolCore'
 LENDING_POOL_DATA_PROVIDER = 'lendingPoolDataProvider'
 
@@ -33,12 +33,26 @@ class LendingPoolCoreInterface(InterfaceScore):
     def getReserveLiquidityCumulativeIndex(self, _reserve: Address) -> int:
         pass
 
+    @interface
+    def updateUserReserveParticipation(self, _reserve: Address, _user: Address, _hasBalance: bool) -> None:
+        pass
+
 
 class DistributionManager(InterfaceScore):
     @interface
     def handleAction(self, _userDetails: UserDetails) -> None:
         pass
 
+    @interface
+    def handleActions(self, _userDetails: List[UserDetails]) -> None:
+        pass
+
+
+class LendingPoolInterface(InterfaceScore):
+    @interface
+    def refreshActiveWallets(self, _users: List[Address]) -> None:
+        pass
+
 
 class DataProviderInterface(InterfaceScore):
     @interface
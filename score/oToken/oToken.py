@@ -14,6 +14,8 @@ class OToken(Addresses, TokenStandard):
     _TOTAL_SUPPLY = 'total_supply'
     _BALANCES = 'balances'
     _USER_INDEXES = 'user_indexes'
+    _LEGACY_TOTAL_SUPPLY = 'legacy_total_supply'
+    _SCALED_BALANCES = 'scaled_balances'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         """
@@ -26,7 +28,10 @@ class OToken(Addresses, TokenStandard):
         self._decimals = VarDB(self._DECIMALS, db, value_type=int)
         self._totalSupply = VarDB(self._TOTAL_SUPPLY, db, value_type=int)
         self._balances = DictDB(self._BALANCES, db, value_type=int)
+        # user indexes of balances recorded before scaled balances, removed once the user is migrated
         self._userIndexes = DictDB(self._USER_INDEXES, db, value_type=int)
+        self._legacyTotalSupply = VarDB(self._LEGACY_TOTAL_SUPPLY, db, value_type=int)
+        self._scaledBalances = VarDB(self._SCALED_BALANCES, db, value_type=bool)
 
     def on_install(self, _addressProvider: Address, _name: str, _symbol: str, _decimals: int = 18) -> None:
         """
@@ -52,9 +57,14 @@ class OToken(Addresses, TokenStandard):
         self._symbol.set(_symbol)
         self._decimals.set(_decimals)
         self._totalSupply.set(0)
+        self._scaledBalances.set(True)
 
     def on_update(self) -> None:
         super().on_update()
+        if not self._scaledBalances.get():
+            # every balance recorded so far is a principal with its own user index
+            self._legacyTotalSupply.set(self._totalSupply.get())
+            self._scaledBalances.set(True)
 
     @eventlog(indexed=3)
     def Transfer(self, _from: Address, _to: Address, _value: int, _data: bytes):
@@ -114,63 +124,152 @@ class OToken(Addresses, TokenStandard):
 
         """
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
-        borrowIndex = core.getReserveLiquidityCumulativeIndex(self._addresses[RESERVE])
-        principalTotalSupply = self.principalTotalSupply()
-        if borrowIndex == 0:
-            return self._totalSupply.get()
-        else:
+        normalizedIncome = core.getNormalizedIncome(self._addresses[RESERVE])
+        legacyTotalSupply = self._legacyTotalSupply.get()
+        totalSupply = self._fromScaled(self._totalSupply.get() - legacyTotalSupply, normalizedIncome)
+        if legacyTotalSupply > 0:
+            borrowIndex = core.getReserveLiquidityCumulativeIndex(self._addresses[RESERVE])
+            if borrowIndex == 0:
+                return totalSupply + legacyTotalSupply
             decimals = self._decimals.get()
-            balance = exaDiv(
-                exaMul(convertToExa(principalTotalSupply, decimals),
-                       core.getNormalizedIncome(self._addresses[RESERVE])),
-                borrowIndex)
-            return convertExaToOther(balance, decimals)
+            balance = exaDiv(exaMul(convertToExa(legacyTotalSupply, decimals), normalizedIncome), borrowIndex)
+            totalSupply += convertExaToOther(balance, decimals)
+        return totalSupply
 
     @external(readonly=True)
     def getUserLiquidityCumulativeIndex(self, _user: Address) -> int:
-        return self._userIndexes[_user]
+        """
+        Returns the index the principal balance of the user is scaled by, EXA for scaled balances
+        """
+        userIndex = self._userIndexes[_user]
+        return userIndex if userIndex != 0 else EXA
 
-    def _calculateCumulatedBalanceInternal(self, _user: Address, _balance: int) -> int:
+    def _getNormalizedIncome(self) -> int:
         core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        return core.getNormalizedIncome(self._addresses[RESERVE])
+
+    @staticmethod
+    def _toScaled(_amount: int, _index: int, _roundUp: bool = False) -> int:
+        """
+        Scales the amount down by the index, rounding against the user:
+        down for the amounts credited and up for the amounts taken away
+        """
+        if _roundUp:
+            return -(-_amount * EXA // _index)
+        return _amount * EXA // _index
+
+    def _fromScaled(self, _scaledAmount: int, _index: int) -> int:
+        decimals = self._decimals.get()
+        return convertExaToOther(exaMul(convertToExa(_scaledAmount, decimals), _index), decimals)
+
+    def _balanceOf(self, _user: Address, _index: int) -> int:
         userIndex = self._userIndexes[_user]
+        if userIndex == 0:
+            return self._fromScaled(self._balances[_user], _index)
+        # principal recorded before scaled balances, accrues from the index of its last update
+        decimals = self._decimals.get()
+        balance = exaDiv(exaMul(convertToExa(self._balances[_user], decimals), _index), userIndex)
+        return convertExaToOther(balance, decimals)
 
+    def _migrateUser(self, _user: Address, _index: int) -> int:
+        """
+        converts the principal balance of a user recorded before scaled balances to a scaled balance
+        :return: the interest accrued on the principal balance
+        """
+        userIndex = self._userIndexes[_user]
         if userIndex == 0:
-            return _balance
-        else:
-            decimals = self._decimals.get()
-            balance = exaDiv(
-                exaMul(convertToExa(_balance, decimals), core.getNormalizedIncome(self._addresses[RESERVE])),
-                userIndex)
-            return convertExaToOther(balance, decimals)
-
-    def _cumulateBalanceInternal(self, _user: Address) -> dict:
-        previousPrincipalBalance = self.principalBalanceOf(_user)
-        balanceIncrease = self.balanceOf(_user) - previousPrincipalBalance
-        if balanceIncrease > 0:
-            self._mint(_user, balanceIncrease)
-        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
-        userIndex = core.getNormalizedIncome(self._addresses[RESERVE])
-        self._userIndexes[_user] = userIndex
-        return {
-            'previousPrincipalBalance': previousPrincipalBalance,
-            'principalBalance': previousPrincipalBalance + balanceIncrease,
-            'balanceIncrease': balanceIncrease,
-            'index': userIndex
-        }
+            return 0
+        decimals = self._decimals.get()
+        principalBalance = self._balances[_user]
+        scaledBalance = convertExaToOther(exaDiv(convertToExa(principalBalance, decimals), userIndex), decimals)
+        self._balances[_user] = scaledBalance
+        self._totalSupply.set(self._totalSupply.get() - principalBalance + scaledBalance)
+        self._legacyTotalSupply.set(max(self._legacyTotalSupply.get() - principalBalance, 0))
+        self._userIndexes.remove(_user)
+        return self._fromScaled(scaledBalance, _index) - principalBalance
 
     # This will always include accrued interest as a computed value
     @external(readonly=True)
     def balanceOf(self, _owner: Address) -> int:
-        currentPrincipalBalance = self.principalBalanceOf(_owner)
+        return self._balanceOf(_owner, self._getNormalizedIncome())
+
+    @external(readonly=True)
+    def balancesOf(self, _users: List[Address]) -> dict:
+        """
+        Returns the balance of every user, reading the normalized income once
+        """
+        index = self._getNormalizedIncome()
+        return {str(user): self._balanceOf(user, index) for user in _users}
+
+    @external(readonly=True)
+    def userStates(self, _users: List[Address]) -> dict:
+        """
+        Returns the principal balance, balance and user index of every user, reading the normalized income once
+        """
+        index = self._getNormalizedIncome()
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        liquidityIndex = core.getReserveLiquidityCumulativeIndex(self._addresses[RESERVE])
+        return {
+            str(user): {
+                'principalBalance': self._principalBalanceOf(user, liquidityIndex),
+                'balance': self._balanceOf(user, index),
+                'userIndex': self.getUserLiquidityCumulativeIndex(user)
+            }
+            for user in _users
+        }
 
-        balance = self._calculateCumulatedBalanceInternal(_owner, currentPrincipalBalance)
-        return balance
+    # The balance of the user divided by the liquidity index, balanceOf is this balance times the normalized income.
+    # Principal balances recorded before scaled balances are scaled by the user index they were recorded at
+    @external(readonly=True)
+    def scaledBalanceOf(self, _user: Address) -> int:
+        userIndex = self._userIndexes[_user]
+        if userIndex == 0:
+            return self._balances[_user]
+        decimals = self._decimals.get()
+        return convertExaToOther(exaDiv(convertToExa(self._balances[_user], decimals), userIndex), decimals)
 
-    # This shows the state updated balance and includes the accrued interest upto the most recent computation
-    # initiated by the user transaction
+    # The balance of the user including the interest accrued up to the last update of the reserve
     @external(readonly=True)
     def principalBalanceOf(self, _user: Address) -> int:
-        return self._balances[_user]
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        return self._principalBalanceOf(_user, core.getReserveLiquidityCumulativeIndex(self._addresses[RESERVE]))
+
+    def _principalBalanceOf(self, _user: Address, _liquidityIndex: int) -> int:
+        if self._userIndexes[_user] != 0:
+            return self._balances[_user]
+        return self._fromScaled(self._balances[_user], _liquidityIndex)
+
+    @external(readonly=True)
+    def getLegacyTotalSupply(self) -> int:
+        """
+        Returns the part of the total supply still recorded as principal balances, zero once every user is migrated
+        """
+        return self._legacyTotalSupply.get()
+
+    @only_owner
+    @external
+    def migrateScaledBalances(self, _users: List[Address]) -> None:
+        """
+        converts the principal balances of users recorded before scaled balances, so the supply handed to
+        the reward distribution is in scaled units only once the legacy total supply is drained
+        """
+        beforeTotalSupply = self.principalTotalSupply()
+        index = self._getNormalizedIncome()
+        decimals = self.decimals()
+        userDetails = []
+        for user in _users:
+            if self._userIndexes[user] == 0:
+                continue
+            userDetails.append({
+                "_user": user,
+                "_userBalance": self.scaledBalanceOf(user),
+                "_totalSupply": beforeTotalSupply,
+                "_decimals": decimals
+            })
+            self._migrateUser(user, index)
+        if userDetails:
+            rewards = self.create_interface_score(self._addresses['rewards'], DistributionManager)
+            rewards.handleActions(userDetails)
 
     # The transfer is only allowed if transferring this amount of the underlying collateral doesn't bring the health
     # factor below 1
@@ -183,7 +282,15 @@ class OToken(Addresses, TokenStandard):
     def getPrincipalSupply(self, _user: Address) -> SupplyDetails:
         return {
             "decimals": self.decimals(),
-            'principalUserBalance': self.principalBalanceOf(_user),
+            'principalUserBalance': self.scaledBalanceOf(_user),
+            'principalTotalSupply': self.principalTotalSupply()
+        }
+
+    @external(readonly=True)
+    def getPrincipalSupplies(self, _users: List[Address]) -> dict:
+        return {
+            "decimals": self.decimals(),
+            'principalUserBalances': {str(user): self.scaledBalanceOf(user) for user in _users},
             'principalTotalSupply': self.principalTotalSupply()
         }
 
@@ -201,10 +308,10 @@ class OToken(Addresses, TokenStandard):
             revert(f'{TAG}: '
                    f'Amount: {_amount} to redeem needs to be greater than zero')
 
-        cumulated = self._cumulateBalanceInternal(_user)
-        currentBalance = cumulated['principalBalance']
-        balanceIncrease = cumulated['balanceIncrease']
-        index = cumulated['index']
+        index = self._getNormalizedIncome()
+        previousPrincipalBalance = self.scaledBalanceOf(_user)
+        balanceIncrease = self._migrateUser(_user, index)
+        currentBalance = self._balanceOf(_user, index)
         amountToRedeem = _amount
         if _amount == -1:
             amountToRedeem = currentBalance
@@ -214,14 +321,13 @@ class OToken(Addresses, TokenStandard):
         if not self.isTransferAllowed(_user, amountToRedeem):
             revert(f'{TAG}: '
                    f'Transfer of amount {amountToRedeem} to the user is not allowed')
-        self._burn(_user, amountToRedeem)
+        self._burn(_user, amountToRedeem, index)
 
         if currentBalance - amountToRedeem == 0:
-            self._resetDataOnZeroBalanceInternal(_user)
             index = 0
 
         # pool = self.create_interface_score(self.getLendingPool(), LendingPoolInterface)
-        self._handleAction(_user, cumulated['previousPrincipalBalance'], beforeTotalSupply)
+        self._handleAction(_user, previousPrincipalBalance, beforeTotalSupply)
 
         self.Redeem(_user, amountToRedeem, balanceIncrease, index)
         return {
@@ -242,60 +348,38 @@ class OToken(Addresses, TokenStandard):
         }
         rewards.handleAction(_userDetails)
 
-    def _resetDataOnZeroBalanceInternal(self, _user: Address) -> None:
-        self._userIndexes[_user] = 0
-
     @only_lending_pool
     @external
     def mintOnDeposit(self, _user: Address, _amount: int) -> None:
         beforeTotalSupply = self.principalTotalSupply()
-        cumulated = self._cumulateBalanceInternal(_user)
-
-        balanceIncrease = cumulated['balanceIncrease']
-        index = cumulated['index']
+        index = self._getNormalizedIncome()
+        previousPrincipalBalance = self.scaledBalanceOf(_user)
+        balanceIncrease = self._migrateUser(_user, index)
 
-        self._mint(_user, _amount)
-        self._handleAction(_user, cumulated['previousPrincipalBalance'], beforeTotalSupply)
+        self._mint(_user, _amount, index)
+        self._handleAction(_user, previousPrincipalBalance, beforeTotalSupply)
         self.MintOnDeposit(_user, _amount, balanceIncrease, index)
 
     @only_liquidation
     @external
     def burnOnLiquidation(self, _user: Address, _value: int) -> None:
         beforeTotalSupply = self.principalTotalSupply()
-        cumulated = self._cumulateBalanceInternal(_user)
-        currentBalance = cumulated['principalBalance']
-        balanceIncrease = cumulated['balanceIncrease']
-        index = cumulated['index']
-        self._burn(_user, _value)
-        self._handleAction(_user, cumulated['previousPrincipalBalance'], beforeTotalSupply)
-        if currentBalance - _value == 0:
-            self._resetDataOnZeroBalanceInternal(_user)
+        index = self._getNormalizedIncome()
+        previousPrincipalBalance = self.scaledBalanceOf(_user)
+        balanceIncrease = self._migrateUser(_user, index)
+        self._burn(_user, _value, index)
+        self._handleAction(_user, previousPrincipalBalance, beforeTotalSupply)
+        if self._balances[_user] == 0:
             index = 0
         self.BurnOnLiquidation(_user, _value, balanceIncrease, index)
 
-    def _executeTransfer(self, _from: Address, _to: Address, _value: int) -> dict:
-        beforeTotalSupply = self.principalTotalSupply()
-        fromCumulated = self._cumulateBalanceInternal(_from)
-        toCumulated = self._cumulateBalanceInternal(_to)
-        fromBalance = fromCumulated['principalBalance']
-        fromBalanceIncrease = fromCumulated['balanceIncrease']
-        fromIndex = fromCumulated['index']
-        toBalanceIncrease = toCumulated['balanceIncrease']
-        toIndex = toCumulated['index']
-
-        if fromBalance - _value == 0:
-            self._resetDataOnZeroBalanceInternal(_from)
-
-        self.BalanceTransfer(_from, _to, _value, fromBalanceIncrease, toBalanceIncrease, fromIndex, toIndex)
-        return {
-            'fromPreviousPrincipalBalance': fromCumulated['previousPrincipalBalance'],
-            'toPreviousPrincipalBalance': toCumulated['previousPrincipalBalance'],
-            'beforeTotalSupply': beforeTotalSupply
-        }
-
     def _callRewards(self, _fromPrevious: int, _toPrevious: int, _totalPrevious, _from: Address, _to: Address):
-        self._handleAction(_from, _fromPrevious, _totalPrevious)
-        self._handleAction(_to, _toPrevious, _totalPrevious)
+        rewards = self.create_interface_score(self._addresses['rewards'], DistributionManager)
+        decimals = self.decimals()
+        rewards.handleActions([
+            {"_user": _from, "_userBalance": _fromPrevious, "_totalSupply": _totalPrevious, "_decimals": decimals},
+            {"_user": _to, "_userBalance": _toPrevious, "_totalSupply": _totalPrevious, "_decimals": decimals}
+        ])
 
     @external
     def transfer(self, _to: Address, _value: int, _data: bytes = None):
@@ -323,20 +407,34 @@ class OToken(Addresses, TokenStandard):
             revert(f"{TAG}: "
                    f"Transferring value:{_value} cannot be less than 0.")
 
-        if self._balances[_from] < _value:
+        beforeTotalSupply = self.principalTotalSupply()
+        index = self._getNormalizedIncome()
+        fromPreviousPrincipalBalance = self.scaledBalanceOf(_from)
+        toPreviousPrincipalBalance = self.scaledBalanceOf(_to)
+        fromBalanceIncrease = self._migrateUser(_from, index)
+        toBalanceIncrease = self._migrateUser(_to, index)
+
+        fromCurrentBalance = self._balanceOf(_from, index)
+        if fromCurrentBalance < _value:
             revert(f"{TAG}: "
-                   f"Token transfer error:Insufficient balance:{self._balances[_from]}")
+                   f"Token transfer error:Insufficient balance:{fromCurrentBalance}")
 
         if not self.isTransferAllowed(self.msg.sender, _value):
             revert(f"{TAG}: "
                    f"Transfer error:Transfer cannot be allowed")
 
-        previousBalances = self._executeTransfer(_from, _to, _value)
-        self._balances[_from] -= _value
-        self._balances[_to] += _value
-        self._callRewards(previousBalances['fromPreviousPrincipalBalance'],
-                          previousBalances['toPreviousPrincipalBalance'], previousBalances['beforeTotalSupply'], _from,
-                          _to)
+        fromBalance = self._balances[_from]
+        scaledValue = self._scaledAmountOf(_value, fromCurrentBalance, fromBalance, index)
+        self._balances[_from] = fromBalance - scaledValue
+        toBalance = self._balances[_to]
+        self._balances[_to] = toBalance + scaledValue
+        changedPositions = [user for user, previousBalance in ((_from, fromBalance), (_to, toBalance))
+                            if self._updateUserParticipation(user, previousBalance)]
+        if changedPositions:
+            pool = self.create_interface_score(self._addresses[LENDING_POOL], LendingPoolInterface)
+            pool.refreshActiveWallets(changedPositions)
+        self.BalanceTransfer(_from, _to, _value, fromBalanceIncrease, toBalanceIncrease, index, index)
+        self._callRewards(fromPreviousPrincipalBalance, toPreviousPrincipalBalance, beforeTotalSupply, _from, _to)
 
         if _to.is_contract:
             '''
@@ -349,13 +447,24 @@ class OToken(Addresses, TokenStandard):
         # Emits an event log `Transfer`
         self.Transfer(_from, _to, _value, _data)
 
-    def _mint(self, account: Address, amount: int) -> None:
+    def _scaledAmountOf(self, _amount: int, _balance: int, _scaledBalance: int, _index: int) -> int:
+        # the whole balance is moved as the whole scaled balance, leaving no dust behind
+        if _amount == _balance:
+            scaledAmount = _scaledBalance
+        else:
+            scaledAmount = min(self._toScaled(_amount, _index, True), _scaledBalance)
+        if _amount > 0 and scaledAmount == 0:
+            revert(f'{TAG}: {_amount} is too small to be moved at the index {_index}')
+        return scaledAmount
+
+    def _mint(self, account: Address, amount: int, index: int) -> None:
         """
         Creates amount number of tokens, and assigns to account
         Increases the balance of that account and total supply.
         This is an internal function.
         :param account: The account at which token is to be created.
         :param amount: Number of tokens to be created at the `account`.
+        :param index: The normalized income the amount is scaled by.
 
         """
 
@@ -363,19 +472,25 @@ class OToken(Addresses, TokenStandard):
             revert(f'{TAG}: '
                    f'Invalid value: {amount} to mint')
 
-        self._totalSupply.set(self._totalSupply.get() + amount)
-        self._balances[account] += amount
+        scaledAmount = self._toScaled(amount, index)
+        if amount > 0 and scaledAmount == 0:
+            revert(f'{TAG}: {amount} is too small to be minted at the index {index}')
+        previousBalance = self._balances[account]
+        self._totalSupply.set(self._totalSupply.get() + scaledAmount)
+        self._balances[account] = previousBalance + scaledAmount
+        self._updateUserParticipation(account, previousBalance)
 
         # Emits an event log Mint
         self.Transfer(ZERO_SCORE_ADDRESS, account, amount, b'mint')
 
-    def _burn(self, account: Address, amount: int) -> None:
+    def _burn(self, account: Address, amount: int, index: int) -> None:
         """
         Destroys `amount` number of tokens from `account`
         Decreases the balance of that `account` and total supply.
         This is an internal function.
         :param account: The account at which token is to be destroyed.
         :param amount: The `amount` of tokens of `account` to be destroyed.
+        :param index: The normalized income the amount is scaled by.
 
         """
         if amount == 0:
@@ -385,25 +500,39 @@ class OToken(Addresses, TokenStandard):
             revert(f'{TAG}: '
                    f'Invalid value: {amount} to burn')
         totalSupply = self._totalSupply.get()
-        userBalance = self._balances[account]
-        if amount > totalSupply:
-            revert(f'{TAG}: {amount} is greater than total supply :{totalSupply}')
+        userScaledBalance = self._balances[account]
+        userBalance = self._balanceOf(account, index)
         if amount > userBalance:
             revert(f'{TAG}: Cannot burn more than user balance. Amount to burn: {amount}, User Balance:{userBalance}')
+        scaledAmount = self._scaledAmountOf(amount, userBalance, userScaledBalance, index)
+        if scaledAmount > totalSupply:
+            revert(f'{TAG}: {amount} is greater than total supply :{totalSupply}')
 
-        self._totalSupply.set(totalSupply - amount)
-        self._balances[account] -= amount
+        self._totalSupply.set(totalSupply - scaledAmount)
+        self._balances[account] = userScaledBalance - scaledAmount
+        self._updateUserParticipation(account, userBalance)
 
         # Emits an event log Burn
         self.Transfer(account, ZERO_SCORE_ADDRESS, amount, b'burn')
 
+    def _updateUserParticipation(self, _user: Address, _previousBalance: int) -> bool:
+        """
+        :return: whether the user opened or closed a position in the reserve
+        """
+        hasBalance = self._balances[_user] > 0
+        if hasBalance == (_previousBalance > 0):
+            return False
+        core = self.create_interface_score(self._addresses[LENDING_POOL_CORE], LendingPoolCoreInterface)
+        core.updateUserReserveParticipation(self._addresses[RESERVE], _user, hasBalance)
+        return True
+
     @external(readonly=True)
     def getTotalStaked(self) -> TotalStaked:
         """
-        return total supply for reward distribution
+        return total supply for reward distribution, scaled like the balances handed to it on every action
         :return: total supply and its precision
         """
         return {
             "decimals": self.decimals(),
-            "totalStaked": self.totalSupply()
+            "totalStaked": self.principalTotalSupply()
         }
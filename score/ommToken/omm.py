@@ -28,6 +28,14 @@ class OmmToken(IRC2Mintable):
             "principalTotalSupply": self.total_staked_balance()
         }
 
+    @external(readonly=True)
+    def getPrincipalSupplies(self, _users: List[Address]) -> dict:
+        return {
+            "decimals": self.decimals(),
+            "principalUserBalances": {str(user): self.staked_balanceOf(user) for user in _users},
+            "principalTotalSupply": self.total_staked_balance()
+        }
+
     @external(readonly=True)
     def getTotalStaked(self) -> TotalStaked:
         """
@@ -10,6 +10,10 @@ class OracleInterface(InterfaceScore):
     def get_reference_data(self, _base: str, _quote: str) -> dict:
         pass
 
+    @interface
+    def get_reference_data_bulk(self, _bases: List[str], _quotes: List[str]) -> list:
+        pass
+
 
 class DataSourceInterface(InterfaceScore):
     @interface
@@ -29,6 +33,12 @@ class DataSourceInterface(InterfaceScore):
         pass
 
 
+class StakingInterface(InterfaceScore):
+    @interface
+    def getTodayRate(self) -> int:
+        pass
+
+
 class TokenInterface(InterfaceScore):
     @interface
     def decimals(self) -> int:
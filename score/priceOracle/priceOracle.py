@@ -5,6 +5,9 @@ EXA = 10 ** 18
 STABLE_TOKENS = ["USDS", "USDB","bnUSD"]
 BAND_ORACLE = "bandOracle"
 DEX = "dex"
+STAKING = "staking"
+# sICX is priced as ICX times the staking rate
+SICX = "sICX"
 
 OMM_TOKENS = [
     {
@@ -102,3 +105,33 @@ class PriceOracle(Addresses):
             return self._get_omm_price(_quote)
         else:
             return self._get_price(_base, _quote)
+
+    @external(readonly=True)
+    def get_reference_data_bulk(self, _bases: List[str], _quote: str) -> dict:
+        bases = []
+        for base in _bases:
+            if base not in bases:
+                bases.append(base)
+
+        bandKeys = []
+        for base in bases:
+            key = "ICX" if base == SICX else base
+            if key not in STABLE_TOKENS and key not in ("BALN", "OMM") and key not in bandKeys:
+                bandKeys.append(key)
+
+        bandPrices = {}
+        if len(bandKeys) > 0:
+            oracle = self.create_interface_score(self.getAddress(BAND_ORACLE), OracleInterface)
+            referenceData = oracle.get_reference_data_bulk(bandKeys, [_quote] * len(bandKeys))
+            bandPrices = {key: data['rate'] for key, data in zip(bandKeys, referenceData)}
+
+        response = {}
+        for base in bases:
+            if base == SICX:
+                staking = self.create_interface_score(self.getAddress(STAKING), StakingInterface)
+                response[base] = exaMul(bandPrices["ICX"], staking.getTodayRate())
+            elif base in bandPrices:
+                response[base] = bandPrices[base]
+            else:
+                response[base] = self.get_reference_data(base, _quote)
+        return response
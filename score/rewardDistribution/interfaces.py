@@ -19,6 +19,10 @@ class TokenInterface(InterfaceScore):
     def getPrincipalSupply(self, _user: Address) -> SupplyDetails:
         pass
 
+    @interface
+    def getPrincipalSupplies(self, _users: List[Address]) -> dict:
+        pass
+
 
 class LPInterface(InterfaceScore):
 
@@ -34,6 +38,10 @@ class LPInterface(InterfaceScore):
     def getLPStakedSupply(self, _id: int, _user: Address) -> SupplyDetails:
         pass
 
+    @interface
+    def getLPStakedSupplies(self, _id: int, _users: List[Address]) -> dict:
+        pass
+
 
 # An interface to Worker Token
 class WorkerTokenInterface(InterfaceScore):
@@ -41,6 +49,10 @@ class WorkerTokenInterface(InterfaceScore):
     def getWallets(self) -> list:
         pass
 
+    @interface
+    def getWalletBalances(self, _start: int, _count: int) -> list:
+        pass
+
     @interface
     def totalSupply(self) -> int:
         pass
@@ -33,6 +33,7 @@ class RewardConfigurationDB(object):
     def __init__(self, key: str, db: IconScoreDatabase) -> None:
         self._distributionPercentage = DictDB(f'{key}{self.ENTITY_DISTRIBUTION_PERCENTAGE}', db, value_type=int)
         self._supportedRecipients = ArrayDB(f'{key}{self.SUPPORTED_RECIPIENTS}', db, value_type=str)
+        # legacy, the emission per second is derived from the distribution schedule and the asset percentage
         self._emissionPerSecond = DictDB(f'{key}{self.EMISSION_PER_SECOND}', db, value_type=int)
         self._assetLevelPercentage = DictDB(f'{key}{self.ASSET_LEVEL_PERCENTAGE}', db, value_type=int)
 
@@ -131,11 +132,9 @@ class RewardConfigurationDB(object):
     def getPoolID(self, asset: Address) -> int:
         return self._poolIDMapping[asset]
 
-    def updateEmissionPerSecond(self, asset: Address, distributionPerDay: int) -> int:
+    def getEmissionPerSecond(self, asset: Address, distributionPerDay: int) -> int:
         _percentage = self.getAssetPercentage(asset)
-        _emissionPerSecond = exaMul(distributionPerDay // 86400, _percentage)
-        self._emissionPerSecond[asset] = _emissionPerSecond
-        return _emissionPerSecond
+        return exaMul(distributionPerDay // 86400, _percentage)
 
     def getAssetPercentage(self, asset: Address) -> int:
         _entityKey = self._rewardEntityMapping[asset]
@@ -187,12 +186,9 @@ class RewardConfigurationDB(object):
             return self.RESERVE
         revert(f"Unsupported entity {_rewardEntity} :: {asset}")
 
-    def getEmissionPerSecond(self, asset: Address) -> int:
-        return self._emissionPerSecond[asset]
-
-    def getAllEmissionPerSecond(self) -> dict:
+    def getAllEmissionPerSecond(self, distributionPerDay: int) -> dict:
         return {
-            str(asset): self._emissionPerSecond[asset]
+            str(asset): self.getEmissionPerSecond(asset, distributionPerDay)
             for asset in self._assets
         }
 
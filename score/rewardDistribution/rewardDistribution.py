@@ -10,6 +10,17 @@ TAG = 'Omm Reward Distribution Manager'
 DAY_IN_MICROSECONDS = 86400 * 10 ** 6
 MINUTE_IN_MICROSECONDS = 60 * 10 ** 6
 
+# an asset state is stored as (index << ASSET_INDEX_SHIFT) | (asset percentage << TIMESTAMP_BITS) | last update
+TIMESTAMP_BITS = 64
+PERCENTAGE_BITS = 64
+ASSET_INDEX_SHIFT = TIMESTAMP_BITS + PERCENTAGE_BITS
+TIMESTAMP_MASK = (1 << TIMESTAMP_BITS) - 1
+PERCENTAGE_MASK = (1 << PERCENTAGE_BITS) - 1
+
+# a user asset state is stored as (index << USER_INDEX_SHIFT) | unclaimed rewards
+USER_INDEX_SHIFT = 128
+UNCLAIMED_MASK = (1 << USER_INDEX_SHIFT) - 1
+
 
 class RewardDistributionManager(Addresses):
     REWARD_CONFIG = 'rewardConfig'
@@ -17,15 +28,23 @@ class RewardDistributionManager(Addresses):
     TIMESTAMP_AT_START = 'timestampAtStart'
     ASSET_INDEX = 'assetIndex'
     USER_INDEX = 'userIndex'
+    USERS_UNCLAIMED_REWARDS = 'usersUnclaimedRewards'
+    ASSET_STATE = 'assetState'
+    USER_ASSET_STATE = 'userAssetState'
     RESERVE_ASSETS = 'reserveAssets'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         super().__init__(db)
         self._rewardConfig = RewardConfigurationDB(self.REWARD_CONFIG, db)
 
+        self._assetState = DictDB(self.ASSET_STATE, db, value_type=int)
+        self._userAssetState = DictDB(self.USER_ASSET_STATE, db, value_type=int, depth=2)
+
+        # legacy state, the asset entries are migrated in on_update and the user entries on their next update
         self._lastUpdateTimestamp = DictDB(self.LAST_UPDATE_TIMESTAMP, db, value_type=int)
         self._assetIndex = DictDB(self.ASSET_INDEX, db, value_type=int)
         self._userIndex = DictDB(self.USER_INDEX, db, value_type=int, depth=2)
+        self._usersUnclaimedRewards = DictDB(self.USERS_UNCLAIMED_REWARDS, db, value_type=int, depth=2)
 
         self._reserveAssets = ArrayDB(self.RESERVE_ASSETS, db, value_type=Address)
         self._timestampAtStart = VarDB(self.TIMESTAMP_AT_START, db, value_type=int)
@@ -36,6 +55,51 @@ class RewardDistributionManager(Addresses):
 
     def on_update(self) -> None:
         super().on_update()
+        self._migrateAssetStates()
+
+    def _migrateAssetStates(self) -> None:
+        for asset in self._rewardConfig.getAssets():
+            if self._assetState[asset] == 0:
+                index, lastUpdateTimestamp = self._assetIndex[asset], self._lastUpdateTimestamp[asset]
+                self._assetIndex.remove(asset)
+                self._lastUpdateTimestamp.remove(asset)
+            else:
+                index, lastUpdateTimestamp, _ = self._getAssetState(asset)
+            self._setAssetState(asset, index, lastUpdateTimestamp, self._rewardConfig.getAssetPercentage(asset))
+
+    def _getAssetState(self, _asset: Address) -> tuple:
+        """
+        returns the index, the last update timestamp and the overall distribution percentage of the asset
+        """
+        state = self._assetState[_asset]
+        return state >> ASSET_INDEX_SHIFT, state & TIMESTAMP_MASK, (state >> TIMESTAMP_BITS) & PERCENTAGE_MASK
+
+    def _setAssetState(self, _asset: Address, _index: int, _lastUpdateTimestamp: int, _percentage: int):
+        self._assetState[_asset] = (_index << ASSET_INDEX_SHIFT) | (_percentage << TIMESTAMP_BITS) | \
+                                   _lastUpdateTimestamp
+
+    def _setAssetPercentage(self, _asset: Address, _percentage: int):
+        index, lastUpdateTimestamp, _ = self._getAssetState(_asset)
+        self._setAssetState(_asset, index, lastUpdateTimestamp, _percentage)
+
+    def _getUserAssetState(self, _user: Address, _asset: Address) -> tuple:
+        """
+        returns the index and the unclaimed rewards of the user for the asset,
+        and whether they still have to be moved from the legacy storage
+        """
+        state = self._userAssetState[_user][_asset]
+        if state == 0:
+            userIndex = self._userIndex[_user][_asset]
+            unclaimedRewards = self._usersUnclaimedRewards[_user][_asset]
+            return userIndex, unclaimedRewards, userIndex != 0 or unclaimedRewards != 0
+        return state >> USER_INDEX_SHIFT, state & UNCLAIMED_MASK, False
+
+    def _setUserAssetState(self, _user: Address, _asset: Address, _index: int, _unclaimedRewards: int,
+                           _legacy: bool = False):
+        self._userAssetState[_user][_asset] = (_index << USER_INDEX_SHIFT) | _unclaimedRewards
+        if _legacy:
+            self._userIndex[_user].remove(_asset)
+            self._usersUnclaimedRewards[_user].remove(_asset)
 
     @eventlog(indexed=1)
     def AssetIndexUpdated(self, _asset: Address, _oldIndex: int, _newIndex: int) -> None:
@@ -51,7 +115,7 @@ class RewardDistributionManager(Addresses):
 
     @external(readonly=True)
     def getAssetEmission(self) -> dict:
-        return self._rewardConfig.getAllEmissionPerSecond()
+        return self._rewardConfig.getAllEmissionPerSecond(self.tokenDistributionPerDay(self.getDay()))
 
     @external(readonly=True)
     def getAssets(self) -> list:
@@ -69,8 +133,8 @@ class RewardDistributionManager(Addresses):
     @external(readonly=True)
     def getIndexes(self, _user: Address, _asset: Address) -> dict:
         return {
-            'userIndex': self._userIndex[_user][_asset],
-            'assetIndex': self._assetIndex[_asset]
+            'userIndex': self._getUserAssetState(_user, _asset)[0],
+            'assetIndex': self._getAssetState(_asset)[0]
         }
 
     @only_owner
@@ -96,7 +160,7 @@ class RewardDistributionManager(Addresses):
     @external
     def setDistributionPercentage(self, _distPercentage: List[DistPercentage]):
         self._updateDistPercentage(_distPercentage)
-        self.updateEmissionPerSecond()
+        self._updateAssetPercentages()
 
     @external(readonly=True)
     def getDistributionPercentage(self, _recipient: str) -> int:
@@ -123,7 +187,8 @@ class RewardDistributionManager(Addresses):
         self._rewardConfig.setAssetConfig(_assetConfig)
         _totalBalance = self._getTotalBalance(asset)
         self._updateAssetStateInternal(asset, _totalBalance)
-        _emissionPerSecond = self._rewardConfig.updateEmissionPerSecond(asset, distributionPerDay)
+        self._setAssetPercentage(asset, self._rewardConfig.getAssetPercentage(asset))
+        _emissionPerSecond = self._rewardConfig.getEmissionPerSecond(asset, distributionPerDay)
         self.AssetConfigUpdated(asset, _emissionPerSecond)
 
     @only_governance
@@ -144,6 +209,7 @@ class RewardDistributionManager(Addresses):
     def removeAssetConfig(self, _asset: Address) -> None:
         _totalBalance = self._getTotalBalance(_asset)
         self._updateAssetStateInternal(_asset, _totalBalance)
+        self._setAssetPercentage(_asset, 0)
 
         self._rewardConfig.removeAssetConfig(_asset)
 
@@ -151,67 +217,110 @@ class RewardDistributionManager(Addresses):
     def getPoolIDByAsset(self, _asset: Address) -> int:
         return self._rewardConfig.getPoolID(_asset)
 
-    @only_owner
-    @external
-    def updateEmissionPerSecond(self) -> None:
-        distributionPerDay = self.tokenDistributionPerDay(self.getDay())
+    def _updateAssetPercentages(self) -> None:
+        """
+        settles every asset at its previous percentage before the entity distribution percentages change
+        """
         _assets = self._rewardConfig.getAssets()
         for asset in _assets:
             _totalBalance = self._getTotalBalance(asset)
             self._updateAssetStateInternal(asset, _totalBalance)
-            self._rewardConfig.updateEmissionPerSecond(asset, distributionPerDay)
+            self._setAssetPercentage(asset, self._rewardConfig.getAssetPercentage(asset))
 
     def _updateAssetStateInternal(self, _asset: Address, _totalBalance: int) -> int:
-        oldIndex = self._assetIndex[_asset]
-        lastUpdateTimestamp = self._lastUpdateTimestamp[_asset]
+        oldIndex, lastUpdateTimestamp, _percentage = self._getAssetState(_asset)
 
         currentTime = self.now() // 10 ** 6
 
         if currentTime == lastUpdateTimestamp:
             return oldIndex
-        _emissionPerSecond = self._rewardConfig.getEmissionPerSecond(_asset)
 
-        newIndex = self._getAssetIndex(oldIndex, _emissionPerSecond, lastUpdateTimestamp, _totalBalance)
+        newIndex = self._getAssetIndex(oldIndex, _percentage, lastUpdateTimestamp, _totalBalance)
         if newIndex != oldIndex:
-            self._assetIndex[_asset] = newIndex
             self.AssetIndexUpdated(_asset, oldIndex, newIndex)
 
-        self._lastUpdateTimestamp[_asset] = currentTime
+        self._setAssetState(_asset, newIndex, currentTime, _percentage)
         return newIndex
 
     def _updateUserReserveInternal(self, _user: Address, _asset: Address, _userBalance: int,
-                                   _totalBalance: int) -> int:
-        userIndex = self._userIndex[_user][_asset]
-        accruedRewards = 0
-
+                                   _totalBalance: int, _claim: bool = False) -> tuple:
         newIndex = self._updateAssetStateInternal(_asset, _totalBalance)
+        return self._updateUserIndexInternal(_user, _asset, _userBalance, newIndex, _claim)
+
+    def _updateUserIndexInternal(self, _user: Address, _asset: Address, _userBalance: int, newIndex: int,
+                                 _claim: bool = False) -> tuple:
+        """
+        moves the user to the asset index, adding the accrued rewards to the unclaimed rewards of the user,
+        or clearing them when claiming.
+        returns the accrued rewards and the unclaimed rewards before the update
+        """
+        userIndex, unclaimedRewards, legacy = self._getUserAssetState(_user, _asset)
+        accruedRewards = 0
 
         if userIndex != newIndex:
             if _userBalance != 0:
                 accruedRewards = RewardDistributionManager._getRewards(_userBalance, newIndex, userIndex)
-            self._userIndex[_user][_asset] = newIndex
             self.UserIndexUpdated(_user, _asset, userIndex, newIndex)
 
-        return accruedRewards
+        if userIndex != newIndex or legacy or (_claim and unclaimedRewards != 0):
+            newUnclaimedRewards = 0 if _claim else unclaimedRewards + accruedRewards
+            self._setUserAssetState(_user, _asset, newIndex, newUnclaimedRewards, legacy)
+
+        return accruedRewards, unclaimedRewards
 
-    def _getAssetIndex(self, _currentIndex: int, _emissionPerSecond: int, _lastUpdateTimestamp: int,
+    def _getAssetIndex(self, _currentIndex: int, _percentage: int, _lastUpdateTimestamp: int,
                        _totalBalance: int) -> int:
         currentTime = self.now() // 10 ** 6
-        if _emissionPerSecond == 0 or _totalBalance == 0 or _lastUpdateTimestamp == currentTime:
+        if _percentage == 0 or _totalBalance == 0 or _lastUpdateTimestamp == currentTime:
             return _currentIndex
         else:
-            timeDelta = currentTime - _lastUpdateTimestamp
-            return exaDiv(_emissionPerSecond * timeDelta, _totalBalance) + _currentIndex
+            emission = self._getEmission(_percentage, _lastUpdateTimestamp, currentTime)
+            return exaDiv(emission, _totalBalance) + _currentIndex
+
+    def _getEmission(self, _percentage: int, _from: int, _to: int) -> int:
+        """
+        returns the tokens emitted for the percentage between the timestamps (in seconds),
+        following the daily distribution of every tier crossed in between
+        """
+        startTimestamp = self._timestampAtStart.get() // 10 ** 6
+        emission = 0
+        while _from < _to:
+            day = (_from - startTimestamp) // 86400
+            tierEnd = min(startTimestamp + self._nextTierDay(day) * 86400, _to)
+            _emissionPerSecond = exaMul(self.tokenDistributionPerDay(day) // 86400, _percentage)
+            emission += _emissionPerSecond * (tierEnd - _from)
+            _from = tierEnd
+        return emission
+
+    @staticmethod
+    def _nextTierDay(_day: int) -> int:
+        """
+        returns the first day after the given day with a different daily distribution
+        """
+        DAYS_PER_YEAR = 365
+
+        if _day < 0:
+            return 0
+        elif _day < 30:
+            return 30
+        else:
+            return (_day // DAYS_PER_YEAR + 1) * DAYS_PER_YEAR
 
     def _getUnclaimedRewards(self, _user: Address, _assetInput: 'UserAssetInput') -> int:
+        """
+        returns the unclaimed rewards of the user including the rewards accrued since the last update
+        """
         asset = _assetInput['asset']
-        userBalance = _assetInput['userBalance']
-        totalBalance = _assetInput['totalBalance']
-        _emissionPerSecond = self._rewardConfig.getEmissionPerSecond(asset)
-        assetIndex = self._getAssetIndex(self._assetIndex[asset], _emissionPerSecond,
-                                         self._lastUpdateTimestamp[asset], totalBalance)
-        accruedRewards = RewardDistributionManager._getRewards(userBalance, assetIndex, self._userIndex[_user][asset])
-        return accruedRewards
+        assetIndex = self._getProjectedAssetIndex(asset, _assetInput['totalBalance'])
+        return self._getUserUnclaimedRewards(_user, asset, _assetInput['userBalance'], assetIndex)
+
+    def _getProjectedAssetIndex(self, _asset: Address, _totalBalance: int) -> int:
+        assetIndex, lastUpdateTimestamp, _percentage = self._getAssetState(_asset)
+        return self._getAssetIndex(assetIndex, _percentage, lastUpdateTimestamp, _totalBalance)
+
+    def _getUserUnclaimedRewards(self, _user: Address, _asset: Address, _userBalance: int, _assetIndex: int) -> int:
+        userIndex, unclaimedRewards, _ = self._getUserAssetState(_user, _asset)
+        return unclaimedRewards + RewardDistributionManager._getRewards(_userBalance, _assetIndex, userIndex)
 
     @staticmethod
     def _getRewards(_userBalance: int, _assetIndex: int, _userIndex: int) -> int:
@@ -275,3 +384,23 @@ class RewardDistributionManager(Addresses):
             'userBalance': _user_balance,
             'totalBalance': _total_balance,
         }
+
+    def _getUsersAssetDetails(self, asset: Address, users: List[Address]) -> dict:
+        """
+        returns the total balance of the asset and the balance of every user, read in a single call
+        """
+        poolId = self._rewardConfig.getPoolID(asset)
+        if poolId > 0:
+            lp = self.create_interface_score(self._addresses[STAKED_LP], LPInterface)
+            supplies = lp.getLPStakedSupplies(poolId, users)
+        else:
+            token = self.create_interface_score(asset, TokenInterface)
+            supplies = token.getPrincipalSupplies(users)
+
+        _decimals = supplies.get("decimals")
+        _user_balances = supplies.get('principalUserBalances')
+        return {
+            'asset': asset,
+            'userBalances': {user: convertToExa(_user_balances[user], _decimals) for user in _user_balances},
+            'totalBalance': convertToExa(supplies.get('principalTotalSupply'), _decimals),
+        }
@@ -1,27 +1,36 @@
 from .rewardDistribution import *
 from .utils.checks import *
 from .utils.types import *
+from .utils.enumerable_set import EnumerableSetDB
 
 DAY_IN_MICROSECONDS = 86400 * 10 ** 6
+WORKER_DISTRIBUTION_BATCH_SIZE = 50
+REWARDS_BATCH_LIMIT = 50
 
 TAG = 'Reward Distribution Controller'
 
 
 class RewardDistributionController(RewardDistributionManager):
-    USERS_UNCLAIMED_REWARDS = 'usersUnclaimedRewards'
     DAY = 'day'
     DIST_COMPLETE = 'distComplete'
     TOKEN_DIST_TRACKER = 'tokenDistTracker'
     IS_INITIALIZED = 'isInitialized'
     IS_REWARD_CLAIM_ENABLED = 'isRewardClaimEnabled'
+    USER_ASSETS = 'userAssets'
+    USER_ASSETS_INDEXED = 'userAssetsIndexed'
+    WORKER_DIST_CURSOR = 'workerDistCursor'
+    WORKER_DIST_SUPPLY = 'workerDistSupply'
 
     def __init__(self, db: IconScoreDatabase) -> None:
         super().__init__(db)
         self._day = VarDB(self.DAY, db, value_type=int)
         self._isInitialized = VarDB(self.IS_INITIALIZED, db, value_type=bool)
         self._isRewardClaimEnabled = VarDB(self.IS_REWARD_CLAIM_ENABLED, db, value_type=bool)
-        self._usersUnclaimedRewards = DictDB(self.USERS_UNCLAIMED_REWARDS, db, value_type=int, depth=2)
         self._tokenDistTracker = DictDB(self.TOKEN_DIST_TRACKER, db, value_type=int)
+        self._userAssetsIndexed = DictDB(self.USER_ASSETS_INDEXED, db, value_type=bool)
+        self._userAssetsDb = db
+        self._workerDistCursor = VarDB(self.WORKER_DIST_CURSOR, db, value_type=int)
+        self._workerDistSupply = VarDB(self.WORKER_DIST_SUPPLY, db, value_type=int)
 
     def on_install(self, _addressProvider: Address, _startTimestamp: int,
                    _distPercentage: List[DistPercentage]) -> None:
@@ -70,6 +79,15 @@ class RewardDistributionController(RewardDistributionManager):
         _asset = self.msg.sender
         self._handleAction(_asset, _userAssetDetails)
 
+    @external
+    def handleActions(self, _userAssetDetails: List[UserDetails]) -> None:
+        """
+        handles the actions of every user of an operation on the sender asset, updating the asset index once.
+        All the details share the total supply of the asset before the operation.
+        """
+        _asset = self.msg.sender
+        self._handleActions(_asset, _userAssetDetails)
+
     @only_governance
     @external
     def disableRewardClaim(self):
@@ -90,17 +108,24 @@ class RewardDistributionController(RewardDistributionManager):
         self._handleAction(_asset, _userDetails)
 
     def _handleAction(self, _asset: Address, _userDetails: UserDetails) -> None:
-        _decimals = _userDetails.get("_decimals")
-
-        _user = _userDetails.get("_user")
-        _userBalance = convertToExa(_userDetails.get("_userBalance"), _decimals)
-        _totalSupply = convertToExa(_userDetails.get("_totalSupply"), _decimals)
+        self._handleActions(_asset, [_userDetails])
 
+    def _handleActions(self, _asset: Address, _userDetailsList: List[UserDetails]) -> None:
         RewardDistributionManager._require(self._rewardConfig.is_valid_asset(_asset), f'Asset Not Authorized: {_asset}')
-        accruedRewards = self._updateUserReserveInternal(_user, _asset, _userBalance, _totalSupply)
-        if accruedRewards != 0:
-            self._usersUnclaimedRewards[_user][_asset] += accruedRewards
-            self.RewardsAccrued(_user, _asset, accruedRewards)
+        if len(_userDetailsList) == 0:
+            return
+
+        _decimals = _userDetailsList[0].get("_decimals")
+        _totalSupply = convertToExa(_userDetailsList[0].get("_totalSupply"), _decimals)
+        assetIndex = self._updateAssetStateInternal(_asset, _totalSupply)
+
+        for _userDetails in _userDetailsList:
+            _user = _userDetails.get("_user")
+            _userBalance = convertToExa(_userDetails.get("_userBalance"), _userDetails.get("_decimals"))
+            accruedRewards, _ = self._updateUserIndexInternal(_user, _asset, _userBalance, assetIndex)
+            self._userAssets(_user).add(_asset)
+            if accruedRewards != 0:
+                self.RewardsAccrued(_user, _asset, accruedRewards)
 
     @external(readonly=True)
     def getDailyRewards(self, _day: int = None) -> dict:
@@ -129,12 +154,31 @@ class RewardDistributionController(RewardDistributionManager):
 
         return response
 
+    def _userAssets(self, _user: Address) -> EnumerableSetDB:
+        return EnumerableSetDB(f'{self.USER_ASSETS}|{_user}', self._userAssetsDb, value_type=Address)
+
+    def _getUserAssets(self, _user: Address) -> list:
+        """
+        returns the assets in which the user has a balance or unclaimed rewards.
+        Users that have not acted since the user asset sets were introduced are checked against every asset.
+        """
+        if not self._userAssetsIndexed[_user]:
+            return self._rewardConfig.getAssets()
+        userAssets = self._userAssets(_user)
+        return [asset for asset in userAssets.range(0, len(userAssets))]
+
+    @external(readonly=True)
+    def getUserAssets(self, _user: Address) -> list:
+        return self._getUserAssets(_user)
+
     @external(readonly=True)
     def getRewards(self, _user: Address) -> dict:
         totalRewards = 0
         response = {}
-        _assets = self._rewardConfig.getAssets()
+        _assets = self._getUserAssets(_user)
         for _asset in _assets:
+            if not self._rewardConfig.is_valid_asset(_asset):
+                continue
             _assetName = self._rewardConfig.getAssetName(_asset)
             _entity = self._rewardConfig.getEntity(_asset)
 
@@ -142,8 +186,7 @@ class RewardDistributionController(RewardDistributionManager):
             total = entityDict.get("total", 0)
 
             userAssetDetails = self._getUserAssetDetails(_asset, _user)
-            unclaimedRewards = self._usersUnclaimedRewards[_user][_asset]
-            unclaimedRewards += self._getUnclaimedRewards(_user, userAssetDetails)
+            unclaimedRewards = self._getUnclaimedRewards(_user, userAssetDetails)
             entityDict[_assetName] = unclaimedRewards
             total += unclaimedRewards
             entityDict["total"] = total
@@ -155,12 +198,50 @@ class RewardDistributionController(RewardDistributionManager):
 
         return response
 
+    @external(readonly=True)
+    def getRewardsBatch(self, _users: List[Address]) -> dict:
+        """
+        returns the rewards of up to REWARDS_BATCH_LIMIT users in the getRewards format, keyed by the user address.
+        Every user is read over the same assets as getRewards, and the asset index and the balances are read
+        once per asset for all the users holding it
+        """
+        if len(_users) > REWARDS_BATCH_LIMIT:
+            revert(f"{TAG}: Rewards batch takes up to {REWARDS_BATCH_LIMIT} users, got {len(_users)}")
+        assetUsers = {}
+        for user in _users:
+            for _asset in self._getUserAssets(user):
+                if self._rewardConfig.is_valid_asset(_asset):
+                    assetUsers.setdefault(_asset, []).append(user)
+
+        response = {str(user): {} for user in _users}
+        for _asset, users in assetUsers.items():
+            _assetName = self._rewardConfig.getAssetName(_asset)
+            _entity = self._rewardConfig.getEntity(_asset)
+
+            usersAssetDetails = self._getUsersAssetDetails(_asset, users)
+            userBalances = usersAssetDetails['userBalances']
+            assetIndex = self._getProjectedAssetIndex(_asset, usersAssetDetails['totalBalance'])
+            for user in users:
+                userResponse = response[str(user)]
+                unclaimedRewards = self._getUserUnclaimedRewards(user, _asset, userBalances[str(user)], assetIndex)
+
+                entityDict = userResponse.get(_entity, {})
+                entityDict[_assetName] = unclaimedRewards
+                entityDict["total"] = entityDict.get("total", 0) + unclaimedRewards
+                userResponse[_entity] = entityDict
+
+        now = self.now() // 10 ** 6
+        for userResponse in response.values():
+            userResponse['total'] = sum(entityDict["total"] for entityDict in userResponse.values())
+            userResponse['now'] = now
+
+        return response
+
     @only_owner
     @external
     def startDistribution(self) -> None:
         if self.getDay() == 0 and not self._isInitialized.get():
             self._mintDailyOMM()
-            self.updateEmissionPerSecond()
             self._isInitialized.set(True)
 
     @only_lending_pool
@@ -170,16 +251,24 @@ class RewardDistributionController(RewardDistributionManager):
             revert(f"{TAG} : Currently, the reward claim is not active")
         unclaimedRewards = 0
         accruedRewards = 0
-        _assets = self._rewardConfig.getAssets()
+        _assets = self._getUserAssets(_user)
+        userAssets = self._userAssets(_user)
 
         for _asset in _assets:
-            _assetName = self._rewardConfig.getAssetName(_asset)
-            unclaimedRewards += self._usersUnclaimedRewards[_user][_asset]
+            if not self._rewardConfig.is_valid_asset(_asset):
+                userAssets.remove(_asset)
+                continue
             userAssetDetails = self._getUserAssetDetails(_asset, _user)
-            accruedRewards += self._updateUserReserveInternal(_user, userAssetDetails['asset'],
-                                                              userAssetDetails['userBalance'],
-                                                              userAssetDetails['totalBalance'])
-            self._usersUnclaimedRewards[_user][_asset] = 0
+            assetAccruedRewards, assetUnclaimedRewards = self._updateUserReserveInternal(
+                _user, userAssetDetails['asset'], userAssetDetails['userBalance'], userAssetDetails['totalBalance'],
+                True)
+            unclaimedRewards += assetUnclaimedRewards
+            accruedRewards += assetAccruedRewards
+            if userAssetDetails['userBalance'] == 0:
+                userAssets.remove(_asset)
+            else:
+                userAssets.add(_asset)
+        self._userAssetsIndexed[_user] = True
 
         if accruedRewards != 0:
             unclaimedRewards += accruedRewards
@@ -195,23 +284,18 @@ class RewardDistributionController(RewardDistributionManager):
 
     @external
     def distribute(self) -> None:
-        worker = self.create_interface_score(self._addresses[WORKER_TOKEN], WorkerTokenInterface)
+        """
+        distributes the tokens of the day to the worker wallets, a batch of wallets per call.
+        The call that completes the worker distribution pays the dao fund and mints the tokens of the next day.
+        """
         ommToken = self.create_interface_score(self._addresses[OMM_TOKEN], TokenInterface)
         day: int = self._day.get()
 
         if day >= self.getDay():
             return
 
-        totalSupply = worker.totalSupply()
-        tokenDistTracker = self._tokenDistTracker['worker']
-        for user in worker.getWallets():
-            if tokenDistTracker <= 0:
-                break
-            tokenAmount = exaMul(exaDiv(worker.balanceOf(user), totalSupply), tokenDistTracker)
-            self.Distribution("worker", user, tokenAmount)
-            ommToken.transfer(user, tokenAmount)
-            totalSupply -= worker.balanceOf(user)
-            tokenDistTracker -= tokenAmount
+        if not self._distributeToWorkers():
+            return
 
         daoFundAddress = self._addresses[DAO_FUND]
         tokenDistTrackerDaoFund: int = self._tokenDistTracker['daoFund']
@@ -220,10 +304,48 @@ class RewardDistributionController(RewardDistributionManager):
         self._day.set(day + 1)
         self._mintDailyOMM()
 
+    def _distributeToWorkers(self) -> bool:
+        """
+        distributes the worker tokens to the next batch of wallets, resuming from the stored cursor.
+        returns True once every wallet has been paid
+        """
+        worker = self.create_interface_score(self._addresses[WORKER_TOKEN], WorkerTokenInterface)
+        ommToken = self.create_interface_score(self._addresses[OMM_TOKEN], TokenInterface)
+
+        cursor = self._workerDistCursor.get()
+        totalSupply = self._workerDistSupply.get() if cursor > 0 else worker.totalSupply()
+        tokenDistTracker = self._tokenDistTracker['worker']
+
+        wallets = worker.getWalletBalances(cursor, WORKER_DISTRIBUTION_BATCH_SIZE)
+        for wallet in wallets:
+            if tokenDistTracker <= 0 or totalSupply <= 0:
+                break
+            user = wallet['address']
+            balance = wallet['balance']
+            tokenAmount = min(exaMul(exaDiv(balance, totalSupply), tokenDistTracker), tokenDistTracker)
+            self.Distribution("worker", user, tokenAmount)
+            ommToken.transfer(user, tokenAmount)
+            totalSupply -= balance
+            tokenDistTracker -= tokenAmount
+
+        self._tokenDistTracker['worker'] = tokenDistTracker
+        if len(wallets) < WORKER_DISTRIBUTION_BATCH_SIZE or tokenDistTracker <= 0 or totalSupply <= 0:
+            self._workerDistCursor.remove()
+            self._workerDistSupply.remove()
+            return True
+
+        self._workerDistCursor.set(cursor + len(wallets))
+        self._workerDistSupply.set(totalSupply)
+        return False
+
     @external(readonly=True)
     def getDistributedDay(self) -> int:
         return self._day.get()
 
+    @external(readonly=True)
+    def getWorkerDistributionCursor(self) -> int:
+        return self._workerDistCursor.get()
+
     def _mintDailyOMM(self) -> None:
         day: int = self._day.get()
         tokenDistributionPerDay: int = self.tokenDistributionPerDay(day)
@@ -186,6 +186,16 @@ class StakedLp(Addresses):
             "principalTotalSupply": balance["totalStakedBalance"]
         }
 
+    @external(readonly=True)
+    def getLPStakedSupplies(self, _id: int, _users: List[Address]) -> dict:
+        return {
+            "decimals": self._getAverageDecimals(_id),
+            "principalUserBalances": {
+                str(user): self._poolStakeDetails[user][_id][Status.STAKED] for user in _users
+            },
+            "principalTotalSupply": self._totalStaked[_id]
+        }
+
     def _getAverageDecimals(self, _id: int) -> int:
         dex = self.create_interface_score(self.getAddress(DEX), LiquidityPoolInterface)
         pool_stats = dex.getPoolStats(_id)
@@ -0,0 +1,34 @@
+"""
+Compares the compounded interest kernels of lendingPoolCore.utils.math.
+
+Run from the score directory:
+    python -m tests.benchmark.benchmark_compounded_interest
+"""
+import timeit
+from decimal import Decimal, getcontext
+
+from lendingPoolCore.utils.math import EXA, SECONDS_PER_YEAR, exaPow, exaPowBinomial
+
+getcontext().prec = 80
+
+RATES = [EXA // 100, 2 * EXA // 10, EXA, 5 * EXA]
+DURATIONS = [60, 3600, 86400, 30 * 86400, SECONDS_PER_YEAR, 5 * SECONDS_PER_YEAR]
+ITERATIONS = 5000
+
+
+def main():
+    print(f"{'rate':>6} {'seconds':>10} {'exaPow us':>10} {'binomial us':>12} {'exaPow err':>14} {'binomial err':>14}")
+    for rate in RATES:
+        x = rate // SECONDS_PER_YEAR + EXA
+        for n in DURATIONS:
+            exact = (Decimal(x) / Decimal(EXA)) ** n * Decimal(EXA)
+            pow_time = timeit.timeit(lambda: exaPow(x, n), number=ITERATIONS) / ITERATIONS * 10 ** 6
+            binomial_time = timeit.timeit(lambda: exaPowBinomial(x, n), number=ITERATIONS) / ITERATIONS * 10 ** 6
+            pow_error = int(exaPow(x, n) - exact)
+            binomial_error = int(exaPowBinomial(x, n) - exact)
+            print(f"{rate / EXA:>6} {n:>10} {pow_time:>10.2f} {binomial_time:>12.2f} "
+                  f"{pow_error:>14} {binomial_error:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Step cost benchmark of the external entry points, run against the integration network.
+
+Run from the score directory:
+    python -m pytest tests/benchmark/test_benchmark_step_costs.py
+
+Every measured transaction is compared with tests/benchmark/step_baseline.json and the run fails when
+an entry point uses more steps (beyond BENCHMARK_TOLERANCE, 2% by default), emits more eventlogs, reads or
+writes more storage, makes more inter-contract calls than recorded or has no recorded baseline. Set
+BENCHMARK_UPDATE_BASELINE=1 to rewrite the baseline with the measured values, the file is only written in
+that mode. The committed baseline is meant to be recorded against contracts deployed from the code before
+the optimization series, so the gate compares with it.
+
+Storage reads, storage writes and inter-contract calls are counted from the step trace of the node's debug
+endpoint (debug_getTrace), by the iconservice step types: get for reads, set, replace and delete for writes
+and contractCall for calls. A node without the trace leaves them as None and they are not compared.
+
+The scenarios are parametrized by the number of reserves, reward assets, delegated preps and stake
+checkpoints, override the defaults with comma separated lists, e.g. BENCHMARK_PREP_COUNTS=1,2,4.
+"""
+import json
+import os
+import re
+
+import requests
+from iconsdk.wallet.wallet import KeyWallet
+
+from ..integration_test.test_integrate_omm_utils import OmmUtils
+from ..integration_test.test_integrate_base import PREP_LIST, OMM_USDS_ID, T_BEARS_URL
+
+EXA = 10 ** 18
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "step_baseline.json")
+UPDATE_BASELINE = os.environ.get("BENCHMARK_UPDATE_BASELINE") == "1"
+TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", "0.02"))
+DEBUG_URL = os.environ.get("BENCHMARK_DEBUG_URL", f"{(T_BEARS_URL or '').rstrip('/')}/api/debug/v3")
+
+
+def _counts(_name: str, _default: str) -> tuple:
+    return tuple(int(count) for count in os.environ.get(_name, _default).split(","))
+
+
+RESERVE_COUNTS = _counts("BENCHMARK_RESERVE_COUNTS", "1,2")
+ASSET_COUNTS = _counts("BENCHMARK_ASSET_COUNTS", "1,2,3,4")
+PREP_COUNTS = _counts("BENCHMARK_PREP_COUNTS", f"1,2,{len(PREP_LIST)}")
+CHECKPOINT_COUNTS = _counts("BENCHMARK_CHECKPOINT_COUNTS", "1,4,16")
+
+STEP_TYPE = re.compile(r"\b(get|set|replace|delete|contractCall)\b")
+TRACE_METRICS = {
+    'storageReads': ('get',),
+    'storageWrites': ('set', 'replace', 'delete'),
+    'contractCalls': ('contractCall',)
+}
+COMPARED_METRICS = ('eventLogs',) + tuple(TRACE_METRICS)
+
+with open(BASELINE_PATH, "r") as baseline_file:
+    BASELINE = json.load(baseline_file)
+
+RESULTS = {}
+
+
+def _int(_value):
+    return int(_value, 0)
+
+
+def _trace_metrics(_tx_hash: str) -> dict:
+    """
+    counts the storage accesses and inter-contract calls of a transaction from its step trace
+    """
+    try:
+        response = requests.post(DEBUG_URL, json={
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "debug_getTrace",
+            "params": {"txHash": _tx_hash}
+        }, timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return dict.fromkeys(TRACE_METRICS)
+    trace = response.get('result')
+    if not trace:
+        return dict.fromkeys(TRACE_METRICS)
+
+    step_types = {}
+    for entry in trace.get('logs', []):
+        message = str(entry.get('msg', ''))
+        if 'step' not in message.lower():
+            continue
+        for step_type in STEP_TYPE.findall(message):
+            step_types[step_type] = step_types.get(step_type, 0) + 1
+    return {
+        metric: sum(step_types.get(step_type, 0) for step_type in metric_step_types)
+        for metric, metric_step_types in TRACE_METRICS.items()
+    }
+
+
+class StepCostBenchmark(OmmUtils):
+    def setUp(self):
+        super().setUp()
+        self.regressions = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if not UPDATE_BASELINE:
+            return
+        baseline = dict(BASELINE)
+        baseline.update(RESULTS)
+        with open(BASELINE_PATH, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+            baseline_file.write("\n")
+
+    def _measure(self, name: str, tx_result: dict) -> dict:
+        self.assertEqual(1, tx_result['status'], f"{name} failed: {tx_result.get('failure')}")
+        event_logs = tx_result.get('eventLogs', [])
+        result = {
+            'stepUsed': tx_result['stepUsed'],
+            'eventLogs': len(event_logs),
+            'contracts': len({event_log['scoreAddress'] for event_log in event_logs})
+        }
+        result.update(_trace_metrics(tx_result['txHash']))
+        RESULTS[name] = result
+        print(f"{name}: {result}")
+
+        if UPDATE_BASELINE:
+            return result
+        expected = BASELINE.get(name)
+        if expected is None:
+            self.regressions.append(f"{name}: no baseline recorded")
+        else:
+            if result['stepUsed'] > expected['stepUsed'] * (1 + TOLERANCE):
+                self.regressions.append(f"{name}: stepUsed {expected['stepUsed']} -> {result['stepUsed']}")
+            for metric in COMPARED_METRICS:
+                if expected.get(metric) is None or result[metric] is None:
+                    continue
+                if result[metric] > expected[metric]:
+                    self.regressions.append(f"{name}: {metric} {expected[metric]} -> {result[metric]}")
+        return result
+
+    def _assert_no_regressions(self):
+        self.assertEqual([], self.regressions, "step cost regressions")
+
+    def _new_user(self) -> KeyWallet:
+        user = KeyWallet.create()
+        self.send_icx(self.deployer_wallet, user.get_address(), 2000 * EXA)
+        tx = self._transferUSDS(self.deployer_wallet, user.get_address(), 2000 * EXA)
+        self.assertEqual(1, tx['status'])
+        return user
+
+    def _deposit(self, user: KeyWallet, reserves: int):
+        self._measure(f"deposit_usds/reserves={reserves}", self._depositUSDS(user, 1000 * EXA))
+        if reserves > 1:
+            self._measure(f"deposit_icx/reserves={reserves}", self._depositICX(user, 1000 * EXA))
+
+    def _set_icx_price(self, rate: int):
+        tx = self.send_tx(
+            from_=self.deployer_wallet,
+            to=self.contracts['priceOracle'],
+            method="set_reference_data",
+            params={'_base': 'ICX', '_quote': 'USD', '_rate': rate}
+        )
+        self.assertEqual(1, tx['status'])
+
+    def test_01_reserve_flows(self):
+        for reserves in RESERVE_COUNTS:
+            user = self._new_user()
+            self._deposit(user, reserves)
+            self._measure(f"borrow_usds/reserves={reserves}", self._borrowUSDS(user, 100 * EXA))
+            self._measure(f"repay_usds/reserves={reserves}", self._repayUSDS(user, 50 * EXA))
+            self._measure(f"redeem_usds/reserves={reserves}", self._redeemUSDS(user, 100 * EXA))
+        self._assert_no_regressions()
+
+    def test_02_liquidation(self):
+        icx_price = _int(self.call_tx(
+            to=self.contracts['priceOracle'],
+            method="get_reference_data",
+            params={'_base': 'ICX', '_quote': 'USD'}
+        ))
+        for collaterals in RESERVE_COUNTS:
+            borrower = self._new_user()
+            liquidator = self._new_user()
+            self._set_icx_price(1 * EXA)
+            self._depositICX(borrower, 1000 * EXA)
+            if collaterals > 1:
+                self._depositUSDS(borrower, 100 * EXA)
+            self._borrowUSDS(borrower, 500 * EXA + 50 * EXA * (collaterals - 1))
+            self._set_icx_price(7 * EXA // 10)
+
+            liquidation_data = self.call_tx(
+                to=self.contracts['lendingPoolDataProvider'],
+                method="getUserLiquidationData",
+                params={'_user': borrower.get_address()}
+            )
+            amount = _int(liquidation_data['badDebt'])
+            data = json.dumps({'method': 'liquidationCall', 'params': {
+                '_collateral': self.contracts['sicx'],
+                '_reserve': self.contracts['usds'],
+                '_user': borrower.get_address(),
+                '_purchaseAmount': amount}}).encode('utf-8')
+            tx = self.send_tx(
+                from_=liquidator,
+                to=self.contracts['usds'],
+                method="transfer",
+                params={'_to': self.contracts['lendingPool'], '_value': amount, '_data': data}
+            )
+            self._measure(f"liquidation_call/collaterals={collaterals}", tx)
+        self._set_icx_price(icx_price)
+        self._assert_no_regressions()
+
+    def _hold_assets(self, user: KeyWallet, assets: int):
+        # oUSDS, dUSDS, oICX and the staked OMM/USDS pool, in that order
+        self._depositUSDS(user, 1000 * EXA)
+        if assets > 1:
+            self._borrowUSDS(user, 100 * EXA)
+        if assets > 2:
+            self._depositICX(user, 1000 * EXA)
+        if assets > 3:
+            self._mintLpTokens(self.deployer_wallet, user.get_address(), OMM_USDS_ID)
+            self._stakeLp(user, 100 * EXA, OMM_USDS_ID)
+
+    def test_03_claim_rewards(self):
+        for assets in ASSET_COUNTS:
+            user = self._new_user()
+            self._hold_assets(user, assets)
+            tx = self.send_tx(
+                from_=user,
+                to=self.contracts['lendingPool'],
+                method="claimRewards"
+            )
+            self._measure(f"claim_rewards/assets={assets}", tx)
+        self._assert_no_regressions()
+
+    def test_04_omm_staking(self):
+        user = self._new_user()
+        self.send_tx(
+            from_=self.deployer_wallet,
+            to=self.contracts['ommToken'],
+            method="mintTo",
+            params={"_to": user.get_address(), "_amount": 1000 * EXA}
+        )
+        checkpoints = 0
+        for target in CHECKPOINT_COUNTS:
+            while checkpoints < target - 1:
+                self._stakeOMM(user, 20 * EXA)
+                self._unstakeOMM(user, 10 * EXA)
+                checkpoints += 1
+            self._measure(f"stake_omm/checkpoints={target}", self._stakeOMM(user, 20 * EXA))
+            self._measure(f"unstake_omm/checkpoints={target}", self._unstakeOMM(user, 10 * EXA))
+            checkpoints += 1
+
+        for preps in PREP_COUNTS:
+            votes = EXA // preps
+            delegations = [{'_address': prep, '_votes_in_per': votes} for prep in PREP_LIST[:preps]]
+            delegations[0]['_votes_in_per'] += EXA - votes * preps
+            tx = self.send_tx(
+                from_=user,
+                to=self.contracts['delegation'],
+                method="updateDelegations",
+                params={'_delegations': delegations}
+            )
+            self._measure(f"update_delegations/preps={preps}", tx)
+        self._assert_no_regressions()
+
+    def test_05_lp_staking(self):
+        user = self._new_user()
+        self._mintLpTokens(self.deployer_wallet, user.get_address(), OMM_USDS_ID)
+        self._measure("stake_lp", self._stakeLp(user, 100 * EXA, OMM_USDS_ID))
+        self._measure("unstake_lp", self._unstakeLp(user, 50 * EXA, OMM_USDS_ID))
+        self._assert_no_regressions()
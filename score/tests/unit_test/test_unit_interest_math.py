@@ -0,0 +1,56 @@
+from decimal import Decimal, getcontext
+from unittest import TestCase
+
+from lendingPoolCore.utils.math import EXA, SECONDS_PER_YEAR, BINOMIAL_MAX_GROWTH, exaPow, exaPowBinomial
+
+getcontext().prec = 80
+
+RATES = [0, EXA // 100, 2 * EXA // 10, EXA, 5 * EXA]
+DURATIONS = [0, 1, 5, 60, 3600, 86400, 30 * 86400, SECONDS_PER_YEAR, 5 * SECONDS_PER_YEAR]
+
+
+def exact_pow(x: int, n: int) -> Decimal:
+    return (Decimal(x) / Decimal(EXA)) ** n * Decimal(EXA)
+
+
+def series_cases():
+    for rate in RATES:
+        x = rate // SECONDS_PER_YEAR + EXA
+        for n in DURATIONS:
+            if (x - EXA) * n <= BINOMIAL_MAX_GROWTH:
+                yield x, n
+
+
+class TestInterestMath(TestCase):
+
+    def test_binomial_pow_precision(self):
+        for x, n in series_cases():
+            expected = exact_pow(x, n)
+            actual = exaPowBinomial(x, n)
+            # every term is floored, so the kernel never overshoots
+            self.assertLessEqual(actual, expected)
+            # and stays within 1e-18 relative of the exact value
+            self.assertLessEqual(expected - actual, max(expected / EXA, 100), f"x {x} time {n}")
+
+    def test_binomial_pow_at_least_as_precise_as_exa_pow(self):
+        for x, n in series_cases():
+            expected = exact_pow(x, n)
+            self.assertLessEqual(abs(exaPowBinomial(x, n) - expected), abs(exaPow(x, n) - expected) + 1)
+
+    def test_binomial_pow_falls_back_on_large_growth(self):
+        """
+        the series needs more terms than squaring needs multiplications once rate * time is large
+        """
+        for rate in RATES:
+            x = rate // SECONDS_PER_YEAR + EXA
+            for n in DURATIONS:
+                if (x - EXA) * n > BINOMIAL_MAX_GROWTH:
+                    self.assertEqual(exaPow(x, n), exaPowBinomial(x, n), f"x {x} time {n}")
+
+    def test_binomial_pow_edge_cases(self):
+        self.assertEqual(EXA, exaPowBinomial(EXA, 0))
+        self.assertEqual(EXA, exaPowBinomial(EXA, SECONDS_PER_YEAR))
+        self.assertEqual(EXA, exaPowBinomial(EXA + 10 ** 10, 0))
+        self.assertEqual(EXA + 10 ** 10, exaPowBinomial(EXA + 10 ** 10, 1))
+        # rates below one fall back to exaPow
+        self.assertEqual(exaPow(EXA // 2, 10), exaPowBinomial(EXA // 2, 10))
@@ -1,6 +1,6 @@
 from unittest import mock
 
-from lendingPoolCore.utils.math import SECONDS_PER_YEAR
+from lendingPoolCore.utils.math import SECONDS_PER_YEAR, exaDiv, exaMul
 from tbears.libs.scoretest.patch.score_patcher import ScorePatcher, get_interface_score
 from tbears.libs.scoretest.score_test_case import ScoreTestCase
 
@@ -114,6 +114,18 @@ class TestLendingPoolCore(ScoreTestCase):
         self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: 100 * EXA)
         self.patch_internal_method(_reserve.get("dTokenAddress"), "principalTotalSupply", lambda: 10 * EXA)
 
+        try:
+            self.lending_pool_core.reconcileReserveLiquidity(_reserve_address)
+        except IconScoreException as err:
+            self.assertIn("SenderNotAuthorized", str(err))
+        else:
+            raise IconScoreException("Unauthorized method call", 900)
+
+        self.set_msg(self.mock_governance, 1)
+        self.lending_pool_core.reconcileReserveLiquidity(_reserve_address)
+        self.lending_pool_core.ReserveLiquidityReconciled.assert_called_with(_reserve_address, 100 * EXA, 10 * EXA)
+        self.set_msg(self.test_account4, 1)
+
         actual_result = self.lending_pool_core.getReserveData(_reserve_address)
         expected_result = {**_reserve, **{
             "totalLiquidity": 110 * EXA,
@@ -124,6 +136,192 @@ class TestLendingPoolCore(ScoreTestCase):
         }}
         self.assertDictEqual(actual_result, expected_result)
 
+    def test_reserve_migration(self):
+        _reserve = TestLendingPoolCore.sample_reserve("5432")
+        _reserve_address = _reserve.get("reserveAddress")
+        self.lending_pool_core._reserveList.put(_reserve_address)
+
+        # write the reserve in the legacy per-field layout
+        prefix = self.lending_pool_core.reservePrefix(_reserve_address)
+        legacy = self.lending_pool_core.reserve[prefix]
+        for field, value in _reserve.items():
+            getattr(legacy, field).set(value)
+        legacy.borrowThreshold.set(9 * EXA // 10)
+
+        for reserve in [self._reserve, _reserve]:
+            self.patch_internal_method(reserve.get("reserveAddress"), "balanceOf", lambda _address: 100 * EXA)
+            self.patch_internal_method(reserve.get("dTokenAddress"), "principalTotalSupply", lambda: 10 * EXA)
+
+        self.lending_pool_core.on_update()
+
+        self.assertIsNone(legacy.reserveAddress.get())
+        self.assertEqual(0, legacy.liquidityRate.get())
+        self.assertDictEqual({**_reserve, "borrowThreshold": 9 * EXA // 10, "availableLiquidity": 100 * EXA,
+                              "totalBorrows": 10 * EXA}, legacy.get())
+
+        # already migrated reserves are left untouched
+        self.assertFalse(legacy.migrate())
+
+        actual_result = self.lending_pool_core.getReserveData(_reserve_address)
+        self.assertDictEqual({**_reserve, **{
+            "totalLiquidity": 110 * EXA,
+            "borrowThreshold": 9 * EXA // 10,
+            "availableLiquidity": 100 * EXA,
+            "totalBorrows": 10 * EXA,
+            "availableBorrows": 89 * EXA
+        }}, actual_result)
+
+    def test_all_reserves_snapshot(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+        self._set_reserve_liquidity(_reserve_address, 100 * EXA, 10 * EXA)
+
+        time_elapsed = SECONDS_PER_YEAR * 10 ** 6 // 100
+        with mock.patch.object(self.lending_pool_core, "now", return_value=time_elapsed):
+            snapshot = self.lending_pool_core.getAllReservesSnapshot()
+            self.assertEqual([str(_reserve_address)], list(snapshot.keys()))
+            reserve_snapshot = snapshot[str(_reserve_address)]
+            self.assertDictEqual(self.lending_pool_core.getReserveData(_reserve_address), reserve_snapshot["data"])
+            self.assertDictEqual(self.lending_pool_core.getReserveConfiguration(_reserve_address),
+                                 reserve_snapshot["configuration"])
+            self.assertDictEqual(self.lending_pool_core.getReserveConstants(_reserve_address),
+                                 reserve_snapshot["constants"])
+            self.assertEqual(self.lending_pool_core.getNormalizedIncome(_reserve_address),
+                             reserve_snapshot["normalizedIncome"])
+            self.assertEqual(self.lending_pool_core.getNormalizedDebt(_reserve_address),
+                             reserve_snapshot["normalizedDebt"])
+
+    def test_user_reserve_participation(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+        _o_token_address = _reserve.get("oTokenAddress")
+        _d_token_address = _reserve.get("dTokenAddress")
+        _user = self.test_account2
+
+        # users without a bitmap are checked against every reserve
+        self.assertEqual([_reserve_address], self.lending_pool_core.getUserActiveReserves(_user))
+
+        try:
+            self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, True)
+        except IconScoreException as err:
+            self.assertIn("SenderNotAuthorized", str(err))
+        else:
+            raise IconScoreException("Unauthorized method call", 900)
+
+        # the first notification builds the bitmap from the token balances
+        self.patch_internal_method(_o_token_address, "scaledBalanceOf", lambda _user: 0)
+        self.patch_internal_method(_d_token_address, "principalBalanceOf", lambda _user: 0)
+        self.set_msg(_o_token_address, 0)
+        self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, False)
+        self.assert_internal_call(_o_token_address, "scaledBalanceOf", _user)
+        self.assertEqual([], self.lending_pool_core.getUserActiveReserves(_user))
+
+        self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, True)
+        self.assertEqual([_reserve_address], self.lending_pool_core.getUserActiveReserves(_user))
+
+        self.set_msg(_d_token_address, 0)
+        self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, True)
+        self.set_msg(_o_token_address, 0)
+        self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, False)
+        self.assertEqual([_reserve_address], self.lending_pool_core.getUserActiveReserves(_user))
+
+        self.set_msg(_d_token_address, 0)
+        self.lending_pool_core.updateUserReserveParticipation(_reserve_address, _user, False)
+        self.assertEqual([], self.lending_pool_core.getUserActiveReserves(_user))
+
+    def test_initialize_user_reserves(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+        self.patch_internal_method(_reserve.get("oTokenAddress"), "scaledBalanceOf",
+                                   lambda _user: 10 * EXA if _user == self.test_account3 else 0)
+        self.patch_internal_method(_reserve.get("dTokenAddress"), "principalBalanceOf", lambda _user: 0)
+
+        self.set_msg(self._owner, 0)
+        self.lending_pool_core.initializeUserReserves([self.test_account3, self.test_account4])
+        self.assertEqual([_reserve_address], self.lending_pool_core.getUserActiveReserves(self.test_account3))
+        self.assertEqual([], self.lending_pool_core.getUserActiveReserves(self.test_account4))
+        self.assertDictEqual({"hasDeposits": True, "hasBorrows": False},
+                             self.lending_pool_core.getUserPositionFlags(self.test_account3))
+        self.assertDictEqual({"hasDeposits": False, "hasBorrows": False},
+                             self.lending_pool_core.getUserPositionFlags(self.test_account4))
+
+    def test_user_account_summary(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+        _o_token_address = _reserve.get("oTokenAddress")
+        _d_token_address = _reserve.get("dTokenAddress")
+        _user = self.test_account3
+        self.patch_internal_method(_o_token_address, "scaledBalanceOf", lambda _user: 100 * EXA)
+        self.patch_internal_method(_d_token_address, "scaledBalanceOf", lambda _user: 20 * EXA)
+        self.patch_internal_method(_d_token_address, "principalBalanceOf", lambda _user: 20 * EXA)
+        # no interest has accrued on the scaled debt yet
+        self._freeze_time(_reserve_address)
+
+        try:
+            self.lending_pool_core.getUserAccountSummary(_user, [])
+        except IconScoreException as err:
+            self.assertIn(f"price of reserve {_reserve_address} is missing", str(err))
+        else:
+            raise IconScoreException("Missing price accepted", 900)
+
+        actual_result = self.lending_pool_core.getUserAccountSummary(_user, [
+            {"reserve": _reserve_address, "price": 2 * EXA}])
+        self.assertDictEqual({
+            "totalLiquidityBalanceUSD": 200 * EXA,
+            "totalCollateralBalanceUSD": 200 * EXA,
+            "totalBorrowBalanceUSD": 40 * EXA,
+            "totalFeesUSD": 0,
+            "currentLtv": 5 * EXA // 10,
+            "currentLiquidationThreshold": 65 * EXA // 100,
+            "reserves": {
+                str(_reserve_address): {
+                    "underlyingBalance": 100 * EXA,
+                    "compoundedBorrowBalance": 20 * EXA,
+                    "originationFee": 0,
+                    "decimals": 18,
+                    "price": 2 * EXA
+                }
+            }
+        }, actual_result)
+
+        # the rounded scaled debt never reports less than the principal
+        self.patch_internal_method(_d_token_address, "scaledBalanceOf", lambda _user: 20 * EXA - 1)
+        self.assertEqual(20 * EXA, self.lending_pool_core.getUserAccountSummary(_user, [
+            {"reserve": _reserve_address, "price": 2 * EXA}])["reserves"][str(_reserve_address)]["compoundedBorrowBalance"])
+        self.patch_internal_method(_d_token_address, "scaledBalanceOf", lambda _user: 20 * EXA)
+
+        # the batched summaries read the balances of all the users from each token at once
+        self.patch_internal_method(_o_token_address, "balancesOf",
+                                   lambda _users: {str(user): 100 * EXA for user in _users})
+        self.patch_internal_method(_d_token_address, "balancesOf",
+                                   lambda _users: {str(user): 20 * EXA for user in _users})
+        summaries = self.lending_pool_core.getUserAccountSummaries([_user, self.test_account4], [
+            {"reserve": _reserve_address, "price": 2 * EXA}])
+        self.assertDictEqual({str(_user): actual_result, str(self.test_account4): actual_result}, summaries)
+
+    def test_user_debt_position(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+        _d_token_address = _reserve.get("dTokenAddress")
+        _user = self.test_account3
+        self.patch_internal_method(_d_token_address, "principalBalanceOf", lambda _user: 20 * EXA)
+        self.patch_internal_method(_d_token_address, "scaledBalanceOf", lambda _user: 20 * EXA)
+        self._freeze_time(_reserve_address)
+
+        actual_result = self.lending_pool_core.getUserDebtPosition(_reserve_address, _user)
+        self.assertDictEqual({
+            "isActive": True,
+            "principalBorrowBalance": 20 * EXA,
+            "compoundedBorrowBalance": 20 * EXA,
+            "borrowBalanceIncrease": 0,
+            "originationFee": 0
+        }, actual_result)
+
+        self.patch_internal_method(_d_token_address, "principalBalanceOf", lambda _user: 0)
+        actual_result = self.lending_pool_core.getUserDebtPosition(_reserve_address, _user)
+        self.assertEqual(0, actual_result["compoundedBorrowBalance"])
+        self.assertEqual(0, actual_result["borrowBalanceIncrease"])
+
     def test_normalized_income(self):
         _reserve = self._reserve
         _reserve_address = _reserve.get("reserveAddress")
@@ -206,6 +404,7 @@ class TestLendingPoolCore(ScoreTestCase):
         _totalBorrow = 750 * EXA
         self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: _totalSupply)
         self.patch_internal_method(_reserve.get("dTokenAddress"), "principalTotalSupply", lambda: _totalBorrow)
+        self._set_reserve_liquidity(_reserve_address, _totalSupply, _totalBorrow)
 
         # # set lending pool user
         self.set_msg(self.mock_lending_pool, 1)
@@ -233,6 +432,28 @@ class TestLendingPoolCore(ScoreTestCase):
             self.assertAlmostEqual(1.0005, actual_result["liquidityCumulativeIndex"] / EXA, 8)
             self.assertAlmostEqual(1.002002001, actual_result["borrowCumulativeIndex"] / EXA, 8)
 
+    def test_update_state_writes_reserve_once(self):
+        _reserve = self._reserve
+        _reserve_address = _reserve.get("reserveAddress")
+
+        self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: 1200 * EXA)
+        self.patch_internal_method(_reserve.get("dTokenAddress"), "principalTotalSupply", lambda: 750 * EXA)
+        self._set_reserve_liquidity(_reserve_address, 1200 * EXA, 750 * EXA)
+        self.set_msg(self.mock_lending_pool, 1)
+
+        prefix = self.lending_pool_core.reservePrefix(_reserve_address)
+        record = self.lending_pool_core.reserve[prefix].record
+        time_elapsed = SECONDS_PER_YEAR * 10 ** 6 // 100
+        with mock.patch.object(self.lending_pool_core, "now", return_value=time_elapsed), \
+                mock.patch.object(record, "set", wraps=record.set) as record_set:
+            self.lending_pool_core.updateStateOnDeposit(_reserve_address, self.test_account2, 200 * EXA)
+            record_set.assert_called_once()
+
+        self.assertFalse(self.lending_pool_core.reserve.isCaching())
+        actual_result = self.lending_pool_core.getReserveData(_reserve_address)
+        self.assertEqual(time_elapsed, actual_result["lastUpdateTimestamp"])
+        self.assertAlmostEqual(1.0005, actual_result["liquidityCumulativeIndex"] / EXA, 8)
+
     def test_update_state_on_redeem_non_lending_pool(self):
         _reserve = self._reserve
         _reserve_address = _reserve.get("reserveAddress")
@@ -255,6 +476,7 @@ class TestLendingPoolCore(ScoreTestCase):
         _totalBorrow = 1220 * EXA
         self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: _totalSupply)
         self.patch_internal_method(_reserve.get("dTokenAddress"), "principalTotalSupply", lambda: _totalBorrow)
+        self._set_reserve_liquidity(_reserve_address, _totalSupply, _totalBorrow)
 
         # # set lending pool user
         self.set_msg(self.mock_lending_pool, 1)
@@ -303,18 +525,25 @@ class TestLendingPoolCore(ScoreTestCase):
 
         _user_current_borrow = 220 * EXA
 
-        _user_interest = 100 * EXA // 1000
-
         self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: _totalSupply)
 
-        self._mock_debt_token_score(_totalBorrow, _user_current_borrow, _user_interest)
-        # # set lending pool user
-        self.set_msg(self.mock_lending_pool, 1)
-
         time_elapsed = SECONDS_PER_YEAR * 10 ** 6 // 600
 
         with mock.patch.object(self.lending_pool_core, "now",
                                return_value=time_elapsed):
+            # the scaled debt of a 220.1 debt, the interest is what it compounds to above the principal
+            normalized_debt = self.lending_pool_core.getNormalizedDebt(_reserve_address)
+            _user_scaled_borrow = exaDiv(_user_current_borrow + 100 * EXA // 1000, normalized_debt)
+            _user_interest = exaMul(_user_scaled_borrow, normalized_debt) - _user_current_borrow
+
+            self._mock_debt_token_score(_totalBorrow, _user_current_borrow, _user_interest,
+                                        scaled_borrow=_user_scaled_borrow)
+            # liquidity before the interest fee is sent out and the new debt is minted
+            self._set_reserve_liquidity(_reserve_address, _totalSupply + _user_interest // 10,
+                                        _totalBorrow - new_borrow_amount - _user_interest)
+            # # set lending pool user
+            self.set_msg(self.mock_lending_pool, 1)
+
             self.lending_pool_core.updateStateOnBorrow(_reserve_address, _user_address, new_borrow_amount,
                                                        10 * EXA // 100)
             prefix = self.lending_pool_core.userReservePrefix(_reserve_address, _user_address)
@@ -330,17 +559,19 @@ class TestLendingPoolCore(ScoreTestCase):
 
             mock_d_token_score = get_interface_score(_d_token_address)
 
-            self.assertTrue(mock_d_token_score.principalTotalSupply.called)
-
             mock_d_token_score.principalBalanceOf.assert_called_with(_user_address)
 
-            mock_d_token_score.mintOnBorrow.aseert_called_with(_user_address, _user_current_borrow, _user_interest)
+            self.assert_internal_call(_d_token_address, "mintOnBorrow", _user_address, new_borrow_amount,
+                                      _user_interest,
+                                      self.lending_pool_core.getReserveBorrowCumulativeIndex(_reserve_address))
 
             self.assert_internal_call(_reserve_address, "transfer", self.mock_fee_provider, _user_interest // 10)
 
             actual_result = self.lending_pool_core.getReserveData(_reserve_address)
 
             self.assertEqual(time_elapsed, actual_result["lastUpdateTimestamp"])
+            self.assertEqual(_totalSupply - new_borrow_amount, actual_result["availableLiquidity"])
+            self.assertEqual(_totalBorrow, actual_result["totalBorrows"])
 
             self.assertAlmostEqual(0.5749494949, actual_result["borrowRate"] / EXA, 8)
             #
@@ -376,6 +607,8 @@ class TestLendingPoolCore(ScoreTestCase):
 
         self.patch_internal_method(_reserve_address, "balanceOf", lambda _address: _totalSupply)
         self._mock_debt_token_score(_totalBorrow, _user_current_borrow, borrow_balance_increase)
+        self._set_reserve_liquidity(_reserve_address, _totalSupply + borrow_balance_increase // 10,
+                                    _totalBorrow - borrow_balance_increase + repay_amount)
         # # set lending pool user
         self.set_msg(self.mock_lending_pool, 1)
 
@@ -403,10 +636,10 @@ class TestLendingPoolCore(ScoreTestCase):
 
             mock_d_token_score = get_interface_score(_d_token_address)
 
-            self.assertTrue(mock_d_token_score.principalTotalSupply.called)
-
             # mock_d_token_score.principalBalanceOf.assert_called_with(_user_address)
-            mock_d_token_score.burnOnRepay.aseert_called_with(_user_address, repay_amount, borrow_balance_increase)
+            self.assert_internal_call(_d_token_address, "burnOnRepay", _user_address, repay_amount,
+                                      borrow_balance_increase,
+                                      self.lending_pool_core.getReserveBorrowCumulativeIndex(_reserve_address))
 
             self.assert_internal_call(_reserve_address, "transfer", self.mock_fee_provider,
                                       borrow_balance_increase // 10)
@@ -414,6 +647,8 @@ class TestLendingPoolCore(ScoreTestCase):
             actual_result = self.lending_pool_core.getReserveData(_reserve_address)
 
             self.assertEqual(time_elapsed, actual_result["lastUpdateTimestamp"])
+            self.assertEqual(_totalSupply + repay_amount, actual_result["availableLiquidity"])
+            self.assertEqual(_totalBorrow, actual_result["totalBorrows"])
 
             self.assertAlmostEqual(0.036296296296296300, actual_result["borrowRate"] / EXA, 8)
             #
@@ -459,6 +694,10 @@ class TestLendingPoolCore(ScoreTestCase):
         self.patch_internal_method(_collateral_reserve_address, "balanceOf", lambda _address: _collateral_total_supply)
         self._mock_debt_token_score(_collateral_total_borrow, 0, borrow_balance_increase, _collateral_d_token_address)
 
+        self._set_reserve_liquidity(_principal_reserve_address, _principal_total_supply + borrow_balance_increase // 10,
+                                    _principal_total_borrow - borrow_balance_increase + _amount_to_liquidate)
+        self._set_reserve_liquidity(_collateral_reserve_address, _collateral_total_supply, _collateral_total_borrow)
+
         # # set lending pool user
         self.set_msg(self.mock_liquidation_manager, 1)
 
@@ -494,7 +733,8 @@ class TestLendingPoolCore(ScoreTestCase):
 
             self.assert_internal_call(_principal_d_token_address, "burnOnLiquidation", _user_address,
                                       _amount_to_liquidate,
-                                      borrow_balance_increase)
+                                      borrow_balance_increase,
+                                      _principal_actual_result["borrowCumulativeIndex"])
 
             self.assertAlmostEqual(1.000062500000000000, _principal_actual_result["liquidityCumulativeIndex"] / EXA, 8)
             self.assertAlmostEqual(1.600160000000000000, _collateral_actual_result["liquidityCumulativeIndex"] / EXA, 8)
@@ -524,8 +764,22 @@ class TestLendingPoolCore(ScoreTestCase):
 
             self.assertEqual(2, self.lending_pool_core.ReserveUpdated.call_count)
 
-    def _mock_debt_token_score(self, total_borrow, user_borrow, interest, address: Address = None):
+    def _set_reserve_liquidity(self, reserve_address: Address, available_liquidity: int, total_borrows: int):
+        prefix = self.lending_pool_core.reservePrefix(reserve_address)
+        self.lending_pool_core.reserve[prefix].update(availableLiquidity=available_liquidity,
+                                                      totalBorrows=total_borrows)
+
+    def _mock_debt_token_score(self, total_borrow, user_borrow, interest, address: Address = None,
+                               scaled_borrow: int = None):
         token_address = self._reserve.get("dTokenAddress") if address == None else address
         self.patch_internal_method(token_address, "principalTotalSupply", lambda: total_borrow)
         ScorePatcher.patch_internal_method(token_address, "principalBalanceOf", lambda _user: user_borrow)
         ScorePatcher.patch_internal_method(token_address, "balanceOf", lambda _user: user_borrow + interest)
+        ScorePatcher.patch_internal_method(token_address, "scaledBalanceOf",
+                                           lambda _user: user_borrow if scaled_borrow is None else scaled_borrow)
+
+    def _freeze_time(self, reserve_address: Address):
+        last_update_timestamp = self.lending_pool_core.getReserveData(reserve_address)["lastUpdateTimestamp"]
+        patcher = mock.patch.object(self.lending_pool_core, "now", return_value=last_update_timestamp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
@@ -0,0 +1,94 @@
+import os
+
+from iconservice import Address, AddressPrefix, IconScoreException
+from tbears.libs.scoretest.score_test_case import ScoreTestCase
+
+from lendingPoolDataProvider.lendingPoolDataProvider import LendingPoolDataProvider, LIQUIDATION_SCAN_LIMIT
+
+EXA = 10 ** 18
+
+
+def create_address(prefix: AddressPrefix = AddressPrefix.EOA) -> 'Address':
+    return Address.from_bytes(prefix.to_bytes(1, 'big') + os.urandom(20))
+
+
+class TestLendingPoolDataProvider(ScoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._owner = self.test_account1
+        self.mock_address_provider = Address.from_string(f"cx{'1230' * 10}")
+
+        self.score = self.get_score_instance(LendingPoolDataProvider, self._owner, on_install_params={
+            "_addressProvider": self.mock_address_provider
+        })
+
+        self.mock_core = Address.from_string(f"cx{'1231' * 10}")
+        self.mock_price_oracle = Address.from_string(f"cx{'1232' * 10}")
+        self.mock_fee_provider = Address.from_string(f"cx{'1233' * 10}")
+        self.mock_usds = Address.from_string(f"cx{'1234' * 10}")
+
+        self.set_msg(self.mock_address_provider)
+        self.score.setAddresses([
+            {"name": "lendingPoolCore", "address": self.mock_core},
+            {"name": "priceOracle", "address": self.mock_price_oracle},
+            {"name": "feeProvider", "address": self.mock_fee_provider}
+        ])
+        self.set_msg(self._owner)
+        self.score.setSymbol(self.mock_usds, "USDS")
+
+        self.user = create_address()
+
+    def _mock_borrow(self, _current_ltv: int):
+        self.patch_internal_method(self.mock_core, "getReserveData", lambda _reserve: {
+            "decimals": 18,
+            "availableBorrows": 1000 * EXA,
+            "availableLiquidity": 1000 * EXA,
+            "isActive": True,
+            "isFreezed": False,
+            "borrowingEnabled": True
+        })
+        self.patch_internal_method(self.mock_core, "getUserActiveReserves", lambda _user: [self.mock_usds])
+        self.patch_internal_method(self.mock_core, "getUserAccountSummary", lambda _user, _prices: {
+            "totalLiquidityBalanceUSD": 1000 * EXA,
+            "totalCollateralBalanceUSD": 1000 * EXA,
+            "totalBorrowBalanceUSD": 0,
+            "totalFeesUSD": 0,
+            "currentLtv": _current_ltv,
+            "currentLiquidationThreshold": 65 * EXA // 100
+        })
+        self.patch_internal_method(self.mock_price_oracle, "get_reference_data_bulk",
+                                   lambda _bases, _quote: {"USDS": EXA})
+        self.patch_internal_method(self.mock_fee_provider, "calculateOriginationFee",
+                                   lambda _amount: _amount // 1000)
+
+    def test_validate_borrow(self):
+        self._mock_borrow(50 * EXA // 100)
+
+        result = self.score.validateBorrow(self.mock_usds, self.user, 100 * EXA)
+
+        self.assertEqual("", result["error"])
+        self.assertEqual(200 * EXA, result["collateralNeededUSD"])
+        self.assertEqual(100 * EXA // 1000, result["borrowFee"])
+
+    def test_validate_borrow_zero_ltv(self):
+        """
+        collateral with no loan to value should not back a borrow, even though the health factor is -1
+        """
+        self._mock_borrow(0)
+
+        result = self.score.validateBorrow(self.mock_usds, self.user, 100 * EXA)
+
+        self.assertEqual("Borrow error:Insufficient collateral to cover new borrow", result["error"])
+
+    def test_liquidation_scan_invalid_limit(self):
+        """
+        a page without a positive limit would hand keepers the same offset back forever
+        """
+        for _limit in (0, -1, LIQUIDATION_SCAN_LIMIT + 1):
+            try:
+                self.score.getLiquidationScan(0, _limit)
+            except IconScoreException as err:
+                self.assertIn("Invalid liquidation scan page", str(err))
+            else:
+                raise IconScoreException(f"Liquidation scan with the limit {_limit}")
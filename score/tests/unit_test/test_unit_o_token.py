@@ -0,0 +1,129 @@
+import os
+
+from iconservice import Address, AddressPrefix, IconScoreException
+from tbears.libs.scoretest.score_test_case import ScoreTestCase
+
+from oToken.oToken import OToken
+
+EXA = 10 ** 18
+
+
+def create_address(prefix: AddressPrefix = AddressPrefix.EOA) -> 'Address':
+    return Address.from_bytes(prefix.to_bytes(1, 'big') + os.urandom(20))
+
+
+class TestOToken(ScoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._owner = self.test_account1
+        self.mock_address_provider = Address.from_string(f"cx{'1230' * 10}")
+
+        self.score = self.get_score_instance(OToken, self._owner, on_install_params={
+            "_addressProvider": self.mock_address_provider,
+            "_name": "Omm USDS",
+            "_symbol": "oUSDS"
+        })
+
+        self.mock_core = Address.from_string(f"cx{'1231' * 10}")
+        self.mock_lending_pool = Address.from_string(f"cx{'1232' * 10}")
+        self.mock_rewards = Address.from_string(f"cx{'1233' * 10}")
+        self.mock_reserve = Address.from_string(f"cx{'1234' * 10}")
+        self.mock_data_provider = Address.from_string(f"cx{'1235' * 10}")
+
+        self.set_msg(self.mock_address_provider)
+        self.score.setAddresses([
+            {"name": "lendingPoolCore", "address": self.mock_core},
+            {"name": "lendingPool", "address": self.mock_lending_pool},
+            {"name": "rewards", "address": self.mock_rewards},
+            {"name": "reserve", "address": self.mock_reserve},
+            {"name": "lendingPoolDataProvider", "address": self.mock_data_provider}
+        ])
+
+        self.user = create_address()
+        self.patch_internal_method(self.mock_core, "updateUserReserveParticipation",
+                                   lambda _reserve, _user, _hasBalance: None)
+        self.patch_internal_method(self.mock_rewards, "handleAction", lambda _userDetails: None)
+        self.patch_internal_method(self.mock_rewards, "handleActions", lambda _userDetails: None)
+        self.patch_internal_method(self.mock_lending_pool, "refreshActiveWallets", lambda _users: None)
+        self.patch_internal_method(self.mock_data_provider, "balanceDecreaseAllowed",
+                                   lambda _reserve, _user, _amount: True)
+
+    def _mock_index(self, _index: int):
+        self.patch_internal_method(self.mock_core, "getNormalizedIncome", lambda _reserve: _index)
+        self.patch_internal_method(self.mock_core, "getReserveLiquidityCumulativeIndex", lambda _reserve: _index)
+
+    def test_mint_on_deposit(self):
+        self._mock_index(2 * EXA)
+        self.set_msg(self.mock_lending_pool)
+        self.score.mintOnDeposit(self.user, 100 * EXA)
+
+        # the reward distribution sees scaled balances, the reserve sees the underlying balance
+        self.assertEqual(50 * EXA, self.score.scaledBalanceOf(self.user))
+        self.assertEqual(100 * EXA, self.score.principalBalanceOf(self.user))
+        self.assertEqual(100 * EXA, self.score.balanceOf(self.user))
+        self.assertEqual(50 * EXA, self.score.getPrincipalSupply(self.user)['principalUserBalance'])
+        self.assertEqual(50 * EXA, self.score.getTotalStaked()['totalStaked'])
+
+    def test_mint_on_deposit_too_small(self):
+        """
+        an amount scaled down to zero would emit a mint without crediting the user
+        """
+        self._mock_index(3 * EXA)
+        self.set_msg(self.mock_lending_pool)
+        try:
+            self.score.mintOnDeposit(self.user, 1)
+        except IconScoreException as err:
+            self.assertIn("is too small to be minted", str(err))
+        else:
+            raise IconScoreException("Zero scaled mint accepted", 900)
+
+    def test_transfer_refreshes_active_wallets(self):
+        """
+        the lending pool lists the depositors, so a transfer opening or closing a position has to reach it
+        """
+        self._mock_index(EXA)
+        receiver = create_address()
+        self.set_msg(self.mock_lending_pool)
+        self.score.mintOnDeposit(self.user, 100 * EXA)
+
+        self.set_msg(self.user)
+        self.score.transfer(receiver, 100 * EXA)
+        self.assert_internal_call(self.mock_lending_pool, "refreshActiveWallets", [self.user, receiver])
+        self.assertEqual(0, self.score.scaledBalanceOf(self.user))
+        self.assertEqual(100 * EXA, self.score.scaledBalanceOf(receiver))
+
+    def test_migrate_scaled_balances(self):
+        self._mock_index(4 * EXA)
+        self.set_msg(self._owner)
+        # a principal balance recorded before scaled balances, at the user index of its last update
+        self.score._balances[self.user] = 100 * EXA
+        self.score._userIndexes[self.user] = 2 * EXA
+        self.score._totalSupply.set(100 * EXA)
+        self.score._legacyTotalSupply.set(100 * EXA)
+
+        self.assertEqual(50 * EXA, self.score.scaledBalanceOf(self.user))
+        self.assertEqual(100 * EXA, self.score.principalBalanceOf(self.user))
+        self.assertEqual(200 * EXA, self.score.balanceOf(self.user))
+
+        self.set_msg(self.user)
+        try:
+            self.score.migrateScaledBalances([self.user])
+        except IconScoreException as err:
+            self.assertIn("SenderNotScoreOwnerError", str(err))
+        else:
+            raise IconScoreException("Unauthorized method call", 900)
+
+        self.set_msg(self._owner)
+        self.score.migrateScaledBalances([self.user])
+        self.assert_internal_call(self.mock_rewards, "handleActions", [{
+            "_user": self.user,
+            "_userBalance": 50 * EXA,
+            "_totalSupply": 100 * EXA,
+            "_decimals": 18
+        }])
+        self.assertEqual(0, self.score.getLegacyTotalSupply())
+        self.assertEqual(50 * EXA, self.score.principalTotalSupply())
+        self.assertEqual(50 * EXA, self.score.scaledBalanceOf(self.user))
+        self.assertEqual(200 * EXA, self.score.balanceOf(self.user))
+        self.assertEqual(EXA, self.score.getUserLiquidityCumulativeIndex(self.user))
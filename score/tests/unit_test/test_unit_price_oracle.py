@@ -19,12 +19,14 @@ class TestPriceOracle(ScoreTestCase):
 
         self.mock_band_oracle = Address.from_string(f"cx{'1232' * 10}")
         self.mock_dex = Address.from_string(f"cx{'1235' * 10}")
+        self.mock_staking = Address.from_string(f"cx{'1236' * 10}")
 
         self.set_msg(self.mock_address_provider)
 
         self.score.setAddresses([
             {"name": "bandOracle", "address": self.mock_band_oracle},
-            {"name": "dex", "address": self.mock_dex}
+            {"name": "dex", "address": self.mock_dex},
+            {"name": "staking", "address": self.mock_staking}
         ])
 
     def test_get_reference_data_for_omm(self):
@@ -80,6 +82,30 @@ class TestPriceOracle(ScoreTestCase):
         #ICX 2.9*1.2*0.9
         self.assertAlmostEqual((1.5 * 13 + 1.53 * 11 + 2.052 * 23) / (13 + 11 + 23), actual_result / EXA, 10)
 
+    def test_get_reference_data_bulk(self):
+        self.register_interface_score(self.mock_band_oracle)
+        self.register_interface_score(self.mock_staking)
+
+        def _bulk_side_effect(_bases, _quotes):
+            rates = {"ICX": 9 * EXA // 10, "USDC": 1 * EXA}
+            return [{"rate": rates[_base]} for _base in _bases]
+
+        ScorePatcher.patch_internal_method(self.mock_band_oracle, "get_reference_data_bulk", _bulk_side_effect)
+        ScorePatcher.patch_internal_method(self.mock_staking, "getTodayRate", lambda: 12 * EXA // 10)
+
+        actual_result = self.score.get_reference_data_bulk(["sICX", "USDS", "ICX", "USDC", "sICX"], "USD")
+
+        self.assertDictEqual({
+            "sICX": 108 * EXA // 100,
+            "USDS": 1 * EXA,
+            "ICX": 9 * EXA // 10,
+            "USDC": 1 * EXA
+        }, actual_result)
+        _mock_band_oracle = get_interface_score(self.mock_band_oracle)
+        self.assertEqual(1, _mock_band_oracle.get_reference_data_bulk.call_count)
+        _mock_band_oracle.get_reference_data_bulk.assert_called_with(["ICX", "USDC"], ["USD", "USD"])
+        self.assertEqual(1, get_interface_score(self.mock_staking).getTodayRate.call_count)
+
     def _mock_lookupPid(self):
         def _lookupPid_side_effect(_name):
             if _name == 'OMM/USDS':
@@ -8,7 +8,7 @@ from tbears.libs.scoretest.score_test_case import ScoreTestCase
 from typing_extensions import TypedDict
 
 from rewardDistribution.utils.math import exaDiv, exaMul
-from rewardDistribution.rewardDistributionController import RewardDistributionController
+from rewardDistribution.rewardDistributionController import RewardDistributionController, REWARDS_BATCH_LIMIT
 
 EXA = 10 ** 18
 TIME = 10 ** 6
@@ -115,6 +115,15 @@ class TestRewardDistributionController(ScoreTestCase):
         self.score.enableRewardClaim()
         self.set_msg(self._owner)
 
+    def _asset_index(self, _asset: Address) -> int:
+        return self.score._getAssetState(_asset)[0]
+
+    def _user_index(self, _user: Address, _asset: Address) -> int:
+        return self.score._getUserAssetState(_user, _asset)[0]
+
+    def _unclaimed_rewards(self, _user: Address, _asset: Address) -> int:
+        return self.score._getUserAssetState(_user, _asset)[1]
+
     def test_token_dist_per_day(self):
         """
         Inflation should rise by 3% every year
@@ -205,19 +214,23 @@ class TestRewardDistributionController(ScoreTestCase):
         # time elapsed 31 day
         _mock_time_elapsed = 60 * 60 * 24 * 31 * TIME
 
+        # the distribution drops after the 30th day
+        _tier_end = 60 * 60 * 24 * 30 * TIME
+        _next_emission_per_second = exaMul(4 * 10 ** 23 // 86400, 10 * 11 * EXA // 10000)
+
         with mock.patch.object(self.score, "now", return_value=_mock_time_elapsed):
             self._setup_asset_emission(self.mock_governance, REWARD_CONFIG_1)
             _new_asset_index = exaDiv(
-                _emissionPerSecond * (_mock_time_elapsed - _lastUpdateTimestamp) // TIME,
+                _emissionPerSecond * (_tier_end - _lastUpdateTimestamp) // TIME +
+                _next_emission_per_second * (_mock_time_elapsed - _tier_end) // TIME,
                 REWARD_CONFIG_1["totalSupply"]['totalStaked']) + 0
 
-            self.assertEqual(_new_asset_index, self.score._assetIndex[ASSET_ADDRESS_1])
+            self.assertEqual(_new_asset_index, self._asset_index(ASSET_ADDRESS_1))
 
             self.score.AssetIndexUpdated.assert_called_with(ASSET_ADDRESS_1,0, _new_asset_index)
 
             # emission after 31st day
-            _emissionPerSecond = exaMul(4 * 10 ** 23 // 86400, 10 * 11 * EXA // 10000)
-            self.score.AssetConfigUpdated.assert_called_with(ASSET_ADDRESS_1, _emissionPerSecond)
+            self.score.AssetConfigUpdated.assert_called_with(ASSET_ADDRESS_1, _next_emission_per_second)
 
     def test_handle_action_case(self):
         """
@@ -256,9 +269,9 @@ class TestRewardDistributionController(ScoreTestCase):
         ## time_elapse=>100
         _mock_time_elapsed = 100 * TIME
 
-        self.assertEqual(0, self.score._userIndex[_user1][ASSET_ADDRESS_1])
-        self.assertEqual(0, self.score._userIndex[_user2][ASSET_ADDRESS_1])
-        self.assertEqual(0, self.score._assetIndex[ASSET_ADDRESS_1])
+        self.assertEqual(0, self._user_index(_user1, ASSET_ADDRESS_1))
+        self.assertEqual(0, self._user_index(_user2, ASSET_ADDRESS_1))
+        self.assertEqual(0, self._asset_index(ASSET_ADDRESS_1))
 
         _user = {
             "address": _user1,
@@ -279,9 +292,9 @@ class TestRewardDistributionController(ScoreTestCase):
         _user1_balance += 5
         _total_supply += _user1_balance
 
-        self.assertEqual(0, self.score._userIndex[_user1][ASSET_ADDRESS_1])
-        self.assertEqual(0, self.score._userIndex[_user2][ASSET_ADDRESS_1])
-        self.assertEqual(0, self.score._assetIndex[ASSET_ADDRESS_1])
+        self.assertEqual(0, self._user_index(_user1, ASSET_ADDRESS_1))
+        self.assertEqual(0, self._user_index(_user2, ASSET_ADDRESS_1))
+        self.assertEqual(0, self._asset_index(ASSET_ADDRESS_1))
 
         _last_updated_timestamp = _mock_time_elapsed  ##100
         ## first deposit by user2
@@ -308,9 +321,9 @@ class TestRewardDistributionController(ScoreTestCase):
         _user2_balance += 10
         _total_supply += _user2_balance
 
-        self.assertEqual(0, self.score._userIndex[_user1][ASSET_ADDRESS_1])
-        self.assertAlmostEqual(20.83333333333, self.score._userIndex[_user2][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(20.83333333333, self.score._assetIndex[ASSET_ADDRESS_1] / EXA, 9)
+        self.assertEqual(0, self._user_index(_user1, ASSET_ADDRESS_1))
+        self.assertAlmostEqual(20.83333333333, self._user_index(_user2, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(20.83333333333, self._asset_index(ASSET_ADDRESS_1) / EXA, 9)
 
         _last_updated_timestamp = _mock_time_elapsed  ##700
 
@@ -340,10 +353,10 @@ class TestRewardDistributionController(ScoreTestCase):
         _total_supply += _user1_balance
 
         self.assertAlmostEqual(138.88888888889,
-                               self.score._usersUnclaimedRewards[_user1][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(27.77777777778, self.score._userIndex[_user1][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(20.83333333333, self.score._userIndex[_user2][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(27.77777777778, self.score._assetIndex[ASSET_ADDRESS_1] / EXA, 9)
+                               self._unclaimed_rewards(_user1, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(27.77777777778, self._user_index(_user1, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(20.83333333333, self._user_index(_user2, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(27.77777777778, self._asset_index(ASSET_ADDRESS_1) / EXA, 9)
 
         _last_updated_timestamp = _mock_time_elapsed  ##1300
 
@@ -372,12 +385,12 @@ class TestRewardDistributionController(ScoreTestCase):
         _user2_balance += 20
         _total_supply += _user2_balance
 
-        self.assertAlmostEqual(138.88888888889, self.score._usersUnclaimedRewards[_user1][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(69.44444444444, self.score._usersUnclaimedRewards[_user2][ASSET_ADDRESS_1] / EXA, 9)
+        self.assertAlmostEqual(138.88888888889, self._unclaimed_rewards(_user1, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(69.44444444444, self._unclaimed_rewards(_user2, ASSET_ADDRESS_1) / EXA, 9)
 
-        self.assertAlmostEqual(27.77777777778, self.score._userIndex[_user1][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(27.77777777778, self.score._userIndex[_user2][ASSET_ADDRESS_1] / EXA, 9)
-        self.assertAlmostEqual(27.77777777778, self.score._assetIndex[ASSET_ADDRESS_1] / EXA, 9)
+        self.assertAlmostEqual(27.77777777778, self._user_index(_user1, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(27.77777777778, self._user_index(_user2, ASSET_ADDRESS_1) / EXA, 9)
+        self.assertAlmostEqual(27.77777777778, self._asset_index(ASSET_ADDRESS_1) / EXA, 9)
 
         _last_updated_timestamp = _mock_time_elapsed  ##700
 
@@ -395,8 +408,7 @@ class TestRewardDistributionController(ScoreTestCase):
         _emission_per_second = exaMul(10 ** 24 // 86400, _percentage)
         with mock.patch.object(self.score, "now", return_value=_mock_time_elapsed):
             self.set_msg(_asset_address, 1)
-            _user_old_index = self.score._userIndex[_user_address][_asset_address]
-            _user_old_reward = self.score._usersUnclaimedRewards[_user_address]
+            _user_old_index = self._user_index(_user_address, _asset_address)
             self.score.handleAction({
                 "_user": _user_address,
                 "_userBalance": _user_balance,
@@ -419,6 +431,75 @@ class TestRewardDistributionController(ScoreTestCase):
 
             return _current_index
 
+    def test_handle_actions(self):
+        """
+        handleActions should update the asset index once and settle every user against it,
+        using the total supply before the operation
+        """
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+        with mock.patch.object(self.score, "now", return_value=0):
+            self._setup_asset_emission(self.mock_governance, REWARD_CONFIG_1)
+        _from = self.test_account3
+        _to = self.test_account4
+        self._handle_action(_from, ASSET_ADDRESS_1, 100 * TIME)
+
+        self.score.AssetIndexUpdated.reset_mock()
+        with mock.patch.object(self.score, "now", return_value=700 * TIME):
+            self.set_msg(ASSET_ADDRESS_1, 1)
+            self.score.handleActions([
+                {"_user": _from, "_userBalance": 100 * EXA, "_totalSupply": 400 * EXA, "_decimals": 18},
+                {"_user": _to, "_userBalance": 300 * EXA, "_totalSupply": 400 * EXA, "_decimals": 18},
+            ])
+
+        _emission_per_second = exaMul(10 ** 24 // 86400, 10 * 11 * EXA // 10000)
+        _asset_index = exaDiv(_emission_per_second * 600, 400 * EXA)
+        self.score.AssetIndexUpdated.assert_called_once_with(ASSET_ADDRESS_1, 0, _asset_index)
+        self.assertEqual(_asset_index, self._asset_index(ASSET_ADDRESS_1))
+        self.assertEqual(_asset_index, self._user_index(_from, ASSET_ADDRESS_1))
+        self.assertEqual(_asset_index, self._user_index(_to, ASSET_ADDRESS_1))
+        self.assertEqual(exaMul(100 * EXA, _asset_index), self._unclaimed_rewards(_from, ASSET_ADDRESS_1))
+        self.assertEqual(exaMul(300 * EXA, _asset_index), self._unclaimed_rewards(_to, ASSET_ADDRESS_1))
+        self.score.RewardsAccrued.assert_has_calls([
+            call(_from, ASSET_ADDRESS_1, exaMul(100 * EXA, _asset_index)),
+            call(_to, ASSET_ADDRESS_1, exaMul(300 * EXA, _asset_index)),
+        ])
+
+    def test_legacy_state_migration(self):
+        """
+        on_update should pack the legacy asset state, and the legacy user state should be packed on the next action
+        """
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+        with mock.patch.object(self.score, "now", return_value=0):
+            self._setup_asset_emission(self.mock_governance, REWARD_CONFIG_1)
+        _percentage = self.score._getAssetState(ASSET_ADDRESS_1)[2]
+        _user = self.test_account3
+
+        self.score._assetState.remove(ASSET_ADDRESS_1)
+        self.score._assetIndex[ASSET_ADDRESS_1] = 3 * EXA
+        self.score._lastUpdateTimestamp[ASSET_ADDRESS_1] = 100
+        self.score._userIndex[_user][ASSET_ADDRESS_1] = 2 * EXA
+        self.score._usersUnclaimedRewards[_user][ASSET_ADDRESS_1] = 7 * EXA
+
+        self.score.on_update()
+
+        self.assertEqual((3 * EXA, 100, _percentage), self.score._getAssetState(ASSET_ADDRESS_1))
+        self.assertEqual(0, self.score._assetIndex[ASSET_ADDRESS_1])
+        self.assertEqual(0, self.score._lastUpdateTimestamp[ASSET_ADDRESS_1])
+        self.assertEqual((2 * EXA, 7 * EXA, True), self.score._getUserAssetState(_user, ASSET_ADDRESS_1))
+
+        with mock.patch.object(self.score, "now", return_value=100 * TIME):
+            self.set_msg(ASSET_ADDRESS_1, 1)
+            self.score.handleAction({
+                "_user": _user,
+                "_userBalance": 5 * EXA,
+                "_totalSupply": 10 * EXA,
+                "_decimals": 18,
+            })
+
+        self.assertEqual((3 * EXA, 12 * EXA, False), self.score._getUserAssetState(_user, ASSET_ADDRESS_1))
+        self.assertEqual(0, self.score._userIndex[_user][ASSET_ADDRESS_1])
+        self.assertEqual(0, self.score._usersUnclaimedRewards[_user][ASSET_ADDRESS_1])
+
     def test_get_rewards_balance_0(self):
         """
         Should return 0 as reward balance if asset emission is not configureAssetEmission
@@ -644,7 +725,7 @@ class TestRewardDistributionController(ScoreTestCase):
         _current_index = self._call_handle_action(_user, _asset, _time, _current_index)
 
         self.assertAlmostEqual(70.02314814815,
-                               self.score._usersUnclaimedRewards[self.test_account2][ASSET_ADDRESS_1] / EXA, 9)
+                               self._unclaimed_rewards(self.test_account2, ASSET_ADDRESS_1) / EXA, 9)
 
         _user1_balance -= 50
         _total_supply -= 50
@@ -675,6 +756,48 @@ class TestRewardDistributionController(ScoreTestCase):
         self.assertAlmostEqual(115.85648148148, actual_result["reserve"]["assetName_1"] / EXA, 9)
         self.assertAlmostEqual(115.85648148148, actual_result["total"] / EXA, 9)
 
+    def test_get_rewards_batch(self):
+        """
+        getRewardsBatch should return the getRewards result of every user, reading the balances once per asset
+        """
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+        with mock.patch.object(self.score, "now", return_value=0):
+            self._setup_asset_emission(self.mock_governance, REWARD_CONFIG_1)
+
+        _users = [self.test_account3, self.test_account4]
+        _balances = {str(_users[0]): 100 * EXA, str(_users[1]): 300 * EXA}
+        _total_supply = 400 * EXA
+        for _user in _users:
+            with mock.patch.object(self.score, "now", return_value=100 * TIME):
+                self.set_msg(ASSET_ADDRESS_1, 1)
+                self.score.handleAction({
+                    "_user": _user,
+                    "_userBalance": 0,
+                    "_totalSupply": 0,
+                    "_decimals": 18,
+                })
+
+        self.patch_internal_method(ASSET_ADDRESS_1, "getPrincipalSupplies", lambda _users: {
+            "decimals": 18,
+            "principalUserBalances": {str(_user): _balances[str(_user)] for _user in _users},
+            "principalTotalSupply": _total_supply
+        })
+        with mock.patch.object(self.score, "now", return_value=700 * TIME):
+            actual_result = self.score.getRewardsBatch(_users)
+            self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupplies", _users)
+
+        for _user in _users:
+            _supply = {
+                "decimals": 18,
+                'principalUserBalance': _balances[str(_user)],
+                'principalTotalSupply': _total_supply
+            }
+            self.patch_internal_method(ASSET_ADDRESS_1, "getPrincipalSupply", lambda _address: _supply)
+            expected_result = self._call_get_rewards_balance(_user, 700 * TIME, _supply)
+            self.assertEqual(expected_result, actual_result[str(_user)])
+        self.assertAlmostEqual(3 * actual_result[str(_users[0])]["total"], actual_result[str(_users[1])]["total"],
+                               delta=3)
+
     def _call_get_rewards_balance(self, _user, _mock_time_elapsed, _supply):
         with mock.patch.object(self.score, "now", return_value=_mock_time_elapsed):
             actual_result = self.score.getRewards(_user)
@@ -753,8 +876,8 @@ class TestRewardDistributionController(ScoreTestCase):
             self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupply", _user1)
             self.assert_internal_call(self.mock_omm_token, "transfer", _user1, ANY)
 
-        self.assertEqual(0, self.score._usersUnclaimedRewards[_user1][ASSET_ADDRESS_1])
-        self.assertEqual(self.score._userIndex[_user1][ASSET_ADDRESS_1], self.score._assetIndex[ASSET_ADDRESS_1])
+        self.assertEqual(0, self._unclaimed_rewards(_user1, ASSET_ADDRESS_1))
+        self.assertEqual(self._user_index(_user1, ASSET_ADDRESS_1), self._asset_index(ASSET_ADDRESS_1))
 
         _mock_time_elapsed = 999 * TIME
 
@@ -766,9 +889,9 @@ class TestRewardDistributionController(ScoreTestCase):
             self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupply", _user1)
             self.assert_internal_call(self.mock_omm_token, "transfer", _user1, ANY)
 
-        self.assertEqual(0, self.score._usersUnclaimedRewards[_user1][ASSET_ADDRESS_1])
-        self.assertEqual(self.score._userIndex[_user1][ASSET_ADDRESS_1], self.score._assetIndex[ASSET_ADDRESS_1])
-        self.assertAlmostEqual(1.14456018519, self.score._assetIndex[ASSET_ADDRESS_1] / EXA, 9)
+        self.assertEqual(0, self._unclaimed_rewards(_user1, ASSET_ADDRESS_1))
+        self.assertEqual(self._user_index(_user1, ASSET_ADDRESS_1), self._asset_index(ASSET_ADDRESS_1))
+        self.assertAlmostEqual(1.14456018519, self._asset_index(ASSET_ADDRESS_1) / EXA, 9)
 
         _mock_time_elapsed = 1354 * TIME
 
@@ -776,6 +899,116 @@ class TestRewardDistributionController(ScoreTestCase):
         self.assertAlmostEqual(45.19675925926, actual_result["reserve"]["assetName_1"] / EXA, 9)
         self.assertAlmostEqual(45.19675925926, actual_result["total"] / EXA, 9)
 
+    def _setup_two_assets(self):
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+        _config_2 = dict(REWARD_CONFIG_2, poolID=-1, rewardEntity='lendingBorrow')
+        with mock.patch.object(self.score, "now", return_value=0):
+            self._setup_asset_emission(self.mock_governance, REWARD_CONFIG_1)
+            self._setup_asset_emission(self.mock_governance, _config_2)
+
+    def _patch_principal_supplies(self, _balances: dict):
+        for _asset in (ASSET_ADDRESS_1, ASSET_ADDRESS_2):
+            _supply = {
+                "decimals": 18,
+                'principalUserBalance': _balances[_asset],
+                'principalTotalSupply': 100 * EXA
+            }
+            self.patch_internal_method(_asset, "getPrincipalSupply", lambda _address, _supply=_supply: _supply)
+
+    def _handle_action(self, _user: Address, _asset: Address, _time: int):
+        with mock.patch.object(self.score, "now", return_value=_time):
+            self.set_msg(_asset, 1)
+            self.score.handleAction({
+                "_user": _user,
+                "_userBalance": 0,
+                "_totalSupply": 0,
+                "_decimals": 18,
+            })
+
+    def _claim(self, _user: Address, _time: int):
+        with mock.patch.object(self.score, "now", return_value=_time):
+            self.set_msg(self.mock_lending_pool, 1)
+            self.score.claimRewards(_user)
+
+    def test_claim_rewards_legacy_user_sweeps_every_asset(self):
+        """
+        the first claim of a user without an asset set checks every asset and builds the set
+        """
+        self._setup_two_assets()
+        _user = self.test_account3
+        self._patch_principal_supplies({ASSET_ADDRESS_1: 50 * EXA, ASSET_ADDRESS_2: 0})
+        self.assertFalse(self.score._userAssetsIndexed[_user])
+
+        self._claim(_user, 500 * TIME)
+
+        self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupply", _user)
+        self.assert_internal_call(ASSET_ADDRESS_2, "getPrincipalSupply", _user)
+        self.assertTrue(self.score._userAssetsIndexed[_user])
+        self.assertEqual([ASSET_ADDRESS_1], self.score.getUserAssets(_user))
+
+    def test_claim_rewards_user_assets(self):
+        """
+        a claim drops the assets without balance from the user asset set,
+        later claims only visit the set and a new action adds the asset back
+        """
+        self._setup_two_assets()
+        _user = self.test_account3
+        self._handle_action(_user, ASSET_ADDRESS_1, 100 * TIME)
+        self._handle_action(_user, ASSET_ADDRESS_2, 100 * TIME)
+        self.assertEqual({ASSET_ADDRESS_1, ASSET_ADDRESS_2}, set(self.score._userAssets(_user).range(0, 2)))
+
+        self._patch_principal_supplies({ASSET_ADDRESS_1: 0, ASSET_ADDRESS_2: 50 * EXA})
+        self._claim(_user, 500 * TIME)
+        self.assertEqual([ASSET_ADDRESS_2], self.score.getUserAssets(_user))
+
+        get_interface_score(ASSET_ADDRESS_1).getPrincipalSupply.reset_mock()
+        get_interface_score(ASSET_ADDRESS_2).getPrincipalSupply.reset_mock()
+        self._claim(_user, 600 * TIME)
+        get_interface_score(ASSET_ADDRESS_1).getPrincipalSupply.assert_not_called()
+        self.assert_internal_call(ASSET_ADDRESS_2, "getPrincipalSupply", _user)
+
+        self._handle_action(_user, ASSET_ADDRESS_1, 700 * TIME)
+        self.assertEqual({ASSET_ADDRESS_1, ASSET_ADDRESS_2}, set(self.score.getUserAssets(_user)))
+
+        self._claim(_user, 800 * TIME)
+        self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupply", _user)
+
+    def test_get_rewards_batch_user_assets(self):
+        """
+        getRewardsBatch should read every user over the assets getRewards reads, and cap the number of users
+        """
+        self._setup_two_assets()
+        _indexed_user = self.test_account3
+        _legacy_user = self.test_account4
+        self._handle_action(_indexed_user, ASSET_ADDRESS_2, 100 * TIME)
+        self._patch_principal_supplies({ASSET_ADDRESS_1: 0, ASSET_ADDRESS_2: 50 * EXA})
+        self._claim(_indexed_user, 500 * TIME)
+        self.assertEqual([ASSET_ADDRESS_2], self.score.getUserAssets(_indexed_user))
+
+        _balances = {
+            ASSET_ADDRESS_1: {str(_legacy_user): 30 * EXA},
+            ASSET_ADDRESS_2: {str(_indexed_user): 50 * EXA, str(_legacy_user): 20 * EXA}
+        }
+        for _asset in (ASSET_ADDRESS_1, ASSET_ADDRESS_2):
+            self.patch_internal_method(_asset, "getPrincipalSupplies", lambda _users, _asset=_asset: {
+                "decimals": 18,
+                "principalUserBalances": {str(_user): _balances[_asset][str(_user)] for _user in _users},
+                "principalTotalSupply": 100 * EXA
+            })
+        with mock.patch.object(self.score, "now", return_value=600 * TIME):
+            actual_result = self.score.getRewardsBatch([_indexed_user, _legacy_user])
+            self.assert_internal_call(ASSET_ADDRESS_1, "getPrincipalSupplies", [_legacy_user])
+            self.assert_internal_call(ASSET_ADDRESS_2, "getPrincipalSupplies", [_indexed_user, _legacy_user])
+            self.assertEqual(self.score.getRewards(_indexed_user), actual_result[str(_indexed_user)])
+
+        _users = [create_address() for _ in range(REWARDS_BATCH_LIMIT + 1)]
+        try:
+            self.score.getRewardsBatch(_users)
+        except IconScoreException as err:
+            self.assertIn(f"Rewards batch takes up to {REWARDS_BATCH_LIMIT} users", str(err))
+        else:
+            raise IconScoreException("Rewards batch above the limit", 900)
+
     def test_initial_distribute(self):
 
         self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
@@ -818,6 +1051,80 @@ class TestRewardDistributionController(ScoreTestCase):
 
             self.assertEqual(1, self.score._day.get())
 
+    def test_paged_distribute(self):
+        """
+        distribute should pay the worker wallets in batches and finish the day on the last batch
+        """
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+
+        self.register_interface_score(self.mock_worker_token)
+        self.register_interface_score(self.mock_omm_token)
+
+        self.score._day.set(0)
+        with mock.patch.object(self.score, "getDay", return_value=0):
+            self.set_msg(self._owner)
+            self.score.startDistribution()
+
+        with mock.patch.object(self.score, "getDay", return_value=1), \
+                mock.patch("rewardDistribution.rewardDistributionController.WORKER_DISTRIBUTION_BATCH_SIZE", 3):
+            _wallets = self._mock_worker_token_score()
+            mock_omm_token_score = get_interface_score(self.mock_omm_token)
+
+            self.score.distribute()
+            self.assertEqual(0, self.score._day.get())
+            self.assertEqual(3, self.score.getWorkerDistributionCursor())
+            self.assertEqual(40 * EXA, self.score._workerDistSupply.get())
+            mock_omm_token_score.transfer.assert_called_with(_wallets[2], ANY)
+
+            self.score.distribute()
+            self.assertEqual(1, self.score._day.get())
+            self.assertEqual(0, self.score.getWorkerDistributionCursor())
+            self.assertEqual(4, len([_call for _call in self.score.Distribution.call_args_list
+                                     if _call[0][0] == "worker"]))
+            _calls = [
+                call(_wallets[3], ANY),
+                call(self.mock_dao_fund, ANY),
+            ]
+            mock_omm_token_score.transfer.assert_has_calls(_calls)
+
+    def test_paged_distribute_balance_moved_between_batches(self):
+        """
+        distribute should never pay out more than the worker tokens of the day,
+        even if balances move to unpaid wallets between batches
+        """
+        self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
+
+        self.register_interface_score(self.mock_worker_token)
+        self.register_interface_score(self.mock_omm_token)
+
+        self.score._day.set(0)
+        with mock.patch.object(self.score, "getDay", return_value=0):
+            self.set_msg(self._owner)
+            self.score.startDistribution()
+        _worker_tokens = self.score._tokenDistTracker['worker']
+
+        with mock.patch.object(self.score, "getDay", return_value=1), \
+                mock.patch("rewardDistribution.rewardDistributionController.WORKER_DISTRIBUTION_BATCH_SIZE", 3):
+            _wallets = self._mock_worker_token_score()
+            mock_omm_token_score = get_interface_score(self.mock_omm_token)
+
+            self.score.distribute()
+            self.assertEqual(3, self.score.getWorkerDistributionCursor())
+
+            # a paid wallet moves its whole balance to the unpaid one
+            ScorePatcher.patch_internal_method(self.mock_worker_token, "getWalletBalances",
+                                               lambda _start, _count: [
+                                                   {"address": _wallets[3], "balance": 70 * EXA}
+                                               ][_start - 3:_start - 3 + _count])
+            self.score.distribute()
+            self.assertEqual(1, self.score._day.get())
+            self.assertEqual(0, self.score.getWorkerDistributionCursor())
+
+            _worker_paid = sum(_call[0][2] for _call in self.score.Distribution.call_args_list
+                               if _call[0][0] == "worker")
+            self.assertEqual(_worker_tokens, _worker_paid)
+            mock_omm_token_score.transfer.assert_any_call(_wallets[3], ANY)
+
     def test_all_dist_percentage(self):
         self._setup_distribution_percentage(self._owner, DISTRIBUTION_CONFIG)
         _mock_time_elapsed = 0
@@ -984,4 +1291,9 @@ class TestRewardDistributionController(ScoreTestCase):
         ScorePatcher.patch_internal_method(self.mock_worker_token, "totalSupply", lambda: 100 * EXA)
         ScorePatcher.patch_internal_method(self.mock_worker_token, "balanceOf", side_effect)
         ScorePatcher.patch_internal_method(self.mock_worker_token, "getWallets", lambda: _wallets)
+        ScorePatcher.patch_internal_method(self.mock_worker_token, "getWalletBalances",
+                                           lambda _start, _count: [
+                                               {"address": wallet, "balance": side_effect(wallet)}
+                                               for wallet in _wallets[_start:_start + _count]
+                                           ])
         return _wallets
@@ -0,0 +1,60 @@
+import os
+
+from iconservice import Address, IconScoreException, AddressPrefix
+from tbears.libs.scoretest.score_test_case import ScoreTestCase
+
+from workerToken.workerToken import WorkerToken
+
+EXA = 10 ** 18
+
+
+def create_address(prefix: AddressPrefix = AddressPrefix.EOA) -> 'Address':
+    return Address.from_bytes(prefix.to_bytes(1, 'big') + os.urandom(20))
+
+
+class TestWorkerToken(ScoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self._owner = self.test_account1
+        self.score = self.get_score_instance(WorkerToken, self._owner, on_install_params={
+            "_initialSupply": 100,
+            "_decimals": 18
+        })
+        self.mock_rewards = Address.from_string(f"cx{'1232' * 10}")
+
+        self.test_account3 = create_address()
+        self.test_account4 = create_address()
+        account_info = {self.test_account3: 10 ** 21,
+                        self.test_account4: 10 ** 21}
+        ScoreTestCase.initialize_accounts(account_info)
+
+    def test_set_rewards_not_owner(self):
+        self.set_msg(self.test_account2)
+        try:
+            self.score.setRewards(self.mock_rewards)
+        except IconScoreException as err:
+            self.assertIn("SenderNotScoreOwnerError", str(err))
+        else:
+            raise IconScoreException("Unauthorized method call")
+
+    def test_transfer_during_worker_distribution(self):
+        """
+        transfers should be rejected while the reward distribution is paging through the wallets
+        """
+        self.set_msg(self._owner)
+        self.score.setRewards(self.mock_rewards)
+
+        self.patch_internal_method(self.mock_rewards, "getWorkerDistributionCursor", lambda: 3)
+        try:
+            self.score.transfer(self.test_account3, 10 * EXA)
+        except IconScoreException as err:
+            self.assertIn("Transfers are paused while the worker distribution is in progress", str(err))
+        else:
+            raise IconScoreException("Transfer during the worker distribution")
+        self.assertEqual(0, self.score.balanceOf(self.test_account3))
+
+        self.patch_internal_method(self.mock_rewards, "getWorkerDistributionCursor", lambda: 0)
+        self.score.transfer(self.test_account3, 10 * EXA)
+        self.assertEqual(10 * EXA, self.score.balanceOf(self.test_account3))
+        self.assertEqual(90 * EXA, self.score.balanceOf(self._owner))
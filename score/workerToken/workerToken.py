@@ -40,11 +40,19 @@ class TokenFallbackInterface(InterfaceScore):
         pass
 
 
+# An interface to the reward distribution, which pays the worker wallets in batches
+class RewardDistributionInterface(InterfaceScore):
+    @interface
+    def getWorkerDistributionCursor(self) -> int:
+        pass
+
+
 class WorkerToken(IconScoreBase, TokenStandard):
     _BALANCES = 'balances'
     _TOTAL_SUPPLY = 'total_supply'
     _DECIMALS = 'decimals'
     _WALLETS = 'wallets'
+    _REWARDS = 'rewards'
 
     @eventlog(indexed=3)
     def Transfer(self, _from: Address, _to: Address, _value: int, _data: bytes):
@@ -56,6 +64,7 @@ class WorkerToken(IconScoreBase, TokenStandard):
         self._decimals = VarDB(self._DECIMALS, db, value_type=int)
         self._balances = DictDB(self._BALANCES, db, value_type=int)
         self._wallets = EnumerableSetDB(self._WALLETS, db, value_type=Address)
+        self._rewards = VarDB(self._REWARDS, db, value_type=Address)
 
     def on_install(self, _initialSupply: int, _decimals: int) -> None:
         super().on_install()
@@ -96,6 +105,16 @@ class WorkerToken(IconScoreBase, TokenStandard):
     def balanceOf(self, _owner: Address) -> int:
         return self._balances[_owner]
 
+    @external
+    def setRewards(self, _address: Address):
+        if self.msg.sender != self.owner:
+            revert(f"{TAG}: SenderNotScoreOwnerError: (sender){self.msg.sender} (owner){self.owner}")
+        self._rewards.set(_address)
+
+    @external(readonly=True)
+    def getRewards(self) -> Address:
+        return self._rewards.get()
+
     @external
     def transfer(self, _to: Address, _value: int, _data: bytes = None):
         if _data is None:
@@ -107,6 +126,14 @@ class WorkerToken(IconScoreBase, TokenStandard):
 
     def _transfer(self, _from: Address, _to: Address, _value: int, _data: bytes):
 
+        # The reward distribution pages through the wallets and their balances,
+        # so they can not change while a distribution is in progress.
+        rewardsAddress = self._rewards.get()
+        if rewardsAddress is not None:
+            rewards = self.create_interface_score(rewardsAddress, RewardDistributionInterface)
+            if rewards.getWorkerDistributionCursor() != 0:
+                revert(f"{TAG}: Transfers are paused while the worker distribution is in progress")
+
         # Checks the sending value and balance.
         if _value <= 0:
             revert(f"{TAG}: Transferring value should be greater than zero")
@@ -131,3 +158,13 @@ class WorkerToken(IconScoreBase, TokenStandard):
     @external(readonly=True)
     def getWallets(self) -> List[Address]:
         return [wallet for wallet in self._wallets.range(0, len(self._wallets))]
+
+    @external(readonly=True)
+    def getWalletBalances(self, _start: int, _count: int) -> list:
+        """
+        returns the wallets from the _start position up to _count of them, with their balances
+        """
+        return [
+            {'address': wallet, 'balance': self._balances[wallet]}
+            for wallet in self._wallets.range(_start, _start + _count)
+        ]